@@ -1,21 +1,47 @@
+import time
+SCRIPT_STARTED = time.perf_counter()
 import streamlit as st
 import hashlib
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_community.document_loaders import TextLoader, PyPDFLoader
-from langchain_core.messages import HumanMessage, SystemMessage
-from io import BytesIO, StringIO
-from PIL import Image
-import requests
-import sys
 from datetime import datetime
-import sqlite3
-import tempfile
 import os
 import json
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import asyncio
+from startup import LazyModule, warm_up, minify_css
+from embedding_cache import EmbeddingCache
+from embedding_backends import (EMBEDDING_BACKENDS, available_backends, default_backend, make_embeddings,
+                                unavailable_reason)
+from vector_store import workspace_slug, upsert_document, delete_document, list_documents
+from rag_collections import CollectionRegistry, ShardPool, user_namespace, team_namespace
+from ingest_pipeline import ingest_document
+from document_stream import iter_upload_pages
+from chunking import StructuredSplitter, load_profiles, split_pool, iter_split_uploads, citation
+from response_cache import ResponseCache, QueryVector, context_hash, replay
+from llm_clients import chat_model, OPENROUTER_BASE_URL
+from fanout import Call, iter_fan_out
+from context_builder import build_context, summary_upto, RollingSummarizer
+from usage import UsageMeter, UsageRecorder
+from analytics_writer import AnalyticsWriter
+from analytics_store import DashboardQueries
+from database import Database
+from maintenance import Maintenance
+from code_runner import CodeRunner
+from stream_renderer import StreamRenderer
+from image_cache import ImageCache, fetch_image, generate_image_bytes, iter_variants
+from search_service import SearchService, SearchCache, DuckDuckGoProvider, format_results
+from tracing import tracer, traced
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Page dependencies load on first use (see startup.py); the login page never pays for them
+pd = LazyModule("pandas")
+px = LazyModule("plotly.express")
+go = LazyModule("plotly.graph_objects")
+Image = LazyModule("PIL.Image")
+requests = LazyModule("requests")
+
+WARM_UP_MODULES = (
+    "langchain_core.messages", "langchain_openai", "langchain_community.vectorstores",
+    "pandas", "plotly.express", "plotly.graph_objects", "PIL.Image", "pypdf"
+)
 
 # === ENTERPRISE CONFIG ===
 st.set_page_config(
@@ -29,7 +55,7 @@ st.set_page_config(
 )
 
 # === PREMIUM GOLD/BLACK/BLUE CSS (Enhanced Professional Enterprise Design) ===
-st.markdown("""
+ENTERPRISE_CSS = """
 <style>
 /* ENTERPRISE GOLD/BLACK/BLUE THEME - ULTRA PROFESSIONAL */
 @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700;900&display=swap');
@@ -298,52 +324,98 @@ h3 {
     animation: glow 2s infinite;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# re-sent on every rerun, so send the minified copy (computed once per process)
+st.markdown(minify_css(ENTERPRISE_CSS), unsafe_allow_html=True)
 
 # === SECRETS (Safe fallback with better error handling) ===
 try:
     OPENROUTER_API_KEY = st.secrets.get("OPENROUTER_API_KEY")
     APP_PASSWORD = st.secrets.get("APP_PASSWORD", "admin123")
+    RAG_WORKSPACE = st.secrets.get("RAG_WORKSPACE", "default")
+    RAG_MEMORY_BUDGET_MB = int(st.secrets.get("RAG_MEMORY_BUDGET_MB", 64))
+    SEMANTIC_CACHE_THRESHOLD = st.secrets.get("SEMANTIC_CACHE_THRESHOLD")
+    CODE_RUNNER_WORKERS = int(st.secrets.get("CODE_RUNNER_WORKERS", 2))
+    IMAGE_CACHE_MB = int(st.secrets.get("IMAGE_CACHE_MB", 512))
+    SEARCH_CACHE_TTL = int(st.secrets.get("SEARCH_CACHE_TTL", 3600))
+    TRACING_OTEL = bool(st.secrets.get("TRACING_OTEL", False))
+    MAINTENANCE_HOUR = st.secrets.get("MAINTENANCE_HOUR")
+    CHUNK_PROFILES = dict(st.secrets.get("CHUNK_PROFILES", {}))
+    SPLIT_WORKERS = int(st.secrets.get("SPLIT_WORKERS", min(4, os.cpu_count() or 1)))
+    EMBEDDING_BACKEND = st.secrets.get("EMBEDDING_BACKEND")
 except Exception as e:
     OPENROUTER_API_KEY = None
     APP_PASSWORD = "admin123"
-
-# === DATABASE SETUP (Enhanced with better schema) ===
+    RAG_WORKSPACE = "default"
+    RAG_MEMORY_BUDGET_MB = 64
+    SEMANTIC_CACHE_THRESHOLD = None
+    CODE_RUNNER_WORKERS = 2
+    IMAGE_CACHE_MB = 512
+    SEARCH_CACHE_TTL = 3600
+    TRACING_OTEL = False
+    MAINTENANCE_HOUR = None
+    CHUNK_PROFILES = {}
+    SPLIT_WORKERS = min(4, os.cpu_count() or 1)
+    EMBEDDING_BACKEND = None
+
+# backend for new collections and the answer cache: the configured one if usable, else OpenRouter, else local
+DEFAULT_EMBEDDING_BACKEND = default_backend(OPENROUTER_API_KEY, EMBEDDING_BACKEND) or "openrouter"
+
+# === DATABASE SETUP (versioned schema, one connection per thread) ===
+# These getters open files and start background threads; they are first
+# called after the login gate (see DEFERRED INIT). The one exception is the
+# analytics writer, which the login form needs to record attempts.
 @st.cache_resource
 def init_db():
-    """Initialize SQLite database with enhanced schema"""
-    conn = sqlite3.connect('chat_history.db', check_same_thread=False)
-    c = conn.cursor()
-    
-    # Chat history table
-    c.execute('''CREATE TABLE IF NOT EXISTS chats 
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                  user TEXT, 
-                  timestamp TEXT, 
-                  role TEXT, 
-                  content TEXT,
-                  session_id TEXT,
-                  tokens INTEGER DEFAULT 0)''')
-    
-    # Analytics table
-    c.execute('''CREATE TABLE IF NOT EXISTS analytics 
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  event_type TEXT,
-                  event_data TEXT,
-                  timestamp TEXT)''')
-    
-    # User preferences table
-    c.execute('''CREATE TABLE IF NOT EXISTS user_preferences 
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user TEXT,
-                  preference_key TEXT,
-                  preference_value TEXT,
-                  updated_at TEXT)''')
-    
-    conn.commit()
-    return conn
+    """Open the shared chat database and apply pending schema migrations"""
+    return Database('chat_history.db')
 
-db = init_db()
+@st.cache_resource
+def get_analytics_writer():
+    """Background writer that batches analytics events (flushes on shutdown)
+
+    Opens the database through init_db() first, so the analytics tables are
+    migrated even for events logged on the login page.
+    """
+    return AnalyticsWriter(init_db().path)
+
+@st.cache_resource
+def get_dashboard():
+    """Rollup-backed dashboard queries, cached until the database changes"""
+    return DashboardQueries(init_db())
+
+def trace_session():
+    """Session id for root spans opened on the script thread (None on worker threads)"""
+    return st.session_state.get("session_id") if get_script_run_ctx(suppress_warning=True) else None
+
+@st.cache_resource
+def get_tracer():
+    """Process-wide tracer: ring buffer + `traces` table, optionally mirrored to OpenTelemetry"""
+    return tracer.configure(get_analytics_writer(), otel=TRACING_OTEL, session_fn=trace_session)
+
+@st.cache_resource
+def get_maintenance():
+    """Daily retention/archival, incremental vacuum and ANALYZE (one worker at a time, short transactions)"""
+    hour = int(MAINTENANCE_HOUR) if MAINTENANCE_HOUR is not None else None
+    return Maintenance(init_db(), archive_dir="archive", run_hour=hour).start()
+
+# === DOCUMENT COLLECTIONS (one shard per namespace/collection) ===
+DEFAULT_COLLECTION = "documents"
+
+@st.cache_resource
+def get_collection_registry():
+    """Collections per user/team; the pre-sharding workspace index becomes the default team collection"""
+    registry = CollectionRegistry(init_db())
+    info = registry.create(team_namespace(RAG_WORKSPACE), DEFAULT_COLLECTION, memory_budget_mb=RAG_MEMORY_BUDGET_MB,
+                           shard=workspace_slug(RAG_WORKSPACE), embedding=DEFAULT_EMBEDDING_BACKEND)
+    if info.embedding not in available_backends(OPENROUTER_API_KEY) and DEFAULT_EMBEDDING_BACKEND != info.embedding:
+        # e.g. no API key: an empty default collection switches to the local model instead of staying dead
+        try:
+            ShardPool(registry).set_embedding(*info.key, DEFAULT_EMBEDDING_BACKEND)
+        except ValueError:
+            pass
+    return registry
 
 # === SESSION MANAGEMENT ===
 def init_session_state():
@@ -362,111 +434,349 @@ def init_session_state():
         st.session_state.ai_personality = "professional"
     if "temperature" not in st.session_state:
         st.session_state.temperature = 0.7
+    if "rag_user" not in st.session_state:
+        st.session_state.rag_user = st.session_state.session_id
+    if "rag_teams" not in st.session_state:
+        st.session_state.rag_teams = RAG_WORKSPACE
+    if "rag_collection" not in st.session_state:
+        st.session_state.rag_collection = (team_namespace(RAG_WORKSPACE), DEFAULT_COLLECTION)
 
 init_session_state()
 
 # === LLM & EMBEDDINGS (Enhanced with temperature control) ===
-@st.cache_resource
-def get_llm(temp=0.7, model="openai/gpt-4o-mini"):
-    """Get LLM instance with configurable temperature"""
+LLM_MODEL = "openai/gpt-4o-mini"
+
+@traced("get_llm")
+def get_llm(temp=0.7, model=LLM_MODEL):
+    """Get pooled LLM client with per-request temperature"""
     if OPENROUTER_API_KEY:
         try:
-            return ChatOpenAI(
-                model=model,
-                temperature=temp,
-                base_url="https://openrouter.ai/api/v1", 
-                api_key=OPENROUTER_API_KEY, 
-                max_retries=3,
-                timeout=30
-            )
+            return chat_model(model, temp, OPENROUTER_API_KEY)
         except Exception as e:
             st.error(f"LLM initialization error: {e}")
             return None
     return None
 
 @st.cache_resource
-def get_embeddings():
-    """Get embeddings instance"""
-    if OPENROUTER_API_KEY:
-        try:
-            return OpenAIEmbeddings(
-                model="text-embedding-3-small",
-                openai_api_base="https://openrouter.ai/api/v1", 
-                api_key=OPENROUTER_API_KEY
-            )
-        except Exception as e:
-            st.error(f"Embeddings initialization error: {e}")
-            return None
-    return None
+def get_embedding_cache():
+    """Shared on-disk embedding cache (lives next to chat_history.db)"""
+    return EmbeddingCache("embedding_cache.db")
 
-llm = get_llm(st.session_state.temperature)
-embeddings = get_embeddings()
+@st.cache_resource
+@traced("get_embeddings")
+def load_embeddings(backend):
+    """Embeddings of one backend behind the persistent embedding cache (one instance per process)
+
+    None when the backend can't run here (OpenRouter without a key, local
+    models without sentence-transformers). Query embeddings are recorded as
+    "embed_query" spans, so they show on the Latency Tracing page.
+    """
+    try:
+        return make_embeddings(
+            backend, OPENROUTER_API_KEY, OPENROUTER_BASE_URL, get_embedding_cache(),
+            on_query=lambda ms: tracer.record("embed_query", ms, backend=backend)
+        )
+    except Exception as e:
+        st.error(f"Embeddings initialization error: {e}")
+        return None
+
+def get_embeddings(backend=None):
+    """Embeddings of `backend`, default DEFAULT_EMBEDDING_BACKEND (None when unavailable)"""
+    return load_embeddings(backend or DEFAULT_EMBEDDING_BACKEND)
+
+@st.cache_resource
+def get_shard_pool():
+    """Open collection shards shared by every session (least recently used closed past 16)"""
+    return ShardPool(get_collection_registry(), embeddings_for=get_embeddings)
+
+def rag_namespaces():
+    """Namespaces this session can see: its user namespace plus each team it listed"""
+    user = st.session_state.rag_user.strip() or st.session_state.session_id
+    teams = [t for t in st.session_state.rag_teams.split(",") if t.strip()]
+    return [user_namespace(user)] + [team_namespace(t) for t in teams]
+
+def active_shard():
+    """Shard of the collection selected in the sidebar"""
+    return get_shard_pool().get(*st.session_state.rag_collection)
+
+def get_vector_store():
+    """Chroma store of the active collection (None without embeddings)"""
+    try:
+        return active_shard().store
+    except Exception as e:
+        st.error(f"Vector store initialization error: {e}")
+        return None
+
+@st.cache_resource
+def get_response_cache():
+    """Shared answer cache for Smart Chat and RAG (similarity lookup when a threshold is set)"""
+    if SEMANTIC_CACHE_THRESHOLD:
+        return ResponseCache("response_cache.db", threshold=float(SEMANTIC_CACHE_THRESHOLD))
+    return ResponseCache("response_cache.db")
+
+@st.cache_resource
+def get_usage_recorder():
+    """Per-request token/latency records in the `usage` table"""
+    return UsageRecorder(init_db())
+
+def get_lexical_index():
+    """BM25 index of the active collection"""
+    return active_shard().lexical
 
 # === UTILITY FUNCTIONS (Enhanced) ===
-def log_analytics(event_type, event_data):
-    """Log analytics events"""
+@traced("log_analytics")
+def log_analytics(event_type, event_data, latency_ms=None, tokens=0):
+    """Log analytics events (queued; written in batches off the script thread)"""
     try:
-        db.execute(
-            "INSERT INTO analytics (event_type, event_data, timestamp) VALUES (?, ?, ?)",
-            (event_type, json.dumps(event_data), datetime.now().isoformat())
+        get_analytics_writer().log(
+            event_type, event_data,
+            session_id=st.session_state.get("session_id"), latency_ms=latency_ms, tokens=tokens
         )
-        db.commit()
     except Exception as e:
         st.error(f"Analytics logging error: {e}")
 
-def generate_image(prompt, width=1024, height=1024):
-    """Generate AI images using Pollinations API with size options"""
+def embeddings_unavailable(shard, source):
+    """Explain why `source` can't be indexed: the collection's embedding backend doesn't load here"""
+    backend = shard.info.embedding
+    reason = unavailable_reason(backend, OPENROUTER_API_KEY) or "its embeddings failed to load"
+    st.error(f"❌ Can't index {source}: this collection embeds with {EMBEDDING_BACKENDS[backend].label}, "
+             f"which is unavailable here ({reason}).")
+
+def index_document(store, source, documents, splitter, batch_size=64, max_in_flight=4):
+    """Stream documents into the active collection with live progress
+
+    `documents` is any page iterator, e.g. `iter_upload_pages(uploaded_file)`,
+    which reads the upload buffer directly instead of copying it to a temp file.
+    Uploads into the same collection queue behind each other so they share
+    that collection's memory budget; other collections are unaffected.
+    Returns None (after an error message) when the collection's embedding
+    backend can't run here.
+    """
+    shard = active_shard()
+    store = store or shard.store
+    if store is None:
+        embeddings_unavailable(shard, source)
+        return None
+    if EMBEDDING_BACKENDS[shard.info.embedding].local:
+        max_in_flight = 1  # a local model already keeps every core busy
+    progress = st.progress(0.0, text=f"📄 Indexing {source}...")
+
+    def on_progress(report):
+        handled = report.embedded + report.skipped + report.failed
+        progress.progress(
+            min(1.0, handled / max(report.chunks, 1)),
+            text=f"📄 {source}: {report.embedded} embedded • {report.skipped} unchanged • {report.failed} failed"
+        )
+
+    with shard.ingest_lock:
+        report = ingest_document(
+            store, source, documents, splitter, shard.embeddings,
+            batch_size=batch_size, max_in_flight=max_in_flight, on_progress=on_progress,
+            memory_budget_bytes=shard.ingest_budget_bytes,
+            lexical=shard.lexical,
+            vector_dim=EMBEDDING_BACKENDS[shard.info.embedding].dim
+        )
+    log_analytics("document_ingest", {"source": source, "shard": shard.info.shard, **report.as_dict()})
+    with st.expander("⏱️ Ingest timings", expanded=False):
+        st.json(report.as_dict()["timings"])
+    if not report.complete:
+        st.warning(f"⚠️ {report.failed} chunks failed to embed. Upload again to resume - finished chunks are kept.")
+    return report
+
+@st.cache_resource
+def get_splitter():
+    """Structure-aware splitter; size/overlap per document type from the CHUNK_PROFILES secret"""
+    return StructuredSplitter(load_profiles(CHUNK_PROFILES))
+
+@st.cache_resource
+def get_split_pool():
+    """Worker processes that read and split multi-file uploads in parallel"""
+    return split_pool(SPLIT_WORKERS)
+
+def index_uploads(uploaded_files):
+    """Index uploads into the active collection; several files are split in parallel first
+
+    A single file (or a single-worker pool) streams page by page in this
+    process; otherwise every file is read and split in the split pool and
+    each is indexed as soon as its chunks are back.
+    """
+    shard = active_shard()
+    if shard.store is None:
+        # don't read and split files that can't be embedded
+        embeddings_unavailable(shard, ", ".join(f.name for f in uploaded_files))
+        return []
+    splitter = get_splitter()
+    if len(uploaded_files) == 1 or SPLIT_WORKERS < 2:
+        return [index_document(None, f.name, iter_upload_pages(f), splitter) for f in uploaded_files]
+    reports = []
+    uploads = [(f.name, f.getvalue()) for f in uploaded_files]
+    with st.spinner(f"✂️ Splitting {len(uploads)} files..."):
+        for name, chunks, error in iter_split_uploads(get_split_pool(), uploads, splitter.profiles):
+            if error:
+                st.error(f"❌ {name}: {error}")
+                continue
+            reports.append(index_document(None, name, chunks, splitter=None))
+    return reports
+
+def rag_context(docs):
+    """Numbered context blocks headed by their citation (file, page, section, offsets)"""
+    return "\n\n".join(f"[{i}] {citation(d.metadata)}\n{d.page_content}" for i, d in enumerate(docs, 1))
+
+@traced("retrieval")
+def retrieve(query, k=4, where=None):
+    """Hybrid BM25 + vector retrieval in the active collection; identifier-like queries skip the embedding call
+
+    `where` ({"source": "manual.pdf"}, {"page": {"$in": [1, 2]}}) narrows the
+    candidates before ranking.
+    """
+    shard = active_shard()
+    embeddings = shard.embeddings
+    if embeddings is not None:
+        embeddings.take_query_ms()
+    docs, mode = shard.search(query, k=k, where=where)
+    embed_ms = embeddings.take_query_ms() if embeddings is not None else None
+    log_analytics("rag_retrieval", {
+        "mode": mode, "results": len(docs), "shard": shard.info.shard,
+        "embedding": shard.info.embedding, "embed_ms": embed_ms
+    })
+    if embed_ms is not None:
+        st.caption(f"🧭 query embedded in {embed_ms:.0f} ms · {EMBEDDING_BACKENDS[shard.info.embedding].label}")
+    elif mode == "lexical":
+        reason = "identifier query" if shard.store is not None else "embeddings unavailable"
+        st.caption(f"🧭 {reason}: keyword search only, no embedding")
+    return docs
+
+def ask_llm(messages, prompt, context="", feature="chat"):
+    """Answer through the response cache; cache hits stream back without an LLM call
+
+    `context` is whatever else the answer depends on (prior turns, retrieved
+    chunks). Returns (stream, cached) where stream yields text pieces.
+    """
+    cache = get_response_cache()
+    # one embedding per answer: the lookup's query vector is reused by store()
+    embed_query = QueryVector(get_embeddings().embed_query) if SEMANTIC_CACHE_THRESHOLD and get_embeddings() else None
+    key = (LLM_MODEL, st.session_state.temperature, st.session_state.ai_personality)
+    ctx = context_hash(context)
+
+    hit = cache.lookup(*key, prompt, context=ctx, embed_query=embed_query)
+    if hit:
+        log_analytics(feature, {"cached": True, "tokens_saved": hit[1]})
+        return replay(hit[0]), True
+
+    def stream():
+        parts = []
+        meter = UsageMeter(LLM_MODEL, feature=feature)
+        for chunk in llm.stream(messages):
+            meter.observe(chunk)
+            parts.append(chunk.content or "")
+            yield chunk.content or ""
+        answer = "".join(parts)
+        usage = meter.finish(messages, answer)
+        with tracer.span("sqlite_write", table="usage"):
+            get_usage_recorder().record(usage, session_id=st.session_state.session_id)
+        st.session_state.total_tokens += usage["total_tokens"]
+        cache.store(*key, prompt, answer, tokens=usage["total_tokens"], context=ctx, embed_query=embed_query)
+        log_analytics(feature, {"cached": False}, latency_ms=usage["latency_ms"], tokens=usage["total_tokens"])
+
+    return stream(), False
+
+def stream_answer(messages, prompt, context="", feature="chat"):
+    """Render an answer as it streams (coalesced updates); returns (text, stats)"""
+    with tracer.span(f"{feature}_turn", model=LLM_MODEL) as turn:
+        with tracer.span("cache_lookup"):
+            stream, cached = ask_llm(messages, prompt, context, feature)
+        renderer = StreamRenderer(st.container())
+        answer = renderer.write_stream(stream)
+        stats = renderer.stats(model=LLM_MODEL)
+        turn.set(cached=cached, tokens=stats["tokens"])
+        if stats["ttft_ms"] is not None:
+            tracer.record("llm_ttft", stats["ttft_ms"], cached=cached)
+        tracer.record("render", stats["render_ms"], renders=stats["renders"])
+    if not cached and stats["ttft_ms"] is not None:
+        st.caption(f"⚡ first token {stats['ttft_ms']} ms · {stats['tokens_per_sec']} tokens/s")
+    return answer, stats
+
+@st.cache_resource
+def get_image_cache():
+    """Shared on-disk cache of generated images, keyed by (prompt, size, seed)"""
+    return ImageCache("image_cache", max_bytes=IMAGE_CACHE_MB * 1024 * 1024)
+
+@traced("generate_image")
+def generate_image(prompt, width=1024, height=1024, seed=None):
+    """Generate an AI image via Pollinations; returns raw bytes for st.image (cached on disk)"""
+    started = time.perf_counter()
     try:
-        # Clean and encode prompt
-        clean_prompt = prompt.replace(' ', '%20')
-        url = f"https://image.pollinations.ai/prompt/{clean_prompt}?width={width}&height={height}&nologo=true"
-        
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        
-        img = Image.open(BytesIO(response.content))
-        log_analytics("image_generation", {"prompt": prompt, "size": f"{width}x{height}"})
-        return img
+        data, cached = generate_image_bytes(get_image_cache(), prompt, width, height, seed)
+        log_analytics(
+            "image_generation", {"prompt": prompt, "size": f"{width}x{height}", "cached": cached},
+            latency_ms=(time.perf_counter() - started) * 1000
+        )
+        return data
     except Exception as e:
         st.error(f"Image generation error: {e}")
         return None
 
+def generate_variants(prompt, count=4, width=1024, height=1024, timeout=60):
+    """Generate `count` seeded variants concurrently; yields (seed, bytes or None, error)"""
+    log_analytics("image_variants", {"prompt": prompt, "count": count, "size": f"{width}x{height}"})
+    for seed, result, error, _ in iter_variants(get_image_cache(), prompt, count, width, height, timeout=timeout):
+        yield seed, (result[0] if result else None), error
+
+@st.cache_resource
+def get_code_runner():
+    """Warm worker processes for the Code Executor (shared by all sessions)"""
+    return CodeRunner(workers=CODE_RUNNER_WORKERS)
+
+@traced("execute_code")
 def execute_code(code, timeout=5):
-    """Execute Python code safely with timeout"""
-    try:
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        sys.stdout = mystdout = StringIO()
-        sys.stderr = mystderr = StringIO()
-        
-        # Execute code
-        exec(code, {"__builtins__": __builtins__})
-        
-        sys.stdout = old_stdout
-        sys.stderr = old_stderr
-        
-        output = mystdout.getvalue()
-        errors = mystderr.getvalue()
-        
-        log_analytics("code_execution", {"success": True, "lines": len(code.split('\n'))})
-        
-        if errors:
-            return f"⚠️ Warnings:\n{errors}\n\n✅ Output:\n{output}" if output else f"⚠️ Warnings:\n{errors}"
-        
-        return output or "✅ Code executed successfully (no output)"
-        
-    except Exception as e:
-        log_analytics("code_execution", {"success": False, "error": str(e)})
-        return f"❌ Error: {str(e)}\n\nLine: {sys.exc_info()[2].tb_lineno if sys.exc_info()[2] else 'unknown'}"
+    """Execute Python code in a sandboxed worker process with a real timeout"""
+    result = get_code_runner().run(code, timeout=timeout)
+    log_analytics(
+        "code_execution",
+        {"success": result.status == "ok", "status": result.status, "error": result.error,
+         "lines": len(code.split('\n'))},
+        latency_ms=result.seconds * 1000
+    )
+
+    if result.status == "timeout":
+        return f"⏱️ Stopped after {timeout}s (time limit)"
+    if result.status == "killed":
+        return f"❌ Error: {result.error}"
+    if result.status == "error":
+        output = f"✅ Output:\n{result.output}\n\n" if result.output else ""
+        return f"{output}❌ Error: {result.error}\n\nLine: {result.line or 'unknown'}"
+
+    if result.errors:
+        return f"⚠️ Warnings:\n{result.errors}\n\n✅ Output:\n{result.output}" if result.output else f"⚠️ Warnings:\n{result.errors}"
 
-def web_search(query):
-    """Enhanced web search with fallback"""
+    return result.output or "✅ Code executed successfully (no output)"
+
+@st.cache_resource
+def get_search_service():
+    """Shared search provider + SQLite result cache (identical in-flight queries share one request)"""
+    return SearchService(DuckDuckGoProvider(), SearchCache("search_cache.db", ttl_seconds=SEARCH_CACHE_TTL))
+
+def search_variants(query):
+    """A few reformulations of a query for multi-query search"""
+    return [query, f"{query} {datetime.now().year}", f"{query} explained", f"what is {query}"]
+
+@traced("web_search")
+def web_search(query, multi=False):
+    """Cached web search with fallback; `multi` fans out reformulations and merges by URL"""
+    started = time.perf_counter()
     try:
-        from langchain_community.tools import DuckDuckGoSearchRun
-        search_tool = DuckDuckGoSearchRun()
-        results = search_tool.run(query)
-        log_analytics("web_search", {"query": query, "success": True})
-        return results
+        if multi:
+            results, errors = get_search_service().multi_search(search_variants(query), max_results=8)
+            if not results and errors:
+                raise next(iter(errors.values()))
+            source = "multi"
+        else:
+            results, source = get_search_service().search(query)
+        log_analytics(
+            "web_search", {"query": query, "success": True, "source": source, "results": len(results)},
+            latency_ms=(time.perf_counter() - started) * 1000
+        )
+        return format_results(results) if results else f"No results found for '{query}'."
     except Exception as e:
         log_analytics("web_search", {"query": query, "success": False})
         return f"""🔍 **Web Search Results for '{query}'**
@@ -482,6 +792,39 @@ def web_search(query):
 
 Error details: {str(e)}"""
 
+def research(query, image_variants=2, size=512, timeout=45):
+    """Fan out web search + LLM summary + image variants in parallel
+
+    Yields (name, result, error, seconds) as each call lands: "summary" gives
+    (search_results, summary_text), "image_N" gives (image_bytes, cached). Anything
+    still running after `timeout` seconds is cancelled.
+    """
+    from langchain_core.messages import HumanMessage
+    system_message = get_system_message()
+    session_id = st.session_state.session_id
+    recorder = get_usage_recorder()
+
+    async def search_and_summarize():
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(None, web_search, query)
+        messages = [
+            system_message,
+            HumanMessage(content=f"Summarize these web search results for '{query}':\n\n{results}")
+        ]
+        meter = UsageMeter(LLM_MODEL, feature="research")
+        summary = await llm.ainvoke(messages)
+        meter.observe(summary)
+        recorder.record(meter.finish(messages, summary.content), session_id=session_id)
+        return results, summary.content
+
+    calls = [Call("summary", search_and_summarize, provider="llm")]
+    calls += [
+        Call(f"image_{i + 1}", fetch_image, get_image_cache(), query, size, size, i, provider="image")
+        for i in range(image_variants)
+    ]
+    log_analytics("research", {"query": query, "image_variants": image_variants})
+    return iter_fan_out(calls, timeout=timeout)
+
 # === AI PERSONALITY SYSTEM ===
 PERSONALITY_PROMPTS = {
     "professional": "You are a professional AI assistant. Be formal, precise, and business-oriented.",
@@ -493,8 +836,124 @@ PERSONALITY_PROMPTS = {
 
 def get_system_message():
     """Get system message based on personality"""
+    from langchain_core.messages import SystemMessage
     return SystemMessage(content=PERSONALITY_PROMPTS[st.session_state.ai_personality])
 
+# === BOUNDED CONVERSATION MEMORY ===
+CHAT_CONTEXT_BUDGET = 4000   # tokens of history sent per request
+CHAT_RENDER_LIMIT = 30       # messages rendered per rerun
+
+@st.cache_resource
+def get_summarizer():
+    """Background folder of old Smart Chat turns into a rolling summary"""
+    if OPENROUTER_API_KEY:
+        summary_llm = chat_model(LLM_MODEL, 0.2, OPENROUTER_API_KEY)
+        return RollingSummarizer(init_db(), lambda text: summary_llm.invoke(text).content)
+    return None
+
+def build_chat_messages(history):
+    """Token-budgeted messages for Smart Chat; turns that don't fit come from the summary"""
+    from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+    summarizer = get_summarizer()
+    summary = summarizer.get(st.session_state.session_id)[0] if summarizer else ""
+    context, first_kept = build_context(
+        PERSONALITY_PROMPTS[st.session_state.ai_personality],
+        history, CHAT_CONTEXT_BUDGET, summary=summary, model=LLM_MODEL
+    )
+    # turns cut by the budget, and any older ones not held in `history`, go to the summary
+    upto_id = summary_upto(history, first_kept, st.session_state.get("has_older", False))
+    if summarizer and upto_id:
+        summarizer.schedule(st.session_state.session_id, upto_id)
+
+    messages = [SystemMessage(content=context[0]["content"])]
+    for m in context[1:]:
+        messages.append(HumanMessage(content=m["content"]) if m["role"] == "user" else AIMessage(content=m["content"]))
+    return messages
+
+def visible_messages():
+    """Most recent messages to render; older ones stay in SQLite"""
+    return st.session_state.messages[-CHAT_RENDER_LIMIT:]
+
+def stage_table(percentiles):
+    """Rows of stage / count / p50 / p95 / p99 for a {stage: {...}} percentile dict"""
+    return pd.DataFrame([
+        {"Stage": stage, "Count": values.get("count", 0), "p50 (ms)": values.get(50),
+         "p95 (ms)": values.get(95), "p99 (ms)": values.get(99)}
+        for stage, values in sorted(percentiles.items(), key=lambda item: -(item[1].get(95) or 0))
+    ])
+
+def render_latency_page():
+    """Admin view of where a turn spends its time (also feeds Usage Insights)"""
+    st.header("⏱️ Latency Tracing")
+    window = st.selectbox("Window", ["Last 24 hours", "Last 7 days", "Last 30 days"], index=1)
+    days = {"Last 24 hours": 1, "Last 7 days": 7, "Last 30 days": 30}[window]
+    since = (datetime.now() - pd.Timedelta(days=days)).date().isoformat()
+
+    st.subheader("📦 Per stage (all workers, from rollups)")
+    persisted = get_dashboard().stage_percentiles(since)
+    if persisted:
+        st.dataframe(stage_table(persisted), use_container_width=True, hide_index=True)
+    else:
+        st.info("No spans recorded yet.")
+
+    st.subheader("⚡ Per stage (this process, last spans in memory)")
+    live = tracer.recent_percentiles()
+    if live:
+        st.dataframe(stage_table(live), use_container_width=True, hide_index=True)
+
+    st.subheader("🐢 Slowest spans")
+    slowest = get_dashboard().slowest_spans(since)
+    if slowest:
+        st.dataframe(pd.DataFrame(slowest, columns=["Started", "Stage", "ms", "Status", "Session", "Trace"]),
+                     use_container_width=True, hide_index=True)
+
+def render_maintenance_page():
+    """Admin view of retention policies, archives and the maintenance job"""
+    st.header("🧹 Database Maintenance")
+    maintenance = get_maintenance()
+    stats = maintenance.stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Database Size", f"{stats['size_mb']:.1f} MB")
+    col2.metric("Reclaimable", f"{stats['free_mb']:.1f} MB")
+    col3.metric("Archive Files", stats["archives"])
+    if stats["last_finished"]:
+        st.caption(f"Last run {stats['last_finished'][:19]}: {stats['last_result']}")
+
+    st.subheader("📅 Retention")
+    with st.form("retention"):
+        edits = {}
+        for table, (keep_days, archive) in maintenance.policies().items():
+            col1, col2, col3 = st.columns([2, 2, 1])
+            col1.markdown(f"**{table}**")
+            days = col2.number_input("Keep days (0 = forever)", 0, 36500, keep_days or 0, key=f"keep_{table}")
+            archived = col3.checkbox("Archive", archive, key=f"archive_{table}")
+            edits[table] = (days, archived)
+        if st.form_submit_button("💾 Save"):
+            for table, (days, archived) in edits.items():
+                maintenance.set_policy(table, days, archived)
+            st.success("Retention saved")
+
+    col1, col2 = st.columns(2)
+    if col1.button("▶️ Run now", disabled=stats["running"]):
+        with st.spinner("Archiving, pruning and vacuuming..."):
+            result = maintenance.run_once(force=True)
+        if result is None:
+            st.warning("Another worker is running maintenance")
+        else:
+            st.json(result)
+    if not stats["incremental_vacuum"]:
+        # one full VACUUM: locks the database for the whole rewrite
+        if col2.button("🗜️ Enable incremental vacuum"):
+            with st.spinner("Rewriting database..."):
+                maintenance.enable_incremental_vacuum()
+            st.rerun()
+
+    files = maintenance.archive.files()
+    if files:
+        st.subheader("🗄️ Archives")
+        st.dataframe(pd.DataFrame(files, columns=["Table", "Month", "Rows", "Bytes", "Path"]),
+                     use_container_width=True, hide_index=True)
+
 # === ENHANCED PASSWORD AUTH ===
 if not st.session_state.logged_in:
     st.markdown("<h1>🔐 AI PRO ENTERPRISE</h1>", unsafe_allow_html=True)
@@ -548,6 +1007,13 @@ if not st.session_state.logged_in:
     
     st.stop()
 
+# === DEFERRED INIT (only once logged in) ===
+db = init_db()
+get_tracer()
+get_maintenance()
+warm_up(WARM_UP_MODULES, on_import=lambda name, ms: tracer.record("import", ms, module=name))
+llm = get_llm(st.session_state.temperature)
+
 # === PROFESSIONAL SIDEBAR (Enhanced) ===
 with st.sidebar:
     st.markdown("### 👋 Welcome, Enterprise User!")
@@ -559,18 +1025,62 @@ with st.sidebar:
         "📱 **Navigate**", 
         ["💬 Smart Chat", "📄 Document RAG", "🔍 Web Search", 
          "🖼️ AI Images", "💻 Code Runner", "📊 Analytics Dashboard",
-         "🎯 AI Personality", "⚙️ Settings", "📈 Usage Insights"],
+         "🎯 AI Personality", "⚙️ Settings", "📈 Usage Insights", "⏱️ Latency Tracing", "🧹 Maintenance"],
         index=0
     )
     
     st.markdown("---")
     
+    # Document collections (personal + team)
+    with st.expander("📚 Knowledge Base", expanded=page == "📄 Document RAG"):
+        st.text_input("👤 Your name", key="rag_user")
+        st.text_input("👥 Teams (comma separated)", key="rag_teams")
+        registry = get_collection_registry()
+        collections = registry.visible(rag_namespaces())
+        keys = [c.key for c in collections]
+        if keys:
+            current = st.session_state.rag_collection
+            choice = st.selectbox(
+                "Collection", keys, index=keys.index(current) if current in keys else 0,
+                format_func=lambda key: f"{key[1]} ({key[0]})"
+            )
+            st.session_state.rag_collection = choice
+            active = next(c for c in collections if c.key == choice)
+            embeddings = get_embeddings(active.embedding)
+            latency = embeddings.query_stats() if embeddings is not None else {"count": 0}
+            st.caption(
+                f"🧭 {EMBEDDING_BACKENDS[active.embedding].label}"
+                + (f" · query p50 {latency['p50']} ms / p95 {latency['p95']} ms" if latency["count"] else "")
+                + ("" if embeddings is not None else " · unavailable here, keyword search only")
+            )
+        backends = available_backends(OPENROUTER_API_KEY) or [DEFAULT_EMBEDDING_BACKEND]
+        with st.form("new_collection", clear_on_submit=True):
+            name = st.text_input("New collection")
+            owner = st.selectbox("Owner", rag_namespaces())
+            budget = st.slider("Memory budget (MB)", 16, 1024, RAG_MEMORY_BUDGET_MB, step=16)
+            embedding = st.selectbox(
+                "Embeddings", backends,
+                index=backends.index(DEFAULT_EMBEDDING_BACKEND) if DEFAULT_EMBEDDING_BACKEND in backends else 0,
+                format_func=lambda b: EMBEDDING_BACKENDS[b].label
+            )
+            if st.form_submit_button("➕ Create") and name.strip():
+                info = registry.create(owner, name, memory_budget_mb=budget, created_by=st.session_state.rag_user,
+                                       embedding=embedding)
+                st.session_state.rag_collection = info.key
+                log_analytics("collection_created", info.as_dict())
+                st.rerun()
+    
+    st.markdown("---")
+    
     # Quick Stats
     with st.expander("📊 Quick Stats", expanded=False):
         try:
-            total_chats = db.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+            total_chats = get_dashboard().total_messages()
             st.metric("Total Messages", total_chats)
             st.metric("Session Tokens", st.session_state.total_tokens)
+            cache_stats = get_response_cache().stats()
+            st.metric("Answer Cache Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+            st.metric("Tokens Saved", cache_stats["tokens_saved"])
         except:
             st.info("No stats yet")
     
@@ -590,6 +1100,18 @@ st.markdown("<h1>🚀 AI PRO ENTERPRISE</h1>", unsafe_allow_html=True)
 st.markdown("<p style='text-align:center; color:#ffed4a; font-size:1.2em;'>Production-Grade AI Toolkit with Advanced RAG, Analytics & Premium Features</p>", unsafe_allow_html=True)
 st.markdown("---")
 
+tracer.record("script_setup", (time.perf_counter() - SCRIPT_STARTED) * 1000, page=page)
+
+# === ⏱️ LATENCY TRACING (admin) ===
+if page == "⏱️ Latency Tracing":
+    render_latency_page()
+    st.stop()
+
+# === 🧹 MAINTENANCE (admin) ===
+if page == "🧹 Maintenance":
+    render_maintenance_page()
+    st.stop()
+
 # === 💬 SMART CHAT (Enhanced) ===
 if page == "💬 Smart Chat":
     st.header("💬 Smart AI Chat (GPT-4o-mini)")
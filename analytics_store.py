@@ -0,0 +1,275 @@
+import math
+import json
+import threading
+from datetime import datetime, timedelta
+
+
+# =====================================================
+# SCHEMA: INDEXES + ROLLUP TABLES
+# =====================================================
+# Rollups are keyed by ISO-text buckets: hour = timestamp[:13] ("2026-10-18T09"),
+# day = timestamp[:10]. Latency percentiles come from log-scale histograms
+# (quarter-octave bins, ~19% resolution), so every dashboard query reads
+# O(buckets) rows instead of scanning raw events. Chat rollups are kept by
+# triggers so every writer of `chats` maintains them automatically.
+
+ROLLUP_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS rollup_events (
+        grain TEXT,
+        bucket TEXT,
+        feature TEXT,
+        events INTEGER DEFAULT 0,
+        tokens INTEGER DEFAULT 0,
+        latency_sum REAL DEFAULT 0,
+        latency_count INTEGER DEFAULT 0,
+        PRIMARY KEY (grain, bucket, feature)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS rollup_latency (
+        grain TEXT,
+        bucket TEXT,
+        feature TEXT,
+        bin INTEGER,
+        count INTEGER DEFAULT 0,
+        PRIMARY KEY (grain, bucket, feature, bin)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS rollup_chats (
+        day TEXT,
+        role TEXT,
+        messages INTEGER DEFAULT 0,
+        tokens INTEGER DEFAULT 0,
+        PRIMARY KEY (day, role)
+    ) WITHOUT ROWID"""
+)
+
+ANALYTICS_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_analytics_timestamp ON analytics (timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_analytics_event_type ON analytics (event_type, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_analytics_session ON analytics (session_id)"
+)
+
+CHAT_ROLLUP_SCHEMA = (
+    "CREATE INDEX IF NOT EXISTS idx_chats_session ON chats (session_id)",
+    "CREATE INDEX IF NOT EXISTS idx_chats_timestamp ON chats (timestamp)",
+    """CREATE TRIGGER IF NOT EXISTS trg_chats_rollup_insert AFTER INSERT ON chats
+    WHEN NEW.timestamp IS NOT NULL AND NEW.role IS NOT NULL BEGIN
+        INSERT INTO rollup_chats (day, role, messages, tokens)
+        VALUES (substr(NEW.timestamp, 1, 10), NEW.role, 1, COALESCE(NEW.tokens, 0))
+        ON CONFLICT(day, role) DO UPDATE SET
+            messages = messages + 1, tokens = tokens + excluded.tokens;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_chats_rollup_delete AFTER DELETE ON chats
+    WHEN OLD.timestamp IS NOT NULL AND OLD.role IS NOT NULL BEGIN
+        UPDATE rollup_chats SET messages = messages - 1, tokens = tokens - COALESCE(OLD.tokens, 0)
+        WHERE day = substr(OLD.timestamp, 1, 10) AND role = OLD.role;
+    END"""
+)
+
+GRAINS = {"hour": 13, "day": 10}
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def ensure_schema(conn):
+    """Add analytics columns, indexes and rollup tables; backfill rollups once
+
+    Runs inside the caller's transaction (see database.MIGRATIONS).
+    """
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+    statements = []
+    if "analytics" in tables:
+        columns = _columns(conn, "analytics")
+        if "session_id" not in columns:
+            statements.append("ALTER TABLE analytics ADD COLUMN session_id TEXT")
+        if "latency_ms" not in columns:
+            statements.append("ALTER TABLE analytics ADD COLUMN latency_ms REAL")
+        if "tokens" not in columns:
+            statements.append("ALTER TABLE analytics ADD COLUMN tokens INTEGER DEFAULT 0")
+        statements.extend(ANALYTICS_INDEXES)
+    statements.extend(ROLLUP_SCHEMA)
+    if "chats" in tables:
+        statements.extend(CHAT_ROLLUP_SCHEMA)
+    for statement in statements:
+        conn.execute(statement)
+
+    if "rollup_events" not in tables:
+        _backfill(conn, tables)
+
+
+def _backfill(conn, tables):
+    if "analytics" in tables:
+        rows = conn.execute("SELECT event_type, timestamp, latency_ms, tokens FROM analytics").fetchall()
+        for event_type, timestamp, latency_ms, tokens in rows:
+            for sql, params in event_rollup_writes(event_type, timestamp, latency_ms, tokens or 0):
+                conn.execute(sql, params)
+    if "chats" in tables:
+        conn.execute(
+            "INSERT INTO rollup_chats (day, role, messages, tokens) "
+            "SELECT substr(timestamp, 1, 10), role, COUNT(*), COALESCE(SUM(tokens), 0) FROM chats "
+            "WHERE timestamp IS NOT NULL AND role IS NOT NULL GROUP BY 1, 2"
+        )
+
+
+# =====================================================
+# WRITE PATH (same transaction as the raw insert)
+# =====================================================
+
+def latency_bin(ms):
+    return int(math.floor(math.log2(max(ms, 0.01)) * 4))
+
+
+def bin_value(b):
+    return 2 ** ((b + 0.5) / 4)
+
+
+def event_rollup_writes(event_type, timestamp, latency_ms=None, tokens=0):
+    """Statements that fold one analytics event into the hourly/daily rollups"""
+    writes = []
+    for grain, width in GRAINS.items():
+        bucket = timestamp[:width]
+        writes.append((
+            "INSERT INTO rollup_events (grain, bucket, feature, events, tokens, latency_sum, latency_count) "
+            "VALUES (?, ?, ?, 1, ?, ?, ?) ON CONFLICT(grain, bucket, feature) DO UPDATE SET "
+            "events = events + 1, tokens = tokens + excluded.tokens, "
+            "latency_sum = latency_sum + excluded.latency_sum, latency_count = latency_count + excluded.latency_count",
+            (grain, bucket, event_type, tokens, latency_ms or 0.0, 1 if latency_ms is not None else 0)
+        ))
+        if latency_ms is not None:
+            writes.append((
+                "INSERT INTO rollup_latency (grain, bucket, feature, bin, count) VALUES (?, ?, ?, ?, 1) "
+                "ON CONFLICT(grain, bucket, feature, bin) DO UPDATE SET count = count + 1",
+                (grain, bucket, event_type, latency_bin(latency_ms))
+            ))
+    return writes
+
+
+def event_writes(event_type, event_data, session_id=None, latency_ms=None, tokens=0, timestamp=None):
+    """Raw analytics insert plus its rollup updates"""
+    timestamp = timestamp or datetime.now().isoformat()
+    return [(
+        "INSERT INTO analytics (event_type, event_data, timestamp, session_id, latency_ms, tokens) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (event_type, json.dumps(event_data), timestamp, session_id, latency_ms, tokens)
+    )] + event_rollup_writes(event_type, timestamp, latency_ms, tokens)
+
+
+# =====================================================
+# DASHBOARD QUERIES (cached until the database changes)
+# =====================================================
+
+class DashboardQueries:
+    """Rollup-backed dashboard queries with results cached per PRAGMA data_version
+
+    data_version changes whenever another connection (the background writer,
+    another Streamlit worker) commits, so cached results are dropped exactly
+    when there is something new to show.
+    """
+
+    def __init__(self, db):
+        # a dedicated connection: data_version ignores this connection's own commits
+        self.conn = db.connect()
+        self.lock = threading.Lock()
+        self.cache = {}
+
+    def _cached(self, name, sql, params=()):
+        with self.lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            key = (name, params)
+            hit = self.cache.get(key)
+            if hit and hit[0] == version:
+                return hit[1]
+            rows = self.conn.execute(sql, params).fetchall()
+            self.cache[key] = (version, rows)
+            return rows
+
+    def chat_messages_per_day(self, days=90):
+        since = (datetime.now() - timedelta(days=days)).date().isoformat()
+        return self._cached(
+            "chat_per_day",
+            "SELECT day, SUM(messages) FROM rollup_chats WHERE day >= ? GROUP BY day ORDER BY day", (since,)
+        )
+
+    def chat_roles(self):
+        return self._cached("chat_roles", "SELECT role, SUM(messages) FROM rollup_chats GROUP BY role")
+
+    def total_messages(self):
+        rows = self._cached("total_messages", "SELECT COALESCE(SUM(messages), 0) FROM rollup_chats")
+        return rows[0][0]
+
+    def events_per_bucket(self, grain="day", since=""):
+        return self._cached(
+            "events_per_bucket",
+            "SELECT bucket, feature, events, tokens, latency_sum / NULLIF(latency_count, 0) "
+            "FROM rollup_events WHERE grain = ? AND bucket >= ? AND feature NOT LIKE 'span:%' "
+            "ORDER BY bucket, feature",
+            (grain, since)
+        )
+
+    def feature_totals(self, since=""):
+        return self._cached(
+            "feature_totals",
+            "SELECT feature, SUM(events), SUM(tokens) FROM rollup_events "
+            "WHERE grain = 'day' AND bucket >= ? AND feature NOT LIKE 'span:%' "
+            "GROUP BY feature ORDER BY SUM(events) DESC",
+            (since,)
+        )
+
+    def latency_percentiles(self, since="", percentiles=(50, 95, 99)):
+        """{feature: {p: ms}} from the daily latency histograms"""
+        rows = self._cached(
+            "latency_hist",
+            "SELECT feature, bin, SUM(count) FROM rollup_latency "
+            "WHERE grain = 'day' AND bucket >= ? AND feature NOT LIKE 'span:%' "
+            "GROUP BY feature, bin ORDER BY feature, bin",
+            (since,)
+        )
+        return percentiles_from_bins(rows, percentiles)
+
+    def stage_percentiles(self, since="", percentiles=(50, 95, 99)):
+        """{stage: {"count", p: ms}} for traced spans, from the same latency histograms"""
+        rows = self._cached(
+            "stage_hist",
+            "SELECT substr(feature, 6), bin, SUM(count) FROM rollup_latency "
+            "WHERE grain = 'day' AND bucket >= ? AND feature LIKE 'span:%' "
+            "GROUP BY feature, bin ORDER BY feature, bin",
+            (since,)
+        )
+        result = percentiles_from_bins(rows, percentiles)
+        for stage, count in self._cached(
+            "stage_counts",
+            "SELECT substr(feature, 6), SUM(events) FROM rollup_events "
+            "WHERE grain = 'day' AND bucket >= ? AND feature LIKE 'span:%' GROUP BY feature",
+            (since,)
+        ):
+            result.setdefault(stage, {})["count"] = count
+        return result
+
+    def slowest_spans(self, since="", limit=20):
+        return self._cached(
+            "slowest_spans",
+            "SELECT started_at, name, duration_ms, status, session_id, trace_id FROM traces "
+            "WHERE started_at >= ? ORDER BY duration_ms DESC LIMIT ?",
+            (since, limit)
+        )
+
+
+def percentiles_from_bins(rows, percentiles=(50, 95, 99)):
+    """rows of (key, bin, count) sorted by key, bin -> {key: {p: value}}"""
+    grouped = {}
+    for key, b, count in rows:
+        grouped.setdefault(key, []).append((b, count))
+    result = {}
+    for key, bins in grouped.items():
+        total = sum(c for _, c in bins)
+        values = {}
+        for p in percentiles:
+            target, running = total * p / 100, 0
+            for b, count in bins:
+                running += count
+                if running >= target:
+                    values[p] = round(bin_value(b), 1)
+                    break
+        result[key] = values
+    return result
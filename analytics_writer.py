@@ -0,0 +1,142 @@
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from analytics_store import event_writes
+from database import apply_pragmas
+
+
+# =====================================================
+# BATCHED BACKGROUND WRITER
+# =====================================================
+
+_STOP = object()
+
+
+def is_busy(error):
+    """True for the transient "database is locked" / "busy" errors worth retrying"""
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+class AnalyticsWriter:
+    """Queues writes and flushes them from one thread in batched transactions
+
+    A batch is committed when `batch_size` writes are waiting or
+    `flush_interval` seconds have passed since the first one. When the queue
+    is full, callers wait up to `put_timeout` seconds (backpressure) and the
+    write is dropped and counted if there is still no room. A batch that
+    hits a locked database is retried; any other SQLite error fails it at
+    once and is kept in `last_error` together with the statement.
+    """
+
+    def __init__(self, db_path, batch_size=256, flush_interval=0.5, max_queue=20000, put_timeout=0.1):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_error = None
+        self.thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def submit(self, sql, params):
+        """Queue one write; returns False if it had to be dropped"""
+        return self.submit_many([(sql, params)])
+
+    def submit_many(self, writes):
+        """Queue statements that must land in the same transaction"""
+        try:
+            self.queue.put(writes, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def log(self, event_type, event_data, session_id=None, latency_ms=None, tokens=0):
+        """Queue an analytics event together with its rollup updates"""
+        return self.submit_many(event_writes(event_type, event_data, session_id, latency_ms, tokens))
+
+    def flush(self, timeout=10):
+        """Block until everything queued so far has been committed"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self.queue.unfinished_tasks
+
+    def close(self, timeout=10):
+        """Flush outstanding writes and stop the writer thread"""
+        if self.thread.is_alive():
+            try:
+                self.queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            self.thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_error": self.last_error
+        }
+
+    def _run(self):
+        conn = apply_pragmas(sqlite3.connect(self.db_path, timeout=10))
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            if item is _STOP:
+                self.queue.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self.queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(conn, batch)
+            for _ in batch:
+                self.queue.task_done()
+        conn.close()
+
+    def _commit(self, conn, batch):
+        sql = None
+        for attempt in range(5):
+            try:
+                with conn:
+                    for writes in batch:
+                        for sql, params in writes:
+                            conn.execute(sql, params)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except sqlite3.OperationalError as e:
+                error = e
+                if not is_busy(e):
+                    break
+                # "database is locked" from another process: back off and retry
+                time.sleep(0.05 * (attempt + 1))
+            except sqlite3.Error as e:
+                error = e
+                break
+        # no such table / column and the like won't fix themselves: fail the batch now
+        self.last_error = f"{error} in {sql!r}" if sql else str(error)
+        self.errors += len(batch)
@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, MIGRATIONS
+from chat_store import ChatStore, ChatCompactor
+
+
+# =====================================================
+# OPEN / EDIT LATENCY FOR A VERY LONG SESSION
+# =====================================================
+# python benchmarks/bench_chat_history.py [session_messages] [other_messages]
+#
+# "before" is the schema and queries chatbot_advanced used earlier: the whole
+# session loaded on open, and Delete by `content` (every duplicate goes,
+# found by scanning the session's rows). "after" is ChatStore: one keyset
+# page plus an index-only token total on open, and a soft delete by id,
+# with ChatCompactor removing tombstones afterwards.
+
+def seed(db, session_messages, other_messages, seed=7):
+    rng = random.Random(seed)
+    now = datetime.now().isoformat()
+    rows = [("big", "user" if i % 2 else "assistant", f"message {rng.randint(0, 500)} " + "x" * 200, 12, now)
+            for i in range(session_messages)]
+    rows += [(f"s{i % 1000}", "user", "hello " + "y" * 200, 12, now) for i in range(other_messages)]
+    rng.shuffle(rows)
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO chats (session_id, role, content, tokens, timestamp) VALUES (?, ?, ?, ?, ?)", rows
+        )
+
+
+def timed(fn, repeat=20):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    session_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    other_messages = int(sys.argv[2]) if len(sys.argv) > 2 else 150_000
+    workdir = tempfile.mkdtemp()
+
+    before = Database(os.path.join(workdir, "before.db"), MIGRATIONS[:5])
+    seed(before, session_messages, other_messages)
+    after = Database(os.path.join(workdir, "after.db"))
+    seed(after, session_messages, other_messages)
+    store = ChatStore(after)
+    ids = [r[0] for r in after.query("SELECT id FROM chats WHERE session_id='big' ORDER BY id")]
+    contents = [r[0] for r in before.query("SELECT content FROM chats WHERE session_id='big' ORDER BY id")]
+    print(f"session of {session_messages} messages among {session_messages + other_messages} rows")
+
+    def open_before():
+        before.query("SELECT id, role, content, tokens FROM chats WHERE session_id='big' ORDER BY id")
+        before.query_one("SELECT COALESCE(SUM(tokens), 0) FROM chats WHERE session_id='big'")
+
+    def open_after():
+        store.page("big", limit=30)
+        store.total_tokens("big")
+
+    deleted_before = []
+
+    def delete_before():
+        cursor = before.execute("DELETE FROM chats WHERE session_id=? AND content=?", ("big", contents.pop()))
+        deleted_before.append(cursor.rowcount)
+
+    def delete_after():
+        store.delete("big", ids.pop())
+
+    oldest = ids[len(ids) // 2]
+    print(f"  open session     before={timed(open_before):8.2f}ms  after={timed(open_after):8.2f}ms")
+    print(f"  older page       {'':17}  after={timed(lambda: store.page('big', oldest, 30)):8.2f}ms")
+    print(f"  delete message   before={timed(delete_before):8.2f}ms  after={timed(delete_after):8.2f}ms  "
+          f"(before removed {sum(deleted_before)} rows for 20 clicks)")
+
+    started = time.perf_counter()
+    cleared = store.clear("big")
+    print(f"  clear session    {'':17}  after={(time.perf_counter() - started) * 1000:8.2f}ms  ({cleared} rows)")
+
+    compactor = ChatCompactor(after, grace_seconds=0)
+    latencies = []
+    started = time.perf_counter()
+    while compactor.compact_once(max_batches=1):
+        t = time.perf_counter()
+        store.append("s1", "user", "written during compaction", 1)
+        latencies.append((time.perf_counter() - t) * 1000)
+    print(f"  compaction       {(time.perf_counter() - started):.2f}s for {compactor.compacted} rows; "
+          f"writes in between p50={sorted(latencies)[len(latencies) // 2]:.2f}ms max={max(latencies):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import StructuredSplitter, split_file, split_pool, iter_split_uploads
+from lexical_index import LexicalIndex, hybrid_search
+from vector_store import chunk_id
+from bench_retrieval import COMPONENTS, ACTIONS, FILLER, DenseStandIn
+from stub_servers import CharSplitter, Doc
+
+
+# =====================================================
+# CHUNK COUNT / THROUGHPUT / RETRIEVAL QUALITY
+# =====================================================
+# python benchmarks/bench_chunking.py [documents]
+#
+# Synthetic service manuals, as markdown files and as PDF-style text pages
+# (numbered headings, column-aligned tables, indented code). Every question
+# has one answer unit: a parts-table row (only useful together with the
+# table header that names its columns), a procedure sentence, or a whole
+# code function. "answerable@4" counts questions where one of the top 4
+# chunks contains the complete unit. "fixed" is a 1000/100 character
+# splitter like the previous RecursiveCharacterTextSplitter defaults.
+
+BUTTONS = ["mode", "reset", "service", "menu", "power"]
+
+
+def manual(number, rng, pdf=False):
+    """(text, questions) for one manual; questions are (query, [strings the answer chunk needs])"""
+    parts, questions = [], []
+    heading = (lambda level, title: f"{number % 9 + 1}.{level} {title}\n") if pdf else \
+        (lambda level, title: f"{'#' * (level + 1)} {title}\n\n")
+    parts.append(f"{'' if pdf else '# '}SERVICE MANUAL {number}\n\n")
+    for s, component in enumerate(rng.sample(COMPONENTS, 5)):
+        parts.append(heading(s + 1, f"{component.title()} Service"))
+        for _ in range(rng.randint(2, 4)):
+            parts.append(" ".join(
+                f"To {rng.choice(ACTIONS)} the {component} {' '.join(rng.sample(FILLER, 12))}."
+                for _ in range(rng.randint(3, 6))
+            ) + "\n\n")
+        seconds, button = rng.randint(3, 30), rng.choice(BUTTONS)
+        answer = f"Reset the {component} controller of unit M{number} by holding the {button} button for {seconds} seconds."
+        parts.append(f"{' '.join(rng.sample(FILLER, 10)).capitalize()}. {answer} "
+                     f"{' '.join(rng.sample(FILLER, 12)).capitalize()}.\n\n")
+        questions.append((f"how do I reset the {component} controller on unit M{number}", [answer]))
+
+        header = ("Part number     Description            Torque\n" if pdf else
+                  "| Part number | Description | Torque |\n|---|---|---|\n")
+        rows = []
+        for _ in range(rng.randint(12, 40)):
+            part = f"PN-{rng.randint(1000, 9999)}-{rng.choice('ABCDEFGH')}{rng.randint(1, 9)}"
+            description = f"{component} {rng.choice(['bolt', 'bracket', 'seal', 'clamp', 'housing'])}"
+            torque = f"{rng.randint(5, 120)} Nm"
+            rows.append(f"{part}     {description:<22} {torque}\n" if pdf else f"| {part} | {description} | {torque} |\n")
+            if rng.random() < 0.15:
+                questions.append((f"torque for part {part}", [header.splitlines()[0].strip(), rows[-1].strip()]))
+        parts.append(header + "".join(rows) + "\n")
+
+        function = (f"def calibrate_{component.replace(' ', '_')}_m{number}(reading):\n"
+                    f"    offset = {rng.randint(1, 99)}\n"
+                    f"    scaled = reading * {rng.randint(2, 9)}\n"
+                    f"    return scaled - offset\n")
+        code = ("\n".join("    " + line for line in function.splitlines()) + "\n\n") if pdf else \
+            f"```python\n{function}```\n\n"
+        parts.append(code)
+        questions.append((f"calibrate_{component.replace(' ', '_')}_m{number} reading offset",
+                          [line.strip() for line in function.splitlines()]))
+    return "".join(parts), questions
+
+
+def pdf_pages(text, source, page_chars=3000):
+    """Cut text into ~page_chars pages on line boundaries, like a PDF's pages"""
+    pages, buffer, size = [], [], 0
+    for line in text.splitlines(keepends=True):
+        buffer.append(line)
+        size += len(line)
+        if size >= page_chars:
+            pages.append(Doc("".join(buffer), {"source": source, "page": len(pages)}))
+            buffer, size = [], 0
+    if buffer:
+        pages.append(Doc("".join(buffer), {"source": source, "page": len(pages)}))
+    return pages
+
+
+def corpus(documents, seed=5):
+    rng = random.Random(seed)
+    files, questions, sources = [], [], []
+    for number in range(documents):
+        pdf = number % 2 == 1
+        text, asked = manual(number, rng, pdf)
+        source = f"manual{number}.{'pdf' if pdf else 'md'}"
+        pages = pdf_pages(text, source) if pdf else [Doc(text, {"source": source, "page": 0})]
+        files.append((source, text, pages))
+        questions += asked
+        sources += [source] * len(asked)
+    return files, questions, sources
+
+
+def answerable(text, needed):
+    flat = " ".join(text.split())
+    return all(" ".join(n.split()) in flat for n in needed)
+
+
+def evaluate(name, files, questions, sources, splitter):
+    started = time.perf_counter()
+    chunks = [c for _, _, pages in files for c in splitter.split_documents(pages)]
+    seconds = time.perf_counter() - started
+    megabytes = sum(len(text) for _, text, _ in files) / 1024 / 1024
+
+    ids = [chunk_id(c.metadata["source"], c.page_content) for c in chunks]
+    lexical = LexicalIndex(os.path.join(tempfile.mkdtemp(), "lexical.db"))
+    lexical.add(ids, [c.page_content for c in chunks], [dict(c.metadata, content_hash=i) for c, i in zip(chunks, ids)])
+    dense = DenseStandIn([{"id": i, "text": c.page_content} for i, c in zip(ids, chunks)], latency=0)
+    text_of = dict(zip(ids, (c.page_content for c in chunks)))
+
+    # answer units cut across chunks: no single chunk of that manual holds all of them
+    flat_by_source = {}
+    for c in chunks:
+        flat_by_source.setdefault(c.metadata["source"], []).append(" ".join(c.page_content.split()))
+    broken = sum(
+        not any(all(" ".join(n.split()) in flat for n in needed) for flat in flat_by_source[source])
+        for source, (_, needed) in zip(sources, questions)
+    )
+
+    found = {"bm25": 0, "hybrid": 0}
+    context_chars = {"bm25": 0, "hybrid": 0}
+    for query, needed in questions:
+        results = {
+            "bm25": [text_of[cid] for cid, _ in lexical.search(query, 4)],
+            "hybrid": [d.page_content for d in hybrid_search(dense, lexical, query, k=4, make_document=Doc)[0]]
+        }
+        for mode, texts in results.items():
+            found[mode] += any(answerable(t, needed) for t in texts)
+            context_chars[mode] += sum(len(t) for t in texts)
+
+    n = len(questions)
+    print(f"  {name:<11} chunks={len(chunks):6d}  avg={sum(len(c.page_content) for c in chunks) / len(chunks):6.0f} chars  "
+          f"split={megabytes / seconds:6.1f} MB/s  broken units={broken / n:5.1%}")
+    for mode in found:
+        print(f"  {'':<11} {mode:<6} answerable@4={found[mode] / n:5.1%}  "
+              f"context={context_chars[mode] / n:6.0f} chars/question")
+
+
+def parallel(files, workers):
+    uploads = [(source, text.encode("utf-8")) for source, text, _ in files]
+    started = time.perf_counter()
+    serial = sum(len(split_file(name.replace(".pdf", ".txt"), data)) for name, data in uploads)
+    serial_s = time.perf_counter() - started
+
+    pool = split_pool(workers)
+    list(iter_split_uploads(pool, uploads[:workers]))  # start the workers
+    started = time.perf_counter()
+    pooled = sum(len(chunks) for _, chunks, _ in iter_split_uploads(
+        pool, [(name.replace(".pdf", ".txt"), data) for name, data in uploads]
+    ))
+    pooled_s = time.perf_counter() - started
+    pool.shutdown()
+    print(f"  {len(uploads)} files: serial {serial_s:.2f}s ({serial} chunks), "
+          f"{workers} worker processes {pooled_s:.2f}s ({pooled} chunks) on {os.cpu_count()} CPUs")
+
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    files, questions, sources = corpus(documents)
+    print(f"{documents} manuals, {sum(len(t) for _, t, _ in files) / 1024 / 1024:.1f} MB, {len(questions)} questions")
+    evaluate("fixed", files, questions, sources, CharSplitter(1000, 100))
+    evaluate("structured", files, questions, sources, StructuredSplitter())
+    print("parallel splitting (read + split per file)")
+    parallel(files, min(4, os.cpu_count() or 1))
+
+
+if __name__ == "__main__":
+    main()
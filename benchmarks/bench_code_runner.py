@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import subprocess
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_runner import CodeRunner
+
+
+# =====================================================
+# CODE RUNNER: START LATENCY + RUNAWAY SNIPPETS
+# =====================================================
+# python benchmarks/bench_code_runner.py [runs]
+#
+# Compares a fresh interpreter per snippet (subprocess) with the warm pool,
+# then checks that a runaway loop is stopped on time while other sessions
+# keep running.
+
+SNIPPET = "import json, math, statistics\nprint(statistics.mean(math.sqrt(i) for i in range(1000)))"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def report(name, latencies):
+    print(f"{name:<22} p50={percentile(latencies, 0.5):7.2f}ms  p95={percentile(latencies, 0.95):7.2f}ms")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", SNIPPET], capture_output=True, timeout=30)
+        latencies.append((time.perf_counter() - started) * 1000)
+    report("fresh interpreter", latencies)
+
+    runner = CodeRunner(workers=2, max_runs=20)
+    runner.run("pass")
+    latencies = []
+    for _ in range(runs):
+        result = runner.run(SNIPPET)
+        latencies.append(result.seconds * 1000)
+    report("warm worker pool", latencies)
+
+    # one session hangs; another keeps getting answers from the second worker
+    stuck = {}
+    thread = threading.Thread(target=lambda: stuck.update(result=runner.run("while True: pass", timeout=2)))
+    thread.start()
+    time.sleep(0.1)
+    answered = 0
+    while thread.is_alive():
+        answered += runner.run("print(1)").status == "ok"
+    thread.join()
+    result = stuck["result"]
+    print(f"runaway loop: {result.status} after {result.seconds:.2f}s, {answered} other runs served meanwhile")
+    print(f"pool stats: {runner.stats()}")
+    runner.close()
+
+
+if __name__ == "__main__":
+    main()
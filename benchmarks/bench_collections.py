@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from lexical_index import LexicalIndex, hybrid_search, chroma_filter
+from rag_collections import CollectionRegistry, ShardPool, team_namespace, user_namespace
+from bench_retrieval import build_corpus, DenseStandIn, percentile
+from stub_servers import Doc
+
+
+# =====================================================
+# SMALL-COLLECTION QUERIES IN A LARGE DEPLOYMENT
+# =====================================================
+# python benchmarks/bench_collections.py [total_chunks] [team_docs]
+#
+# One team collection of `team_docs` documents (20 chunks each) lives in a
+# deployment holding `total_chunks` chunks overall. "single index" keeps
+# everything in one BM25 index + one vector index and filters by
+# namespace/collection metadata; "sharded" is ShardPool, where the team
+# collection is its own shard. The dense side is a brute-force cosine
+# stand-in (no network latency) that applies the metadata filter before
+# scoring, like Chroma's pre-filter.
+
+CHUNKS_PER_DOC = 20
+
+
+class FilteredDense(DenseStandIn):
+    """Brute-force dense search that pre-filters on flat metadata equality"""
+
+    def __init__(self, chunks):
+        super().__init__(chunks, latency=0)
+
+    def similarity_search(self, query, k=4, filter=None):
+        terms = (filter or {}).get("$and", [filter] if filter else [])
+        q = self.embed(query)
+        candidates = [
+            (vec, c) for vec, c in self.vectors.values()
+            if all(c["metadata"].get(key) == value for term in terms for key, value in term.items())
+        ]
+        scored = sorted(((sum(q.get(w, 0.0) * v for w, v in vec.items()), c) for vec, c in candidates),
+                        key=lambda x: -x[0])[:k]
+        return [Doc(c["text"], c["metadata"]) for _, c in scored]
+
+
+def assign(chunks, team_docs, team, rest_tenants=200):
+    """Tag chunks with namespace/collection/source: the first team_docs*20 go to the team"""
+    team_size = team_docs * CHUNKS_PER_DOC
+    for i, c in enumerate(chunks):
+        if i < team_size:
+            namespace, collection, doc = team, "handbook", i // CHUNKS_PER_DOC
+        else:
+            tenant = i % rest_tenants
+            namespace, collection, doc = user_namespace(f"user{tenant}"), "notes", i // CHUNKS_PER_DOC
+        c["metadata"] = {"namespace": namespace, "collection": collection,
+                         "source": f"{namespace}/doc{doc}.pdf", "content_hash": c["id"]}
+    return chunks[:team_size], chunks[team_size:]
+
+
+def index(lexical, chunks):
+    for i in range(0, len(chunks), 5000):
+        batch = chunks[i:i + 5000]
+        lexical.add([c["id"] for c in batch], [c["text"] for c in batch], [c["metadata"] for c in batch])
+
+
+def timed(queries, search):
+    latencies, leaked = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        docs = search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        leaked += sum(d.metadata.get("collection") != "handbook" for d in docs)
+    return latencies, leaked
+
+
+def report(name, latencies, leaked):
+    print(f"  {name:<16} p50={percentile(latencies, 50):8.2f}ms  p95={percentile(latencies, 95):8.2f}ms  "
+          f"results from other collections: {leaked}")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    team_docs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    team = team_namespace("support")
+    chunks = build_corpus(total)
+    team_chunks, other_chunks = assign(chunks, team_docs, team)
+    workdir = tempfile.mkdtemp()
+
+    started = time.perf_counter()
+    single_lexical = LexicalIndex(os.path.join(workdir, "single.db"))
+    index(single_lexical, chunks)
+    single_dense = FilteredDense(chunks)
+    print(f"single index: {total} chunks in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    db = Database(os.path.join(workdir, "chat_history.db"))
+    registry = CollectionRegistry(db)
+    registry.create(team, "handbook")
+    registry.create(user_namespace("everyone-else"), "notes")
+    dense_by_shard = {
+        registry.get(team, "handbook").shard: FilteredDense(team_chunks),
+        registry.get(user_namespace("everyone-else"), "notes").shard: FilteredDense(other_chunks)
+    }
+    pool = ShardPool(registry, embeddings=object(), persist_directory=os.path.join(workdir, "shards"),
+                     store_factory=lambda shard, embeddings, directory: dense_by_shard[shard])
+    index(pool.get(team, "handbook").lexical, team_chunks)
+    index(pool.get(user_namespace("everyone-else"), "notes").lexical, other_chunks)
+    print(f"sharded: {len(team_chunks)} team chunks + {len(other_chunks)} others in "
+          f"{time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(5)
+    sample = rng.sample(team_chunks, min(50, len(team_chunks)))
+    suites = {
+        "natural-language queries": [c["question"] for c in sample],
+        "identifier queries": [c["part"] for c in sample]
+    }
+    where = {"namespace": team, "collection": "handbook"}
+    shard = pool.get(team, "handbook")
+
+    for title, queries in suites.items():
+        print(title)
+        report("single bm25", *timed(queries, lambda q: [
+            Doc("", single_lexical.fetch([cid])[cid][1]) for cid, _ in single_lexical.search(q, 20, where=where)
+        ]))
+        report("sharded bm25", *timed(queries, lambda q: [
+            Doc("", shard.lexical.fetch([cid])[cid][1]) for cid, _ in shard.lexical.search(q, 20)
+        ]))
+        report("single dense", *timed(queries, lambda q: single_dense.similarity_search(
+            q, 20, filter=chroma_filter(where)
+        )))
+        report("sharded dense", *timed(queries, lambda q: shard.store.similarity_search(q, 20)))
+        report("single hybrid", *timed(queries, lambda q: hybrid_search(
+            single_dense, single_lexical, q, k=4, where=where, make_document=Doc
+        )[0]))
+        report("sharded hybrid", *timed(queries, lambda q: shard.search(q, k=4, make_document=Doc)[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+
+# =====================================================
+# READ LATENCY UNDER A CONCURRENT WRITER
+# =====================================================
+# python benchmarks/bench_database.py [readers] [seconds]
+#
+# "before" is the old setup: one check_same_thread=False connection in the
+# default rollback-journal mode, shared by every session thread behind a
+# lock. "after" is Database: a WAL connection per thread. In both cases one
+# thread keeps appending chat turns in small transactions while the readers
+# page through history the way load_history() does.
+
+def seed(conn, sessions=50, turns=200):
+    now = datetime.now().isoformat()
+    conn.executemany(
+        "INSERT INTO chats (session_id, role, content, tokens, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [(f"s{s}", "user" if t % 2 else "assistant", "x" * 200, 10, now)
+         for s in range(sessions) for t in range(turns)]
+    )
+
+
+def run(readers, seconds, read, write):
+    stop = threading.Event()
+    latencies, writes = [], [0]
+    lock = threading.Lock()
+
+    def reader(n):
+        mine = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            read(f"s{n % 50}")
+            mine.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(mine)
+
+    def writer():
+        while not stop.is_set():
+            write()
+            writes[0] += 1
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return sorted(latencies), writes[0]
+
+
+def summarize(name, latencies, writes, seconds):
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+    print(f"{name:<28} {len(latencies) / seconds:8.0f} reads/s  {writes / seconds:6.0f} writes/s  "
+          f"p50={p(0.5):6.2f}ms  p99={p(0.99):7.2f}ms")
+
+
+HISTORY = "SELECT id, role, content, tokens FROM chats WHERE session_id=? AND id<? ORDER BY id DESC LIMIT 31"
+APPEND = "INSERT INTO chats (session_id, role, content, tokens, timestamp) VALUES ('w', 'user', 'hello', 1, ?)"
+
+
+def main():
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    # before: shared connection + lock, rollback journal
+    path = os.path.join(tempfile.mkdtemp(), "chat_history.db")
+    Database(path).close()
+    shared = sqlite3.connect(path, check_same_thread=False)
+    shared.execute("PRAGMA journal_mode=DELETE")
+    seed(shared)
+    shared.commit()
+    shared_lock = threading.Lock()
+
+    def shared_read(session_id):
+        with shared_lock:
+            shared.execute(HISTORY, (session_id, 2 ** 63 - 1)).fetchall()
+
+    def shared_write():
+        with shared_lock:
+            shared.execute(APPEND, (datetime.now().isoformat(),))
+            shared.commit()
+
+    latencies, writes = run(readers, seconds, shared_read, shared_write)
+    summarize("shared connection", latencies, writes, seconds)
+
+    # after: connection per thread, WAL
+    path = os.path.join(tempfile.mkdtemp(), "chat_history.db")
+    db = Database(path)
+    with db.transaction() as conn:
+        seed(conn)
+
+    def pooled_write():
+        with db.transaction() as conn:
+            conn.execute(APPEND, (datetime.now().isoformat(),))
+
+    latencies, writes = run(readers, seconds, lambda s: db.query(HISTORY, (s, 2 ** 63 - 1)), pooled_write)
+    summarize("connection per thread (WAL)", latencies, writes, seconds)
+
+
+if __name__ == "__main__":
+    main()
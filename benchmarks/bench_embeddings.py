@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_backends import (
+    EMBEDDING_BACKENDS, LOCAL_EMBEDDINGS_AVAILABLE, LocalEmbeddings, length_batches
+)
+from chunking import StructuredSplitter
+from bench_chunking import corpus
+
+
+# =====================================================
+# LOCAL EMBEDDING THROUGHPUT / QUERY LATENCY
+# =====================================================
+# python benchmarks/bench_embeddings.py [backend] [documents]
+#
+# Embeds the chunks of the synthetic manuals from bench_chunking.py.
+# "padding" is the share of encoder work spent on pad tokens (every text
+# in a batch is padded to the longest; ~4 chars per token, truncated at the
+# backend's max_tokens) when chunks are batched in arrival order versus
+# longest-first. With sentence-transformers installed it also times the
+# model: documents/s for both batch orders and single-query latency.
+
+def padding(texts, batches, max_tokens):
+    tokens = [min(max_tokens, len(t) // 4 + 2) for t in texts]
+    padded = sum(len(batch) * max(tokens[i] for i in batch) for batch in batches)
+    return 1 - sum(tokens) / padded
+
+
+def arrival_batches(texts, batch_size):
+    return [list(range(i, min(i + batch_size, len(texts)))) for i in range(0, len(texts), batch_size)]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else "minilm"
+    documents = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    backend = EMBEDDING_BACKENDS[name]
+    files, questions, _ = corpus(documents)
+    splitter = StructuredSplitter()
+    texts = [c.page_content for _, _, pages in files for c in splitter.split_documents(pages)]
+    # ingest batches mix chunk lengths (headings, table pieces, prose)
+    texts = texts[::2] + texts[1::2]
+    print(f"{len(texts)} chunks, {name} ({backend.model}, max {backend.max_tokens} tokens)")
+
+    embeddings = LocalEmbeddings(backend)
+    sorted_batches = length_batches(texts, embeddings.batch_size, embeddings.max_batch_chars)
+    print(f"  padding   arrival order {padding(texts, arrival_batches(texts, embeddings.batch_size), backend.max_tokens):5.1%}"
+          f"   longest first {padding(texts, sorted_batches, backend.max_tokens):5.1%}")
+
+    if not LOCAL_EMBEDDINGS_AVAILABLE:
+        print("  model timings skipped (sentence-transformers not installed)")
+        return
+    embeddings.embed_query("warm up")
+    print(f"  engine    {embeddings.engine}")
+    encode = embeddings._encode
+    arrival_s = timed(lambda: [encode([texts[i] for i in b]) for b in arrival_batches(texts, embeddings.batch_size)])
+    sorted_s = timed(lambda: embeddings.embed_documents(texts))
+    print(f"  documents arrival order {len(texts) / arrival_s:7.1f}/s   longest first {len(texts) / sorted_s:7.1f}/s")
+
+    durations = []
+    for query, _ in questions[:200]:
+        started = time.perf_counter()
+        embeddings.embed_query(query)
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    print(f"  query     p50 {durations[len(durations) // 2]:6.1f} ms   p95 {durations[int(0.95 * len(durations))]:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
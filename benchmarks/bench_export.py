@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from data_export import export_data, export_filename, import_data, PARQUET_AVAILABLE
+
+
+# =====================================================
+# EXPORT / IMPORT THROUGHPUT AND PEAK MEMORY
+# =====================================================
+# python benchmarks/bench_export.py [chat_rows]
+#
+# Exports every table of a database holding `chat_rows` chats (plus half as
+# many analytics events) in each format, then imports the file into an
+# empty database. Peak memory is Python allocations seen by tracemalloc;
+# it should stay flat as `chat_rows` grows.
+
+def seed(db, chat_rows, seed=3):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    chats = [(f"s{i % 500}", "user" if i % 2 else "assistant", "message " + "x" * rng.randint(50, 400),
+              rng.randint(5, 120), (start + timedelta(minutes=i)).isoformat()) for i in range(chat_rows)]
+    events = [("chat_response", "{}", (start + timedelta(minutes=2 * i)).isoformat(), f"s{i % 500}",
+               rng.uniform(200, 3000), rng.randint(5, 500)) for i in range(chat_rows // 2)]
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO chats (session_id, role, content, tokens, timestamp) VALUES (?, ?, ?, ?, ?)", chats
+        )
+        conn.executemany(
+            "INSERT INTO analytics (event_type, event_data, timestamp, session_id, latency_ms, tokens) "
+            "VALUES (?, ?, ?, ?, ?, ?)", events
+        )
+
+
+def measured(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    chat_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    workdir = tempfile.mkdtemp()
+    source = Database(os.path.join(workdir, "source.db"))
+    seed(source, chat_rows)
+    print(f"{chat_rows} chats + {chat_rows // 2} analytics events")
+
+    variants = [("ndjson", None), ("ndjson", "gzip"), ("ndjson", "xz")]
+    if PARQUET_AVAILABLE:
+        variants += [("parquet", "zstd"), ("parquet", "snappy")]
+    else:
+        print("  parquet          skipped (pyarrow not installed)")
+
+    for fmt, compression in variants:
+        path = os.path.join(workdir, export_filename(fmt, compression))
+        counts, export_s, export_mb = measured(lambda: export_data(source, path, fmt, compression))
+        rows = sum(counts.values())
+        target = Database(os.path.join(workdir, f"target-{fmt}-{compression}.db"))
+        _, import_s, import_mb = measured(lambda: import_data(target, path))
+        print(f"  {fmt:<8}{compression or 'plain':<8} size={os.path.getsize(path) / 1024 / 1024:7.1f}MB  "
+              f"export={rows / export_s:8.0f} rows/s peak={export_mb:5.1f}MB  "
+              f"import={rows / import_s:8.0f} rows/s peak={import_mb:5.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import tempfile
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_cache import ImageCache, image_url, generate_image_bytes, iter_variants
+from stub_servers import StubServer, ImageHandler
+
+
+# =====================================================
+# IMAGE CACHE + CONCURRENT VARIANTS AGAINST A STUB SERVER
+# =====================================================
+# python benchmarks/bench_images.py [variants] [latency_s]
+#
+# "before" is the old generate_image(): one blocking GET per image, no reuse
+# (its PIL decode/re-encode is left out; it only adds to the old path).
+# The cached path needs httpx (the shared async client).
+
+def main():
+    variants = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+
+    with StubServer(ImageHandler, latency=latency, size=256 * 1024) as server:
+        base_url = server.base_url.replace("/v1", "/prompt")
+        cache = ImageCache(tempfile.mkdtemp(), max_bytes=16 * 1024 * 1024)
+        prompt = "a lighthouse at dusk, oil painting"
+
+        started = time.perf_counter()
+        for seed in range(variants):
+            with urllib.request.urlopen(image_url(prompt, 512, 512, seed, base_url), timeout=30) as response:
+                response.read()
+        print(f"sequential blocking GETs     {variants} images  {time.perf_counter() - started:6.2f}s")
+
+        started = time.perf_counter()
+        results = list(iter_variants(cache, prompt, variants, 512, 512, base_url=base_url))
+        errors = [r for r in results if r[2]]
+        print(f"concurrent variants (cold)   {variants} images  {time.perf_counter() - started:6.2f}s  errors={len(errors)}")
+
+        started = time.perf_counter()
+        results = list(iter_variants(cache, prompt, variants, 512, 512, base_url=base_url))
+        cached = sum(1 for r in results if r[1] and r[1][1])
+        print(f"concurrent variants (warm)   {variants} images  {time.perf_counter() - started:6.2f}s  cached={cached}")
+
+        started = time.perf_counter()
+        data, hit = generate_image_bytes(cache, prompt, 512, 512, 0, base_url=base_url)
+        print(f"single cached image          {(time.perf_counter() - started) * 1000:6.2f}ms  "
+              f"cached={hit}  {len(data) // 1024} KB")
+
+        # eviction: 16 MB budget, 256 KB images
+        for seed in range(100, 180):
+            generate_image_bytes(cache, prompt, 512, 512, seed, base_url=base_url)
+        print(f"after 80 more images: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
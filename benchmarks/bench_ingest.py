@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest_pipeline import ingest_document, embed_with_backoff, AdaptiveBackoff
+from stub_servers import StubServer, EmbeddingsHandler, StubEmbeddings, MemoryStore, CharSplitter, synthetic_pages
+
+
+# =====================================================
+# INGEST THROUGHPUT BENCHMARK
+# =====================================================
+# python benchmarks/bench_ingest.py [pages]
+
+def run_single_call(base_url, pages):
+    """Old path: split everything, then one blocking embed call"""
+    splitter = CharSplitter()
+    started = time.perf_counter()
+    chunks = splitter.split_documents(list(synthetic_pages(pages)))
+    embed_with_backoff(StubEmbeddings(base_url), [c.page_content for c in chunks], AdaptiveBackoff(base_delay=0.05))
+    return len(chunks), time.perf_counter() - started
+
+
+def run_pipeline(base_url, pages, batch_size, max_in_flight):
+    store = MemoryStore()
+    report = ingest_document(
+        store, "manual.pdf", synthetic_pages(pages), CharSplitter(), StubEmbeddings(base_url),
+        batch_size=batch_size, max_in_flight=max_in_flight, backoff=AdaptiveBackoff(base_delay=0.05)
+    )
+    return report, store
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    settings = {"latency": 0.03, "per_item": 0.002, "dim": 256}
+
+    with StubServer(EmbeddingsHandler, **settings) as server:
+        chunks, seconds = run_single_call(server.base_url, pages)
+        print(f"single blocking call   : {chunks} chunks in {seconds:.2f}s ({chunks / seconds:.0f} chunks/s)")
+
+        for batch_size, in_flight in [(64, 1), (64, 4), (32, 8)]:
+            report, _ = run_pipeline(server.base_url, pages, batch_size, in_flight)
+            stats = report.as_dict()
+            print(f"batch={batch_size:<3} in_flight={in_flight:<2}: {stats['embedded']} chunks in {stats['seconds']:.2f}s "
+                  f"({stats['chunks_per_sec']:.0f} chunks/s)")
+
+    with StubServer(EmbeddingsHandler, throttle_every=5, **settings) as server:
+        report, store = run_pipeline(server.base_url, pages, 64, 4)
+        stats = report.as_dict()
+        print(f"with 429 every 5th req : {stats['embedded']} chunks in {stats['seconds']:.2f}s, "
+              f"{stats['throttled']} throttled, {stats['failed']} failed")
+
+        rerun = ingest_document(store, "manual.pdf", synthetic_pages(pages), CharSplitter(), StubEmbeddings(server.base_url))
+        print(f"re-ingest unchanged    : {rerun.skipped} skipped, {rerun.embedded} embedded in {rerun.seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_servers import StubServer, ChatCompletionsHandler
+
+
+# =====================================================
+# TIME-TO-FIRST-TOKEN: PER-RERUN CLIENT vs POOLED CLIENT
+# =====================================================
+# python benchmarks/bench_llm_client.py [requests]
+#
+# "before" builds a fresh ChatOpenAI for every request, like chatbot_advanced
+# did on every script rerun; "after" goes through llm_clients.chat_model with
+# a changing temperature. The stub is plain HTTP, so the gap shown here is TCP
+# connect + client construction only; against OpenRouter each fresh client
+# also pays a TLS handshake.
+
+def ttft(llm, prompt="hello"):
+    started = time.perf_counter()
+    for _ in llm.stream(prompt):
+        return (time.perf_counter() - started) * 1000
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    print(f"{name:<28} p50={statistics.median(samples):6.1f}ms  "
+          f"p95={samples[int(0.95 * (len(samples) - 1))]:6.1f}ms  mean={statistics.mean(samples):6.1f}ms")
+
+
+def main():
+    from langchain_openai import ChatOpenAI
+    import llm_clients
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with StubServer(ChatCompletionsHandler, ttft=0.02, reply_tokens=32) as server:
+        before = []
+        for i in range(n):
+            llm = ChatOpenAI(model="stub", temperature=0.7 + i * 0.001, base_url=server.base_url, api_key="stub")
+            before.append(ttft(llm))
+
+        after = []
+        for i in range(n):
+            llm = llm_clients.chat_model("stub", 0.7 + i * 0.001, "stub", base_url=server.base_url)
+            after.append(ttft(llm))
+
+    report("new client per request", before)
+    report("pooled client (keep-alive)", after)
+    print(f"pooled clients alive: {llm_clients.pool_stats()['clients']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import shutil
+import random
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from maintenance import Maintenance
+
+
+# =====================================================
+# WRITER LATENCY DURING RETENTION
+# =====================================================
+# python benchmarks/bench_maintenance.py [chat_rows]
+#
+# Half of `chat_rows` chats (and as many analytics events) are older than the
+# retention window. While each variant runs, a writer thread appends a
+# chat message every 2ms and records how long each insert took.
+# "one-shot" is a single DELETE per table followed by VACUUM; "Maintenance"
+# archives to monthly gzip files and deletes in short batches, then runs
+# incremental vacuum and sampled ANALYZE.
+
+NOW = datetime(2026, 10, 18)
+
+
+def seed(path, chat_rows, seed=11):
+    rng = random.Random(seed)
+    db = Database(path)
+    start = NOW - timedelta(days=730)
+    step = timedelta(days=730) / chat_rows
+    rows = [(f"s{i % 300}", "user" if i % 2 else "assistant", "message " + "x" * rng.randint(100, 600),
+             rng.randint(5, 150), (start + step * i).isoformat()) for i in range(chat_rows)]
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO chats (session_id, role, content, tokens, timestamp) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        conn.executemany(
+            "INSERT INTO analytics (event_type, event_data, timestamp, session_id) VALUES (?, ?, ?, ?)",
+            [("chat_response", "{}", r[4], r[0]) for r in rows]
+        )
+    db.close()
+
+
+def with_writer(db, work):
+    latencies, stop = [], threading.Event()
+
+    def write():
+        while not stop.is_set():
+            started = time.perf_counter()
+            db.execute(
+                "INSERT INTO chats (session_id, role, content, tokens, timestamp) VALUES (?, ?, ?, ?, ?)",
+                ("live", "user", "hello", 1, datetime.now().isoformat())
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.002)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    started = time.perf_counter()
+    work()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    writer.join()
+    latencies.sort()
+    return elapsed, latencies
+
+
+def one_shot(db):
+    cutoff = (NOW - timedelta(days=365)).isoformat()
+    db.execute("DELETE FROM chats WHERE timestamp < ?", (cutoff,))
+    db.execute("DELETE FROM analytics WHERE timestamp < ?", (cutoff,))
+    db.execute("VACUUM")
+
+
+def report(name, db, elapsed, latencies):
+    db.query_one("PRAGMA wal_checkpoint(TRUNCATE)")
+    pick = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+    print(f"  {name:<12} {elapsed:6.2f}s  file={os.path.getsize(db.path) / 1024 / 1024:6.1f}MB  "
+          f"writes={len(latencies):5d}  p50={pick(50):6.2f}ms  p99={pick(99):7.2f}ms  max={latencies[-1]:8.2f}ms")
+
+
+def main():
+    chat_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    workdir = tempfile.mkdtemp()
+    template = os.path.join(workdir, "template.db")
+    seed(template, chat_rows)
+    print(f"{chat_rows} chats + {chat_rows} analytics events, half past a 365-day retention; "
+          f"file={os.path.getsize(template) / 1024 / 1024:.1f}MB")
+
+    path = os.path.join(workdir, "one_shot.db")
+    shutil.copy(template, path)
+    db = Database(path)
+    report("one-shot", db, *with_writer(db, lambda: one_shot(db)))
+
+    path = os.path.join(workdir, "batched.db")
+    shutil.copy(template, path)
+    db = Database(path)
+    maintenance = Maintenance(db, archive_dir=os.path.join(workdir, "archive"))
+    report("Maintenance", db, *with_writer(db, lambda: maintenance.run_once(now=NOW, force=True)))
+    _, result = maintenance.last_run()
+    print(f"  longest maintenance transaction {result['max_lock_ms']:.2f}ms over {result['transactions']}; "
+          f"{len(maintenance.archive.files())} archive files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import re
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stream_renderer import StreamRenderer
+
+
+# =====================================================
+# RENDER OVERHEAD FOR A 4K-TOKEN STREAMED REPLY
+# =====================================================
+# python benchmarks/bench_render.py [tokens] [tokens_per_sec]
+#
+# FakeContainer stands in for Streamlit: every markdown() call is one
+# websocket delta whose text the browser re-parses, so we count calls and
+# bytes and run a regex markdown tokenizer over each payload as a proxy for
+# parse cost. A simulated clock advances 1/tokens_per_sec per token, so the
+# time-based cadence behaves as it would against a real model.
+
+_MARKDOWN = re.compile(r"(```|\*\*|__|`|#+ |\n\s*\n|\n[-*] |\[[^\]]*\]\([^)]*\))")
+
+
+class FakeSlot:
+    def __init__(self, stats):
+        self.stats = stats
+
+    def markdown(self, text):
+        started = time.perf_counter()
+        _MARKDOWN.findall(text)
+        self.stats["parse_seconds"] += time.perf_counter() - started
+        self.stats["calls"] += 1
+        self.stats["bytes"] += len(text.encode())
+
+
+class FakeContainer:
+    def __init__(self):
+        self.stats = {"calls": 0, "bytes": 0, "parse_seconds": 0.0, "elements": 0}
+
+    def empty(self):
+        self.stats["elements"] += 1
+        return FakeSlot(self.stats)
+
+
+def synthetic_reply(tokens, seed=5):
+    rng = random.Random(seed)
+    words = ("the model returns a **structured** answer with `inline code` and a few "
+             "sentences per paragraph so that rendering has realistic markdown").split()
+    pieces, in_code = [], False
+    for i in range(tokens):
+        if i % 90 == 89:
+            pieces.append("\n\n")
+        elif i % 600 == 300:
+            pieces.append("\n```python\n" if not in_code else "\n```\n")
+            in_code = not in_code
+        else:
+            pieces.append(" " + rng.choice(words))
+    return pieces
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def naive(pieces):
+    container = FakeContainer()
+    slot = container.empty()
+    full = ""
+    for piece in pieces:
+        full += piece
+        slot.markdown(full + "▌")
+    slot.markdown(full)
+    return container.stats
+
+
+def coalesced(pieces, rate):
+    container = FakeContainer()
+    clock = Clock()
+    renderer = StreamRenderer(container, clock=clock)
+    for piece in pieces:
+        clock.now += 1 / rate
+        renderer.write(piece)
+    renderer.close()
+    return container.stats
+
+
+def main():
+    tokens = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 80
+    pieces = synthetic_reply(tokens)
+
+    for name, stats in (("re-render per chunk", naive(pieces)), ("coalesced + frozen", coalesced(pieces, rate))):
+        print(f"{name:<20} {stats['calls']:>6} updates  {stats['bytes'] / 1e6:8.2f} MB sent  "
+              f"{stats['parse_seconds'] * 1000:8.1f} ms parsing  {stats['elements']:>4} elements")
+
+
+if __name__ == "__main__":
+    main()
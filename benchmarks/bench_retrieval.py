@@ -0,0 +1,121 @@
+import os
+import re
+import sys
+import time
+import math
+import random
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lexical_index import LexicalIndex, hybrid_search
+from stub_servers import Doc
+
+
+# =====================================================
+# RECALL / LATENCY BENCHMARK ON A FIXED LOCAL CORPUS
+# =====================================================
+# python benchmarks/bench_retrieval.py [chunks] [embed_latency_ms]
+#
+# The dense stand-in embeds hashed word counts with digits stripped, which is
+# roughly how general-purpose embeddings blur exact part numbers and error
+# codes; each query embedding also sleeps to simulate the network round-trip.
+
+COMPONENTS = ["coolant pump", "drive belt", "hydraulic valve", "control board", "air filter",
+              "fuel injector", "pressure sensor", "cooling fan", "brake caliper", "gear motor"]
+ACTIONS = ["replace", "inspect", "calibrate", "clean", "tighten", "lubricate", "reset", "align"]
+FILLER = ("the unit should be powered down before service and the technician must wear protective "
+          "equipment while the housing is open and all fasteners are torqued to specification").split()
+
+
+def build_corpus(size, seed=11):
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(size):
+        component = rng.choice(COMPONENTS)
+        action = rng.choice(ACTIONS)
+        part = f"PN-{rng.randint(1000, 9999)}-{rng.choice('ABCDEFGH')}{rng.randint(1, 9)}"
+        code = f"E{rng.randint(1000, 9999)}"
+        words = rng.sample(FILLER, 14)
+        text = (f"To {action} the {component} (part {part}) follow these steps. "
+                f"If the display shows error {code} the {component} must be {action}ed. " + " ".join(words))
+        chunks.append({"id": f"c{i}", "text": text, "part": part, "code": code,
+                       "question": f"how do I {action} the {component} when I see a fault"})
+    return chunks
+
+
+class DenseStandIn:
+    """Brute-force cosine search over hashed word-count vectors"""
+
+    def __init__(self, chunks, latency):
+        self.latency = latency
+        self.vectors = {c["id"]: (self.embed(c["text"]), c) for c in chunks}
+
+    @staticmethod
+    def embed(text):
+        counts = Counter(w for w in re.findall(r"[a-z]+", text.lower()) if len(w) > 2)
+        norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+        return {w: v / norm for w, v in counts.items()}
+
+    def similarity_search(self, query, k=4, filter=None):
+        time.sleep(self.latency)
+        q = self.embed(query)
+        scored = sorted(
+            ((sum(q.get(w, 0.0) * v for w, v in vec.items()), c) for vec, c in self.vectors.values()),
+            key=lambda x: -x[0]
+        )[:k]
+        return [Doc(c["text"], {"content_hash": c["id"], "source": "manual.pdf"}) for _, c in scored]
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def evaluate(name, queries, search):
+    hits, latencies = 0, []
+    for query, expected in queries:
+        started = time.perf_counter()
+        ids = search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += any(i in expected for i in ids)
+    print(f"  {name:<12} recall@4={hits / len(queries):.2f}  "
+          f"p50={percentile(latencies, 50):7.1f}ms  p95={percentile(latencies, 95):7.1f}ms")
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 120) / 1000
+
+    chunks = build_corpus(size)
+    dense = DenseStandIn(chunks, latency)
+    path = os.path.join(tempfile.mkdtemp(), "lexical.db")
+    lexical = LexicalIndex(path)
+    started = time.perf_counter()
+    lexical.add([c["id"] for c in chunks], [c["text"] for c in chunks],
+                [{"source": "manual.pdf", "content_hash": c["id"]} for c in chunks])
+    print(f"indexed {size} chunks in {time.perf_counter() - started:.2f}s")
+
+    rng = random.Random(3)
+    sample = rng.sample(chunks, 50)
+    by_question = {}
+    for c in chunks:
+        by_question.setdefault(c["question"], set()).add(c["id"])
+    suites = {
+        "identifier queries": [(c["part"], {c["id"]}) for c in sample[:25]] + [(c["code"], {c["id"]}) for c in sample[25:]],
+        "natural-language queries": [(c["question"], by_question[c["question"]]) for c in sample],
+    }
+
+    def ids_of(docs):
+        return [d.metadata["content_hash"] for d in docs]
+
+    for title, queries in suites.items():
+        print(title)
+        evaluate("dense", queries, lambda q: ids_of(dense.similarity_search(q, 4)))
+        evaluate("bm25", queries, lambda q: [cid for cid, _ in lexical.search(q, 4)])
+        evaluate("hybrid", queries, lambda q: ids_of(hybrid_search(dense, lexical, q, k=4, make_document=Doc)[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_service import SearchCache, SearchService, canonical_url
+from stub_servers import FixtureSearchProvider
+
+
+# =====================================================
+# SEARCH CACHE / DEDUP / MULTI-QUERY BENCHMARK
+# =====================================================
+# python benchmarks/bench_search.py [provider_latency_s] [concurrent_sessions]
+
+def fresh_service(latency):
+    provider = FixtureSearchProvider(latency=latency)
+    cache = SearchCache(os.path.join(tempfile.mkdtemp(), "search_cache.db"))
+    return provider, SearchService(provider, cache)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    value = fn()
+    return value, (time.perf_counter() - started) * 1000
+
+
+def main():
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.3
+    sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    provider, service = fresh_service(latency)
+    _, cold = timed(lambda: service.search("streamlit caching"))
+    _, warm = timed(lambda: service.search("  Streamlit caching? "))
+    print(f"single query: cold {cold:7.1f}ms  warm {warm:6.2f}ms (normalized repeat)")
+
+    provider, service = fresh_service(latency)
+    threads = [threading.Thread(target=service.search, args=("sqlite wal mode",)) for _ in range(sessions)]
+    _, elapsed = timed(lambda: ([t.start() for t in threads], [t.join() for t in threads]))
+    print(f"{sessions} concurrent identical queries: {provider.calls} provider call(s) in {elapsed:.1f}ms  "
+          f"stats={service.stats()}")
+
+    queries = ["python asyncio timeout", "asyncio wait_for example", "python cancel task after seconds",
+               "asyncio timeout context manager"]
+    provider, service = fresh_service(latency)
+    naive, elapsed = timed(lambda: [r for q in queries for r in provider.search(q, 8)])
+    print(f"sequential {len(queries)} queries:   {elapsed:7.1f}ms  {len(naive)} results "
+          f"({len({canonical_url(r['url']) for r in naive})} distinct pages)")
+    (merged, errors), elapsed = timed(lambda: service.multi_search(queries, max_results=8))
+    print(f"fan-out {len(queries)} queries:      {elapsed:7.1f}ms  {len(merged)} results after URL dedup, "
+          f"errors={len(errors)}")
+    _, elapsed = timed(lambda: service.multi_search(queries, max_results=8))
+    print(f"fan-out again (cached):   {elapsed:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# =====================================================
+# COLD START: IMPORT COST AND LOGIN FIRST PAINT
+# =====================================================
+# python benchmarks/bench_startup.py [runs]
+#
+# Every measurement runs in a fresh interpreter, since a warm sys.modules
+# would hide exactly the cost being measured.
+#
+# 1. import time of each heavy page dependency on its own
+# 2. "eager": everything the entry points used to import at top level, vs
+#    "lazy": what they import now before the login page is drawn
+# 3. login first paint: process start until the login form has rendered
+#    (streamlit's AppTest), for both entry points
+
+HEAVY = [
+    "langchain_core.messages", "langchain_openai", "langchain_community.vectorstores",
+    "langchain_community.document_loaders", "pandas", "plotly.express", "plotly.graph_objects",
+    "PIL.Image", "requests"
+]
+PROJECT = [
+    "embedding_cache", "vector_store", "ingest_pipeline", "document_stream", "lexical_index",
+    "response_cache", "llm_clients", "fanout", "context_builder", "usage", "analytics_writer",
+    "analytics_store", "database", "code_runner", "stream_renderer", "image_cache", "search_service",
+    "tracing", "startup"
+]
+ENTRY_POINTS = ["chatbot_advanced.py", "ai_pro_enterprise_final.py"]
+
+IMPORT_SCRIPT = """
+import sys, time, json, importlib
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+failed = []
+for name in {modules!r}:
+    try:
+        importlib.import_module(name)
+    except Exception as e:
+        failed.append(name)
+print(json.dumps({{"ms": (time.perf_counter() - started) * 1000, "failed": failed}}))
+"""
+
+PAINT_SCRIPT = """
+import sys, time, json
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({path!r}, default_timeout=120)
+app.run()
+painted = any(w.type == "password" for w in app.text_input) if not app.exception else False
+print(json.dumps({{"ms": (time.perf_counter() - started) * 1000, "painted": painted,
+                  "error": str(app.exception[0].message) if app.exception else None}}))
+"""
+
+
+def run_python(script, cwd):
+    proc = subprocess.run([sys.executable, "-c", script], cwd=cwd, capture_output=True, text=True, timeout=300)
+    if proc.returncode != 0:
+        return {"ms": None, "error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def median_ms(script, runs, cwd):
+    samples, last = [], {}
+    for _ in range(runs):
+        last = run_python(script, cwd)
+        if last.get("ms") is None:
+            break
+        samples.append(last["ms"])
+    return (statistics.median(samples) if samples else None), last
+
+
+def missing(result):
+    return f"missing: {', '.join(result['failed'])}" if result.get("failed") else ""
+
+
+def show(label, ms, note=""):
+    value = f"{ms:9.1f} ms" if ms is not None else "   skipped"
+    print(f"{label:<40} {value}  {note}")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    workdir = tempfile.mkdtemp()
+
+    print("per-module import (median of fresh interpreters)")
+    for name in HEAVY:
+        ms, last = median_ms(IMPORT_SCRIPT.format(root=ROOT, modules=[name]), runs, workdir)
+        show(f"  {name}", None if last.get("failed") else ms, "not installed" if last.get("failed") else "")
+
+    print("\nentry point imports before the login page")
+    baseline, last = median_ms(IMPORT_SCRIPT.format(root=ROOT, modules=["streamlit"]), runs, workdir)
+    show("  streamlit alone", None if last.get("failed") else baseline, "not installed" if last.get("failed") else "")
+    eager, last = median_ms(IMPORT_SCRIPT.format(root=ROOT, modules=["streamlit"] + HEAVY + PROJECT), runs, workdir)
+    show("  eager (heavy deps at top level)", eager, missing(last))
+    lazy, last = median_ms(IMPORT_SCRIPT.format(root=ROOT, modules=["streamlit"] + PROJECT), runs, workdir)
+    show("  lazy (current entry points)", lazy, missing(last))
+
+    print("\nlogin page first paint (process start -> password field rendered)")
+    for entry in ENTRY_POINTS:
+        ms, last = median_ms(PAINT_SCRIPT.format(root=ROOT, path=os.path.join(ROOT, entry)), runs, workdir)
+        note = last.get("error") or ("" if last.get("painted") else "login form not found")
+        show(f"  {entry}", ms, note)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics_writer import AnalyticsWriter
+from database import Database
+
+
+# =====================================================
+# ANALYTICS LOAD TEST: 100 CONCURRENT SESSIONS
+# =====================================================
+# python benchmarks/load_analytics.py [sessions] [events_per_session]
+#
+# "before" is the old log_analytics(): INSERT + commit per event on one shared
+# check_same_thread=False connection with no locking. "after" queues events
+# on AnalyticsWriter. Reported latency is what the session thread waits for.
+
+def fresh_db():
+    path = os.path.join(tempfile.mkdtemp(), "chat_history.db")
+    Database(path).close()
+    return path
+
+
+def simulate(sessions, events, log):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def session(n):
+        rng = random.Random(n)
+        mine = []
+        for i in range(events):
+            started = time.perf_counter()
+            try:
+                log("chat", {"session": n, "event": i})
+            except Exception:
+                with lock:
+                    errors[0] += 1
+            mine.append((time.perf_counter() - started) * 1000)
+            time.sleep(rng.uniform(0, 0.002))
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started, sorted(latencies), errors[0]
+
+
+def summarize(name, seconds, latencies, errors, rows):
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+    print(f"{name:<24} {rows:>6} rows  {rows / seconds:8.0f} events/s  "
+          f"p50={p(0.5):6.2f}ms  p99={p(0.99):7.2f}ms  errors={errors}")
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    events = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    path = fresh_db()
+    shared = sqlite3.connect(path, check_same_thread=False)
+
+    def commit_per_event(event_type, event_data):
+        shared.execute(
+            "INSERT INTO analytics (event_type, event_data, timestamp) VALUES (?, ?, ?)",
+            (event_type, json.dumps(event_data), datetime.now().isoformat())
+        )
+        shared.commit()
+
+    seconds, latencies, errors = simulate(sessions, events, commit_per_event)
+    rows = shared.execute("SELECT COUNT(*) FROM analytics").fetchone()[0]
+    summarize("commit per event", seconds, latencies, errors, rows)
+
+    path = fresh_db()
+    writer = AnalyticsWriter(path)
+    seconds, latencies, errors = simulate(sessions, events, writer.log)
+    writer.close()
+    rows = sqlite3.connect(path).execute("SELECT COUNT(*) FROM analytics").fetchone()[0]
+    summarize("batched writer (WAL)", seconds, latencies, errors + writer.dropped, rows)
+    print(f"writer stats: {writer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# =====================================================
+# LOCAL STUB SERVERS FOR BENCHMARKS
+# =====================================================
+
+class StubServer:
+    """Run a handler class on localhost in a background thread"""
+
+    def __init__(self, handler, **settings):
+        handler_cls = type(handler.__name__, (handler,), {"settings": settings, "counter": [0], "lock": threading.Lock()})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler_cls)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def next_request_number(self):
+        with self.lock:
+            self.counter[0] += 1
+            return self.counter[0]
+
+
+def fake_vector(text, dim):
+    """Deterministic pseudo-embedding derived from the text hash"""
+    digest = hashlib.sha256(text.encode()).digest()
+    return [digest[i % len(digest)] / 255.0 for i in range(dim)]
+
+
+class EmbeddingsHandler(_QuietHandler):
+    """OpenAI-compatible POST /v1/embeddings with latency and periodic 429s
+
+    settings: latency (s per request), per_item (s per input),
+    dim (vector size), throttle_every (return 429 on every Nth request, 0=off)
+    """
+
+    def do_POST(self):
+        payload = self.read_json()
+        number = self.next_request_number()
+        every = self.settings.get("throttle_every", 0)
+        if every and number % every == 0:
+            self.send_json(429, {"error": {"message": "Rate limit exceeded"}})
+            return
+        inputs = payload.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        time.sleep(self.settings.get("latency", 0.02) + self.settings.get("per_item", 0.0005) * len(inputs))
+        dim = self.settings.get("dim", 256)
+        self.send_json(200, {
+            "object": "list",
+            "model": payload.get("model", "stub"),
+            "data": [{"object": "embedding", "index": i, "embedding": fake_vector(t, dim)} for i, t in enumerate(inputs)],
+            "usage": {"prompt_tokens": sum(len(t) // 4 for t in inputs), "total_tokens": sum(len(t) // 4 for t in inputs)}
+        })
+
+
+class ChatCompletionsHandler(_QuietHandler):
+    """OpenAI-compatible POST /v1/chat/completions (streaming and non-streaming)
+
+    settings: ttft (s before the first token), reply_tokens (words in the
+    answer), token_interval (s between streamed tokens)
+    """
+
+    def do_POST(self):
+        payload = self.read_json()
+        self.next_request_number()
+        words = [f"word{i % 50}" for i in range(self.settings.get("reply_tokens", 64))]
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in payload.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words),
+                 "prompt_tokens_details": {"cached_tokens": 0}}
+        base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": payload.get("model", "stub")}
+        time.sleep(self.settings.get("ttft", 0.05))
+
+        if not payload.get("stream"):
+            self.send_json(200, {**base, "object": "chat.completion", "usage": usage, "choices": [
+                {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": " ".join(words)}}
+            ]})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def emit(data):
+            body = f"data: {data}\n\n".encode()
+            self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+            self.wfile.flush()
+
+        for i, word in enumerate(words):
+            emit(json.dumps({**base, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {"role": "assistant", "content": word + " "} if i == 0 else {"content": word + " "},
+                 "finish_reason": None}
+            ]}))
+            time.sleep(self.settings.get("token_interval", 0.0))
+        emit(json.dumps({**base, "object": "chat.completion.chunk", "choices": [
+            {"index": 0, "delta": {}, "finish_reason": "stop"}
+        ]}))
+        if payload.get("stream_options", {}).get("include_usage"):
+            emit(json.dumps({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}))
+        emit("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class ImageHandler(_QuietHandler):
+    """Pollinations-style GET /prompt/<text>?width=&height=&seed= returning image bytes
+
+    settings: latency (s per image), size (bytes per image). The body is
+    deterministic in the path and query, so identical requests return
+    identical bytes.
+    """
+
+    def do_GET(self):
+        self.next_request_number()
+        time.sleep(self.settings.get("latency", 0.2))
+        size = self.settings.get("size", 64 * 1024)
+        seed = hashlib.sha256(self.path.encode()).digest()
+        body = (b"\x89PNG\r\n\x1a\n" + seed * (size // len(seed) + 1))[:size]
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubEmbeddings:
+    """Minimal urllib client for EmbeddingsHandler (embed_documents/embed_query)"""
+
+    def __init__(self, base_url, model="stub-embedding"):
+        self.base_url = base_url
+        self.model = model
+
+    def embed_documents(self, texts):
+        import urllib.request
+        request = urllib.request.Request(
+            f"{self.base_url}/embeddings",
+            data=json.dumps({"model": self.model, "input": list(texts)}).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            data = json.loads(response.read())["data"]
+        return [d["embedding"] for d in sorted(data, key=lambda d: d["index"])]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+# =====================================================
+# IN-MEMORY STAND-INS
+# =====================================================
+
+class Doc:
+    """Duck-typed LangChain Document"""
+
+    def __init__(self, page_content, metadata=None):
+        self.page_content = page_content
+        self.metadata = metadata or {}
+
+
+class _Collection:
+    def __init__(self, rows, name):
+        self.rows = rows
+        self.name = name
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for i, v, d, m in zip(ids, embeddings, documents, metadatas):
+            self.rows[i] = (d, m, v)
+
+    def count(self):
+        return len(self.rows)
+
+
+class MemoryStore:
+    """Dict-backed stand-in exposing the Chroma calls the RAG helpers use"""
+
+    def __init__(self, name="bench"):
+        self.rows = {}
+        self._collection = _Collection(self.rows, name)
+
+    def get(self, where=None, include=None):
+        ids = [
+            i for i, (_, m, _) in self.rows.items()
+            if not where or all(m.get(k) == v for k, v in where.items())
+        ]
+        return {"ids": ids, "metadatas": [self.rows[i][1] for i in ids], "documents": [self.rows[i][0] for i in ids]}
+
+    def delete(self, ids):
+        for i in ids:
+            self.rows.pop(i, None)
+
+
+class FixtureSearchProvider:
+    """Deterministic search provider for SearchService with simulated latency
+
+    Each query returns `per_query` results; `overlap` of them come from a
+    small shared pool of URLs (with www./trailing-slash variants) so the
+    multi-query merge has duplicates to remove.
+    """
+
+    name = "fixture"
+
+    def __init__(self, latency=0.3, per_query=8, overlap=3):
+        self.latency = latency
+        self.per_query = per_query
+        self.overlap = overlap
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def search(self, query, max_results=5):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        digest = hashlib.sha256(query.encode()).hexdigest()
+        shared = [
+            {"title": f"Overview {i}", "url": f"https://{'www.' if digest[i] > '7' else ''}example.org/topic/{i}/",
+             "snippet": f"Shared background article {i}."}
+            for i in range(self.overlap)
+        ]
+        own = [
+            {"title": f"{query} result {i}", "url": f"https://example.com/{digest[:8]}/{i}",
+             "snippet": f"Result {i} for {query}."}
+            for i in range(self.per_query - self.overlap)
+        ]
+        return (own[:1] + shared + own[1:])[:max_results]
+
+
+class CharSplitter:
+    """Fixed-size character splitter with the split_documents interface"""
+
+    def __init__(self, chunk_size=1000, chunk_overlap=100):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split_documents(self, documents):
+        chunks = []
+        step = self.chunk_size - self.chunk_overlap
+        for doc in documents:
+            text = doc.page_content
+            for start in range(0, max(len(text) - self.chunk_overlap, 1), step):
+                chunks.append(Doc(text[start:start + self.chunk_size], dict(doc.metadata)))
+        return chunks
+
+
+def synthetic_pages(count, words_per_page=450, seed=7):
+    """Deterministic manual-like pages for benchmarks"""
+    import random
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(4000)] + ["the", "a", "of", "and", "to", "in", "is", "for"] * 200
+    for page in range(count):
+        words = [rng.choice(vocab) for _ in range(words_per_page)]
+        yield Doc(" ".join(words), {"page": page})
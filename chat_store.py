@@ -0,0 +1,168 @@
+import time
+import threading
+from datetime import datetime, timedelta
+
+
+# =====================================================
+# SCHEMA: LIVE-ROW INDEX + SOFT DELETES
+# =====================================================
+# Messages are addressed by id. Deleting only stamps `deleted_at`, which is
+# one indexed row update however long the session is. Every read filters on
+# `deleted_at IS NULL`, so with the (session_id, deleted_at, id, tokens)
+# index live rows form one contiguous range per session. Keyset pages seek
+# straight into that range, and token totals are answered from the index
+# alone. ChatCompactor removes the tombstones later, in small batches.
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+SOFT_DELETE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_chats_live ON chats (session_id, deleted_at, id, tokens)",
+    "CREATE INDEX IF NOT EXISTS idx_chats_deleted ON chats (deleted_at) WHERE deleted_at IS NOT NULL",
+    # superseded by idx_chats_live for every session query
+    "DROP INDEX IF EXISTS idx_chats_session"
+)
+
+# rollup_chats counts live messages: decrement once, when a message is
+# soft-deleted (or hard-deleted without a tombstone), never again on compaction
+SOFT_DELETE_TRIGGERS = (
+    "DROP TRIGGER IF EXISTS trg_chats_rollup_delete",
+    """CREATE TRIGGER trg_chats_rollup_delete AFTER DELETE ON chats
+    WHEN OLD.deleted_at IS NULL AND OLD.timestamp IS NOT NULL AND OLD.role IS NOT NULL BEGIN
+        UPDATE rollup_chats SET messages = messages - 1, tokens = tokens - COALESCE(OLD.tokens, 0)
+        WHERE day = substr(OLD.timestamp, 1, 10) AND role = OLD.role;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_chats_rollup_soft_delete AFTER UPDATE OF deleted_at ON chats
+    WHEN OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL
+        AND OLD.timestamp IS NOT NULL AND OLD.role IS NOT NULL BEGIN
+        UPDATE rollup_chats SET messages = messages - 1, tokens = tokens - COALESCE(OLD.tokens, 0)
+        WHERE day = substr(OLD.timestamp, 1, 10) AND role = OLD.role;
+    END"""
+)
+
+
+def soft_delete_schema(conn):
+    """Add chats.deleted_at with its indexes and rollup triggers (database.MIGRATIONS step)"""
+    if "deleted_at" not in _columns(conn, "chats"):
+        conn.execute("ALTER TABLE chats ADD COLUMN deleted_at TEXT")
+    for statement in SOFT_DELETE_INDEXES + SOFT_DELETE_TRIGGERS:
+        conn.execute(statement)
+
+
+# =====================================================
+# SESSION HISTORY
+# =====================================================
+
+class ChatStore:
+    """Per-session chat history on a Database: keyset pages and id-addressed soft deletes"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def append(self, session_id, role, content, tokens=0):
+        """Store one message; returns its id"""
+        cursor = self.db.execute(
+            "INSERT INTO chats (session_id, role, content, tokens, timestamp) VALUES (?, ?, ?, ?, ?)",
+            (session_id, role, content, tokens, datetime.now().isoformat())
+        )
+        return cursor.lastrowid
+
+    def page(self, session_id, before_id=None, limit=30):
+        """(messages, has_more): the newest `limit` live messages older than `before_id`, oldest first"""
+        rows = self.db.query(
+            "SELECT id, role, content, tokens FROM chats "
+            "WHERE session_id=? AND deleted_at IS NULL AND id<? ORDER BY id DESC LIMIT ?",
+            (session_id, before_id or 2 ** 63 - 1, limit + 1)
+        )
+        return [
+            {"id": r[0], "role": r[1], "content": r[2], "tokens": r[3]} for r in reversed(rows[:limit])
+        ], len(rows) > limit
+
+    def total_tokens(self, session_id):
+        return self.db.query_one(
+            "SELECT COALESCE(SUM(tokens), 0) FROM chats WHERE session_id=? AND deleted_at IS NULL",
+            (session_id,)
+        )[0]
+
+    def delete(self, session_id, message_id):
+        """Soft-delete one message; False if it doesn't exist (or isn't this session's)"""
+        cursor = self.db.execute(
+            "UPDATE chats SET deleted_at=? WHERE id=? AND session_id=? AND deleted_at IS NULL",
+            (datetime.now().isoformat(), message_id, session_id)
+        )
+        return cursor.rowcount > 0
+
+    def clear(self, session_id):
+        """Soft-delete every live message of a session; returns how many"""
+        with self.db.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE chats SET deleted_at=? WHERE session_id=? AND deleted_at IS NULL",
+                (datetime.now().isoformat(), session_id)
+            )
+        return cursor.rowcount
+
+
+# =====================================================
+# BACKGROUND COMPACTION
+# =====================================================
+
+class ChatCompactor:
+    """Hard-deletes tombstoned messages in small batches on a daemon thread
+
+    Each batch is its own short transaction, so a large cleared session
+    never holds the write lock long enough to stall chat writes. Tombstones
+    younger than `grace_seconds` are left alone.
+    """
+
+    def __init__(self, db, batch_size=500, interval=30.0, grace_seconds=60):
+        self.db = db
+        self.batch_size = batch_size
+        self.interval = interval
+        self.grace_seconds = grace_seconds
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.compacted = 0
+        self.runs = 0
+
+    def compact_once(self, max_batches=None):
+        """Delete eligible tombstones now; returns the number of rows removed"""
+        cutoff = (datetime.now() - timedelta(seconds=self.grace_seconds)).isoformat()
+        removed, batches = 0, 0
+        while not self.stop_event.is_set() and (max_batches is None or batches < max_batches):
+            with self.db.transaction() as conn:
+                deleted = conn.execute(
+                    "DELETE FROM chats WHERE id IN (SELECT id FROM chats "
+                    "WHERE deleted_at IS NOT NULL AND deleted_at <= ? LIMIT ?)",
+                    (cutoff, self.batch_size)
+                ).rowcount
+            removed += deleted
+            batches += 1
+            if deleted < self.batch_size:
+                break
+            # let writers in between batches
+            time.sleep(0)
+        self.compacted += removed
+        self.runs += 1
+        return removed
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.compact_once()
+            except Exception:
+                # locked or busy database: try again next interval
+                pass
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, name="chat-compactor", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        pending = self.db.query_one("SELECT COUNT(*) FROM chats WHERE deleted_at IS NOT NULL")[0]
+        return {"pending": pending, "compacted": self.compacted, "runs": self.runs}
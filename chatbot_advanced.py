@@ -1,25 +1,35 @@
+import time
+SCRIPT_STARTED = time.perf_counter()
 import streamlit as st
-import sqlite3
 import hashlib
-from datetime import datetime
-import json
-
-# Optional analytics
-try:
-    import pandas as pd
-    import plotly.express as px
-    ANALYTICS_AVAILABLE = True
-except:
-    ANALYTICS_AVAILABLE = False
+from datetime import datetime, timedelta
+import os
+import shutil
+import tempfile
+from response_cache import ResponseCache, context_hash
+from context_builder import build_context, summary_upto, RollingSummarizer
+from usage import UsageMeter, UsageRecorder
+from stream_renderer import StreamRenderer
+from analytics_writer import AnalyticsWriter
+from tracing import tracer
+from analytics_store import DashboardQueries
+from database import Database, import_legacy_chats
+from chat_store import ChatStore, ChatCompactor
+from maintenance import Maintenance
+from data_export import (EXPORT_TABLES, FORMATS, NDJSON_COMPRESSION, PARQUET_COMPRESSION, PARQUET_AVAILABLE,
+                         export_data, export_filename, import_data, save_upload)
+from llm_clients import chat_model
+from startup import LazyModule, module_available, warm_up, minify_css
+
+# Optional analytics (imported when the Analytics page first needs them)
+ANALYTICS_AVAILABLE = module_available("pandas", "plotly")
+pd = LazyModule("pandas")
+px = LazyModule("plotly.express")
 
 # LangChain
-try:
-    from langchain_openai import ChatOpenAI
-    from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-    from langchain_core.callbacks import BaseCallbackHandler
-    LANGCHAIN_AVAILABLE = True
-except:
-    LANGCHAIN_AVAILABLE = False
+LANGCHAIN_AVAILABLE = module_available("langchain_core", "langchain_openai")
+
+WARM_UP_MODULES = ("langchain_core.messages", "langchain_openai", "pandas", "plotly.express")
 
 
 # =====================================================
@@ -28,7 +38,7 @@ except:
 
 st.set_page_config(page_title="AI Pro Enterprise+", layout="wide")
 
-st.markdown("""
+STYLE = """
 <style>
 .stApp { background-color: #0f172a; color: #e2e8f0; }
 section[data-testid="stSidebar"] { background-color: #111827; }
@@ -47,7 +57,9 @@ section[data-testid="stSidebar"] { background-color: #111827; }
     border-radius: 8px !important;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(minify_css(STYLE), unsafe_allow_html=True)
 
 
 # =====================================================
@@ -62,23 +74,46 @@ APP_PASSWORD = st.secrets.get("APP_PASSWORD", "admin123")
 # DATABASE
 # =====================================================
 
+DB_PATH = "chat_history.db"
+
+
 @st.cache_resource
 def init_db():
-    conn = sqlite3.connect("ai_pro_plus.db", check_same_thread=False)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS chats (
-            id INTEGER PRIMARY KEY,
-            session_id TEXT,
-            role TEXT,
-            content TEXT,
-            tokens INTEGER,
-            timestamp TEXT
-        )
-    """)
-    conn.commit()
-    return conn
+    """Shared schema with the enterprise app; folds the old ai_pro_plus.db in once"""
+    database = Database(DB_PATH)
+    import_legacy_chats(database, "ai_pro_plus.db")
+    return database
 
-db = init_db()
+
+# The getters below open files and start background threads, so they are
+# first called after the login gate (see STARTUP), never on the login page.
+
+@st.cache_resource
+def get_chat_compactor():
+    """Removes deleted messages in the background, a few hundred rows per transaction"""
+    return ChatCompactor(init_db()).start()
+
+
+@st.cache_resource
+def get_maintenance():
+    """Daily retention/archival, incremental vacuum and ANALYZE in short transactions"""
+    return Maintenance(init_db(), archive_dir="archive").start()
+
+
+@st.cache_resource
+def get_dashboard():
+    return DashboardQueries(init_db())
+
+
+@st.cache_resource
+def get_tracer():
+    """Spans go to an in-memory ring buffer and, batched, to the traces table"""
+    return tracer.configure(AnalyticsWriter(init_db().path))
+
+
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache("response_cache.db")
 
 
 # =====================================================
@@ -93,7 +128,9 @@ def init_session():
         "model_name": "openai/gpt-4o-mini",
         "temperature": 0.7,
         "system_prompt": "You are a professional AI assistant.",
-        "context_window": 8,
+        "context_budget": 4000,
+        "history_page": 30,
+        "has_older": False,
         "total_tokens": 0
     }
     for k, v in defaults.items():
@@ -104,71 +141,41 @@ init_session()
 
 
 # =====================================================
-# TOKEN CALLBACK
+# USAGE ACCOUNTING
 # =====================================================
 
-class TokenCounter(BaseCallbackHandler):
-    def __init__(self):
-        self.total_tokens = 0
-
-    def on_llm_end(self, response, **kwargs):
-        try:
-            self.total_tokens += response.llm_output["token_usage"]["total_tokens"]
-        except:
-            pass
+@st.cache_resource
+def get_usage_recorder():
+    return UsageRecorder(init_db())
 
 
 # =====================================================
 # DB FUNCTIONS
 # =====================================================
 
-def load_history():
-    cursor = db.execute(
-        "SELECT role, content, tokens FROM chats WHERE session_id=? ORDER BY id",
-        (st.session_state.session_id,)
-    )
-    rows = cursor.fetchall()
-    st.session_state.messages = [
-        {"role": r[0], "content": r[1], "tokens": r[2]} for r in rows
-    ]
-    st.session_state.total_tokens = sum(r[2] for r in rows if r[2])
-
-if not st.session_state.messages:
-    load_history()
+def fetch_history(before_id=None, limit=30):
+    """Newest `limit` messages older than `before_id`, oldest first"""
+    return chats.page(st.session_state.session_id, before_id, limit)
 
 
-def save_message(role, content, tokens):
-    db.execute(
-        "INSERT INTO chats (session_id, role, content, tokens, timestamp) VALUES (?, ?, ?, ?, ?)",
-        (
-            st.session_state.session_id,
-            role,
-            content,
-            tokens,
-            datetime.now().isoformat()
-        )
-    )
-    db.commit()
+def load_history():
+    with tracer.span("load_history", session_id=st.session_state.session_id):
+        messages, has_more = fetch_history(limit=st.session_state.history_page)
+    st.session_state.messages = messages
+    st.session_state.has_older = has_more
+    st.session_state.total_tokens = chats.total_tokens(st.session_state.session_id)
 
 
-# =====================================================
-# LLM INIT
-# =====================================================
+def load_older():
+    oldest = st.session_state.messages[0]["id"] if st.session_state.messages else None
+    older, has_more = fetch_history(oldest, st.session_state.history_page)
+    st.session_state.messages = older + st.session_state.messages
+    st.session_state.has_older = has_more
 
-llm = None
-token_handler = TokenCounter()
 
-if LANGCHAIN_AVAILABLE and OPENROUTER_API_KEY:
-    try:
-        llm = ChatOpenAI(
-            model=st.session_state.model_name,
-            temperature=st.session_state.temperature,
-            base_url="https://openrouter.ai/api/v1",
-            api_key=OPENROUTER_API_KEY,
-            callbacks=[token_handler]
-        )
-    except Exception as e:
-        st.error(f"LLM init error: {e}")
+def save_message(role, content, tokens):
+    with tracer.span("sqlite_write", session_id=st.session_state.session_id, table="chats"):
+        return chats.append(st.session_state.session_id, role, content, tokens)
 
 
 # =====================================================
@@ -189,6 +196,50 @@ if not st.session_state.logged_in:
     st.stop()
 
 
+# =====================================================
+# STARTUP (only once logged in)
+# =====================================================
+
+db = init_db()
+chats = ChatStore(db)
+get_chat_compactor()
+get_maintenance()
+get_tracer()
+response_cache = get_response_cache()
+usage_recorder = get_usage_recorder()
+
+if not st.session_state.messages:
+    load_history()
+
+
+# =====================================================
+# LLM INIT
+# =====================================================
+
+warm_up(WARM_UP_MODULES, on_import=lambda name, ms: tracer.record("import", ms, module=name))
+
+llm = None
+
+if LANGCHAIN_AVAILABLE and OPENROUTER_API_KEY:
+    try:
+        llm = chat_model(
+            st.session_state.model_name,
+            st.session_state.temperature,
+            OPENROUTER_API_KEY
+        )
+    except Exception as e:
+        st.error(f"LLM init error: {e}")
+
+
+@st.cache_resource
+def get_summarizer(api_key):
+    """Background folder of old turns into a rolling per-session summary"""
+    summary_llm = chat_model("openai/gpt-4o-mini", 0.2, api_key)
+    return RollingSummarizer(db, lambda text: summary_llm.invoke(text).content)
+
+summarizer = get_summarizer(OPENROUTER_API_KEY) if llm else None
+
+
 # =====================================================
 # SIDEBAR
 # =====================================================
@@ -199,6 +250,8 @@ with st.sidebar:
     page = st.radio("Navigation", [
         "Chat",
         "Analytics",
+        "Latency",
+        "Maintenance",
         "Settings"
     ])
 
@@ -206,19 +259,66 @@ with st.sidebar:
     st.metric("Messages", len(st.session_state.messages))
     st.metric("Total Tokens", st.session_state.total_tokens)
 
-    if st.button("Export Chat"):
-        export_data = json.dumps(st.session_state.messages, indent=2)
-        st.download_button("Download JSON", export_data, "chat_export.json")
+    with st.expander("Export / Import"):
+        fmt = st.selectbox("Format", FORMATS if PARQUET_AVAILABLE else FORMATS[:1])
+        compression = st.selectbox(
+            "Compression",
+            list(NDJSON_COMPRESSION) if fmt == "ndjson" else list(PARQUET_COMPRESSION),
+            format_func=lambda c: c or "none"
+        )
+        tables = st.multiselect("Tables", list(EXPORT_TABLES), default=["chats"])
+        this_session = st.checkbox("This session only", value=True)
+        dates = st.date_input("Date range", value=())
+
+        if st.button("Prepare Export"):
+            since, until = (None, None)
+            if len(dates) == 2:
+                since, until = dates[0].isoformat(), (dates[1] + timedelta(days=1)).isoformat()
+            # one export directory per session, holding only the latest export
+            if "export_dir" not in st.session_state:
+                st.session_state.export_dir = tempfile.mkdtemp(prefix="chat-export-")
+            if st.session_state.get("export_path"):
+                try:
+                    os.remove(st.session_state.export_path)
+                except OSError:
+                    pass
+                st.session_state.export_path = None
+            path = os.path.join(st.session_state.export_dir, export_filename(fmt, compression))
+            counts = export_data(
+                db, path, fmt, compression, tables=tables, since=since, until=until,
+                session_ids=[st.session_state.session_id] if this_session else None
+            )
+            st.session_state.export_path = path
+            st.caption(", ".join(f"{t}: {n} rows" for t, n in counts.items()))
+
+        if st.session_state.get("export_path") and os.path.exists(st.session_state.export_path):
+            with open(st.session_state.export_path, "rb") as f:
+                st.download_button("Download", f, os.path.basename(st.session_state.export_path))
+
+        upload = st.file_uploader("Import export file", type=["ndjson", "gz", "bz2", "xz", "zip", "parquet"])
+        if upload is not None and st.button("Import"):
+            path = save_upload(upload)
+            try:
+                counts = import_data(db, path)
+            finally:
+                shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+            st.success(", ".join(
+                f"{t}: {n['inserted']} rows" + (f" ({n['skipped']} already present)" if n["skipped"] else "")
+                for t, n in counts.items()
+            ) or "Nothing to import")
 
     if st.button("Clear Chat"):
-        db.execute("DELETE FROM chats WHERE session_id=?",
-                   (st.session_state.session_id,))
-        db.commit()
+        chats.clear(st.session_state.session_id)
+        if summarizer:
+            summarizer.forget(st.session_state.session_id)
         st.session_state.messages = []
+        st.session_state.has_older = False
         st.session_state.total_tokens = 0
         st.rerun()
 
     if st.button("Logout"):
+        if st.session_state.get("export_dir"):
+            shutil.rmtree(st.session_state.export_dir, ignore_errors=True)
         st.session_state.clear()
         st.rerun()
 
@@ -240,53 +340,108 @@ if page == "Chat":
         st.warning("Set OPENROUTER_API_KEY in secrets.")
         st.stop()
 
+    if st.session_state.has_older and st.button("⬆️ Load older messages"):
+        load_older()
+        st.rerun()
+
     for i, msg in enumerate(st.session_state.messages):
         with st.chat_message(msg["role"]):
             st.markdown(msg["content"])
-            if st.button("Delete", key=f"del_{i}"):
-                db.execute("DELETE FROM chats WHERE session_id=? AND content=?",
-                           (st.session_state.session_id, msg["content"]))
-                db.commit()
+            if st.button("Delete", key=f"del_{msg['id']}"):
+                chats.delete(st.session_state.session_id, msg["id"])
+                # a summary that folded the deleted turn is rebuilt without it
+                summarizer.invalidate(st.session_state.session_id, msg["id"])
                 st.session_state.messages.pop(i)
+                st.session_state.total_tokens -= msg["tokens"]
                 st.rerun()
 
     if prompt := st.chat_input("Ask something..."):
 
-        st.session_state.messages.append({"role": "user", "content": prompt, "tokens": 0})
-        save_message("user", prompt, 0)
+        user_id = save_message("user", prompt, 0)
+        st.session_state.messages.append({"id": user_id, "role": "user", "content": prompt, "tokens": 0})
 
         with st.chat_message("assistant"):
-            placeholder = st.empty()
+            renderer = StreamRenderer(st.container())
             full_response = ""
 
-            messages = [SystemMessage(content=st.session_state.system_prompt)]
-
-            for m in st.session_state.messages[-st.session_state.context_window:]:
-                if m["role"] == "user":
-                    messages.append(HumanMessage(content=m["content"]))
-                else:
-                    messages.append(AIMessage(content=m["content"]))
-
-            try:
-                for chunk in llm.stream(messages):
-                    full_response += chunk.content or ""
-                    placeholder.markdown(full_response + "▌")
-
-                placeholder.markdown(full_response)
-
-                tokens_used = token_handler.total_tokens
-                st.session_state.total_tokens += tokens_used
-
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": full_response,
-                    "tokens": tokens_used
-                })
-
-                save_message("assistant", full_response, tokens_used)
-
-            except Exception as e:
-                placeholder.markdown(f"Error: {e}")
+            with tracer.span("chat_turn", session_id=st.session_state.session_id):
+                with tracer.span("build_context"):
+                    summary, _ = summarizer.get(st.session_state.session_id)
+                    context, first_kept = build_context(
+                        st.session_state.system_prompt,
+                        st.session_state.messages,
+                        st.session_state.context_budget,
+                        summary=summary,
+                        model=st.session_state.model_name
+                    )
+                history = st.session_state.messages[first_kept:]
+
+                from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+                messages = [SystemMessage(content=context[0]["content"])]
+                for m in context[1:]:
+                    if m["role"] == "user":
+                        messages.append(HumanMessage(content=m["content"]))
+                    else:
+                        messages.append(AIMessage(content=m["content"]))
+
+                # answers depend on the earlier turns in the window, not just the prompt
+                cache_key = (st.session_state.model_name, st.session_state.temperature, st.session_state.system_prompt)
+                cache_context = context_hash(summary, *[m["content"] for m in history[:-1]])
+
+                try:
+                    with tracer.span("cache_lookup"):
+                        cached = response_cache.lookup(*cache_key, prompt, context=cache_context)
+
+                    if cached:
+                        full_response = renderer.write_stream([cached[0]])
+                        tokens_used = 0
+                    else:
+                        meter = UsageMeter(st.session_state.model_name, feature="chat")
+                        with tracer.span("llm_stream", model=st.session_state.model_name):
+                            for chunk in llm.stream(messages):
+                                meter.observe(chunk)
+                                renderer.write(chunk.content or "")
+                        full_response = renderer.close()
+
+                        usage = meter.finish(messages, full_response)
+                        with tracer.span("sqlite_write", table="usage"):
+                            usage_recorder.record(usage, session_id=st.session_state.session_id)
+                        tokens_used = usage["total_tokens"]
+                        response_cache.store(
+                            *cache_key, prompt, full_response, tokens=tokens_used, context=cache_context
+                        )
+                        stats = renderer.stats(usage["completion_tokens"])
+                        tracer.record("render", stats["render_ms"], renders=stats["renders"])
+                        if stats["ttft_ms"] is not None:
+                            tracer.record("llm_ttft", stats["ttft_ms"], model=st.session_state.model_name)
+                            st.caption(f"⚡ first token {stats['ttft_ms']} ms · {stats['tokens_per_sec']} tokens/s")
+
+                    st.session_state.total_tokens += tokens_used
+
+                    assistant_id = save_message("assistant", full_response, tokens_used)
+                    st.session_state.messages.append({
+                        "id": assistant_id,
+                        "role": "assistant",
+                        "content": full_response,
+                        "tokens": tokens_used
+                    })
+
+                    # only the most recent page stays in memory / on screen
+                    if len(st.session_state.messages) > st.session_state.history_page:
+                        paged_out = len(st.session_state.messages) - st.session_state.history_page
+                        first_kept = max(0, first_kept - paged_out)
+                        st.session_state.messages = st.session_state.messages[paged_out:]
+                        st.session_state.has_older = True
+
+                    # turns that no longer fit the budget, or were paged out / never
+                    # loaded, get folded into the summary off-thread
+                    upto_id = summary_upto(st.session_state.messages, first_kept, st.session_state.has_older)
+                    if upto_id:
+                        summarizer.schedule(st.session_state.session_id, upto_id)
+
+                except Exception as e:
+                    renderer.close()
+                    st.error(f"Error: {e}")
 
 
 # =====================================================
@@ -297,23 +452,29 @@ elif page == "Analytics":
 
     st.header("Usage Analytics")
 
-    cursor = db.execute("""
-        SELECT DATE(timestamp), COUNT(*)
-        FROM chats
-        GROUP BY DATE(timestamp)
-        ORDER BY DATE(timestamp)
-    """)
-    rows = cursor.fetchall()
+    cache_stats = response_cache.stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Answer Cache Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+    col2.metric("Cache Hits", cache_stats["hits"])
+    col3.metric("Tokens Saved", cache_stats["tokens_saved"])
+
+    usage_rows = usage_recorder.per_model()
+    if usage_rows and ANALYTICS_AVAILABLE:
+        st.subheader("Usage by Model")
+        st.dataframe(pd.DataFrame(usage_rows, columns=[
+            "Model", "Requests", "Prompt Tokens", "Completion Tokens",
+            "Cached Tokens", "Avg Latency (ms)", "Avg TTFT (ms)"
+        ]), use_container_width=True)
+
+    dashboard = get_dashboard()
+    rows = dashboard.chat_messages_per_day()
 
     if rows and ANALYTICS_AVAILABLE:
         df = pd.DataFrame(rows, columns=["Date", "Messages"])
         fig = px.line(df, x="Date", y="Messages", title="Messages per Day")
         st.plotly_chart(fig, use_container_width=True)
 
-        role_df = pd.read_sql_query(
-            "SELECT role, COUNT(*) as count FROM chats GROUP BY role",
-            db
-        )
+        role_df = pd.DataFrame(dashboard.chat_roles(), columns=["role", "count"])
         fig2 = px.pie(role_df, names="role", values="count", title="Role Distribution")
         st.plotly_chart(fig2, use_container_width=True)
 
@@ -321,6 +482,90 @@ elif page == "Analytics":
         st.info("No analytics data yet.")
 
 
+# =====================================================
+# LATENCY
+# =====================================================
+
+elif page == "Latency":
+
+    st.header("Latency by Stage")
+
+    days = st.selectbox("Window (days)", [1, 7, 30], index=1)
+    since = (datetime.now() - timedelta(days=days)).date().isoformat()
+    dashboard = get_dashboard()
+
+    def stage_rows(percentiles):
+        return [
+            {"Stage": stage, "Count": values.get("count", 0), "p50 (ms)": values.get(50),
+             "p95 (ms)": values.get(95), "p99 (ms)": values.get(99)}
+            for stage, values in sorted(percentiles.items(), key=lambda item: -(item[1].get(95) or 0))
+        ]
+
+    persisted = dashboard.stage_percentiles(since)
+    if persisted:
+        st.subheader("All Workers")
+        st.dataframe(stage_rows(persisted), use_container_width=True, hide_index=True)
+    else:
+        st.info("No spans recorded yet.")
+
+    live = tracer.recent_percentiles()
+    if live:
+        st.subheader("This Process (recent spans)")
+        st.dataframe(stage_rows(live), use_container_width=True, hide_index=True)
+
+    slowest = dashboard.slowest_spans(since)
+    if slowest:
+        st.subheader("Slowest Spans")
+        st.dataframe([
+            dict(zip(["Started", "Stage", "ms", "Status", "Session", "Trace"], row)) for row in slowest
+        ], use_container_width=True, hide_index=True)
+
+
+# =====================================================
+# MAINTENANCE
+# =====================================================
+
+elif page == "Maintenance":
+
+    st.header("Database Maintenance")
+
+    maintenance = get_maintenance()
+    stats = maintenance.stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Database Size", f"{stats['size_mb']:.1f} MB")
+    col2.metric("Reclaimable", f"{stats['free_mb']:.1f} MB")
+    col3.metric("Archive Files", stats["archives"])
+    if stats["last_finished"]:
+        st.caption(f"Last run {stats['last_finished'][:19]}")
+        st.json(stats["last_result"], expanded=False)
+
+    st.subheader("Retention")
+    for table, (keep_days, archive) in maintenance.policies().items():
+        col1, col2 = st.columns([3, 1])
+        days = col1.number_input(f"{table}: keep days (0 = forever)", 0, 36500, keep_days or 0)
+        archived = col2.checkbox("Archive", archive, key=f"archive_{table}")
+        if (days or None, archived) != (keep_days, archive):
+            maintenance.set_policy(table, days, archived)
+
+    if st.button("Run Now", disabled=stats["running"]):
+        result = maintenance.run_once(force=True)
+        if result is None:
+            st.warning("Another worker is running maintenance.")
+        else:
+            st.json(result)
+
+    if not stats["incremental_vacuum"] and st.button("Enable Incremental Vacuum (one full VACUUM)"):
+        maintenance.enable_incremental_vacuum()
+        st.rerun()
+
+    files = maintenance.archive.files()
+    if files:
+        st.subheader("Archives")
+        st.dataframe([
+            dict(zip(["Table", "Month", "Rows", "Bytes", "Path"], row)) for row in files
+        ], use_container_width=True, hide_index=True)
+
+
 # =====================================================
 # SETTINGS
 # =====================================================
@@ -341,11 +586,12 @@ elif page == "Settings":
         st.session_state.temperature
     )
 
-    st.session_state.context_window = st.slider(
-        "Context Window (messages)",
-        3,
-        20,
-        st.session_state.context_window
+    st.session_state.context_budget = st.slider(
+        "Context Budget (tokens)",
+        500,
+        16000,
+        st.session_state.context_budget,
+        step=500
     )
 
     st.session_state.system_prompt = st.text_area(
@@ -355,3 +601,7 @@ elif page == "Settings":
     )
 
     st.info("Changes apply immediately.")
+
+
+tracer.record("script_run", (time.perf_counter() - SCRIPT_STARTED) * 1000,
+              session_id=st.session_state.session_id, page=page)
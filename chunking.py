@@ -0,0 +1,511 @@
+import io
+import os
+import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+# =====================================================
+# PROFILES (size / overlap per document type)
+# =====================================================
+# Sizes are in characters. A chunk is packed from whole structural blocks
+# (headings, paragraphs, lists, tables, code) and only a block larger than
+# `chunk_size` is cut: tables between rows (header repeated), code and
+# lists between lines, prose between sentences. Overlap is only added
+# between prose pieces; repeating half a table or function helps nobody.
+
+class ChunkProfile:
+    """Chunking settings for one document type"""
+
+    def __init__(self, chunk_size=1000, chunk_overlap=150, min_chunk=200, section_prefix=True):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # sections shorter than this are merged with the next one
+        self.min_chunk = min_chunk
+        # start each chunk with its heading path, so it reads (and embeds) in context
+        self.section_prefix = section_prefix
+
+    def as_dict(self):
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "min_chunk": self.min_chunk,
+            "section_prefix": self.section_prefix
+        }
+
+
+DEFAULT_PROFILES = {
+    "pdf": ChunkProfile(1200, 150),
+    "markdown": ChunkProfile(1500, 150),
+    "text": ChunkProfile(1000, 150),
+    "code": ChunkProfile(1800, 0, min_chunk=400, section_prefix=False)
+}
+
+MARKDOWN_SUFFIXES = (".md", ".markdown", ".rst")
+CODE_SUFFIXES = (".py", ".js", ".ts", ".tsx", ".jsx", ".java", ".go", ".rs", ".c", ".h", ".cpp", ".hpp",
+                 ".cs", ".rb", ".php", ".sh", ".sql", ".kt", ".swift", ".scala")
+
+
+def doc_type(source):
+    """Profile name for a file name: pdf, markdown, code or text"""
+    ext = os.path.splitext(source.lower())[1]
+    if ext == ".pdf":
+        return "pdf"
+    if ext in MARKDOWN_SUFFIXES:
+        return "markdown"
+    if ext in CODE_SUFFIXES:
+        return "code"
+    return "text"
+
+
+def load_profiles(overrides=None):
+    """DEFAULT_PROFILES updated from {"pdf": {"chunk_size": 800, ...}} (e.g. an app secret)"""
+    profiles = dict(DEFAULT_PROFILES)
+    for name, settings in (overrides or {}).items():
+        base = profiles.get(name, DEFAULT_PROFILES["text"]).as_dict()
+        profiles[name] = ChunkProfile(**{**base, **dict(settings)})
+    return profiles
+
+
+# =====================================================
+# BLOCK PARSER
+# =====================================================
+
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_MD_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$")
+_NUMBERED_HEADING = re.compile(r"^(\d+(?:\.\d+){0,3})\.?\s+([A-Z][^.!?:;]{1,78})$")
+_MD_TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$")
+_MD_TABLE_RULE = re.compile(r"^\s*\|?\s*:?-{3,}")
+_COLUMN_GAP = re.compile(r"\S(?: {2,}|\t)(?=\S)")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+•]|\d{1,3}[.)])\s+\S")
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]?\s+")
+_BLANK_LINE = re.compile(r"\n[ \t]*\n")
+_LINE_END = re.compile(r"\n")
+_SPACE = re.compile(r"\s+")
+
+# cut points tried in order when a block has to be split
+CUT_POINTS = {
+    "text": (_BLANK_LINE, _SENTENCE_END, _LINE_END, _SPACE),
+    "list": (_LINE_END, _SPACE),
+    "code": (_BLANK_LINE, _LINE_END, _SPACE),
+    "table": (_LINE_END, _SPACE)
+}
+
+
+class Block:
+    """A structural unit of a page: text[start:end] of one `kind`"""
+
+    __slots__ = ("kind", "start", "end", "level", "title")
+
+    def __init__(self, kind, start, end, level=0, title=""):
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.level = level
+        self.title = title
+
+
+def _heading(line):
+    """(level, title) if a stripped line looks like a heading"""
+    match = _MD_HEADING.match(line)
+    if match:
+        return len(match.group(1)), match.group(2)
+    match = _NUMBERED_HEADING.match(line)
+    if match:
+        return match.group(1).count(".") + 1, line
+    letters = [c for c in line if c.isalpha()]
+    if 3 <= len(line) <= 60 and len(letters) >= 3 and line.upper() == line and not line.endswith((".", ",")):
+        return 1, line.title()
+    return None
+
+
+def _is_table_row(line):
+    return bool(_MD_TABLE_ROW.match(line)) or len(_COLUMN_GAP.findall(line.strip())) >= 2
+
+
+def _starts_block(line):
+    return bool(_FENCE.match(line) or _MD_HEADING.match(line) or _MD_TABLE_ROW.match(line)
+                or _LIST_ITEM.match(line))
+
+
+def _code_units(lines, offsets):
+    """Top-level units of a source file: a new unit starts after a blank line at column 0"""
+    blocks, start = [], 0
+    for i in range(1, len(lines)):
+        line = lines[i]
+        if (line.strip() and not lines[i - 1].strip() and line[:1] not in " \t}])"
+                and not line.lstrip().startswith(("else", "elif", "except", "finally", "catch"))):
+            blocks.append(Block("code", offsets[start], offsets[i]))
+            start = i
+    blocks.append(Block("code", offsets[start], offsets[-1]))
+    return [b for b in blocks if b.end > b.start]
+
+
+def parse_blocks(text, kind="text", table_open=False):
+    """Split a page into Blocks (heading, code, table, list, text) covering its non-blank lines
+
+    `table_open` says the previous page ended inside a column table, so rows
+    at the top of this page belong to it even if they are few.
+    """
+    lines = text.splitlines(keepends=True)
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    if not lines:
+        return []
+    if kind == "code":
+        return _code_units(lines, offsets)
+
+    blocks, i, n = [], 0, len(lines)
+    while i < n:
+        line = lines[i]
+        stripped = line.strip()
+        if not stripped:
+            i += 1
+            continue
+
+        if _FENCE.match(line):
+            j = i + 1
+            while j < n and not _FENCE.match(lines[j]):
+                j += 1
+            j = min(j + 1, n)
+            blocks.append(Block("code", offsets[i], offsets[j]))
+            i = j
+            continue
+
+        heading = _heading(stripped)
+        if heading and not _is_table_row(line):
+            blocks.append(Block("heading", offsets[i], offsets[i + 1], *heading))
+            i += 1
+            continue
+
+        continued = table_open and not blocks and _COLUMN_GAP.search(stripped)
+        if _is_table_row(line) or continued:
+            j = i + 1
+            markdown = bool(_MD_TABLE_ROW.match(line))
+            # once started, a column table goes on through rows where a wide cell ate one gap
+            while j < n and lines[j].strip() and (_is_table_row(lines[j]) or _MD_TABLE_RULE.match(lines[j]) or (
+                    not markdown and _COLUMN_GAP.search(lines[j].strip()))):
+                j += 1
+            # a column table may also be cut short by the end of the page
+            if j - i >= (2 if markdown else 1 if continued or j == n else 3):
+                blocks.append(Block("table", offsets[i], offsets[j]))
+                i = j
+                continue
+
+        if kind != "pdf" and (line.startswith("    ") or line.startswith("\t")):
+            j = i + 1
+            while j < n and (not lines[j].strip() or lines[j][:1] in " \t"):
+                j += 1
+            while j > i + 1 and not lines[j - 1].strip():
+                j -= 1
+            if j - i >= 3:
+                blocks.append(Block("code", offsets[i], offsets[j]))
+                i = j
+                continue
+
+        if _LIST_ITEM.match(line):
+            j = i + 1
+            while j < n and lines[j].strip() and (
+                _LIST_ITEM.match(lines[j]) or (lines[j][:1] in " \t" and not _FENCE.match(lines[j]))
+            ):
+                j += 1
+            blocks.append(Block("list", offsets[i], offsets[j]))
+            i = j
+            continue
+
+        j = i + 1
+        while j < n and lines[j].strip() and not _starts_block(lines[j]):
+            if _heading(lines[j].strip()) or (j + 2 < n and all(_is_table_row(l) for l in lines[j:j + 3])):
+                break
+            j += 1
+        blocks.append(Block("text", offsets[i], offsets[j]))
+        i = j
+    return blocks
+
+
+# =====================================================
+# SPLITTER
+# =====================================================
+
+def _skip_space(text, pos, end):
+    while pos < end and text[pos].isspace():
+        pos += 1
+    return pos
+
+
+def _cut(text, start, end, size, overlap, patterns):
+    """[(start, end)] pieces of text[start:end], each <= size, cut at the best available boundary"""
+    pieces, pos = [], _skip_space(text, start, end)
+    while end - pos > size:
+        limit = pos + size
+        cut = None
+        for pattern in patterns:
+            # the last boundary in the back half of the window
+            points = [m.end() for m in pattern.finditer(text, pos + size // 2, limit)]
+            if points:
+                cut = points[-1]
+                break
+        cut = cut or limit
+        pieces.append((pos, cut))
+        following = cut
+        if overlap:
+            window_start = max(pos + 1, cut - overlap)
+            for pattern in patterns:
+                match = pattern.search(text, window_start, cut)
+                if match and match.end() < cut:
+                    following = match.end()
+                    break
+        pos = _skip_space(text, following, end)
+    if pos < end and text[pos:end].strip():
+        pieces.append((pos, end))
+    return pieces
+
+
+def _table_header(text, block):
+    lines = text[block.start:block.end].splitlines(keepends=True)
+    return "".join(lines[:2 if len(lines) > 1 and _MD_TABLE_RULE.match(lines[1]) else 1])
+
+
+def _table_pieces(text, block, size, carried=""):
+    """Row groups of a long table; pieces after the first repeat the header row(s)
+
+    `carried` is the header of a table continued from the previous page: every
+    piece gets it, the first one included.
+    """
+    lines = text[block.start:block.end].splitlines(keepends=True)
+    header = carried or _table_header(text, block)
+    pieces, pos, piece_start, length = [], block.start, block.start, 0
+    for line in lines:
+        if length and length + len(line) > size - (len(header) if pieces or carried else 0):
+            pieces.append((piece_start, pos, header if pieces or carried else ""))
+            piece_start, length = pos, 0
+        pos += len(line)
+        length += len(line)
+    pieces.append((piece_start, block.end, header if pieces or carried else ""))
+    return pieces
+
+
+class Chunk:
+    """Picklable stand-in for a LangChain Document (page_content + metadata)"""
+
+    __slots__ = ("page_content", "metadata")
+
+    def __init__(self, page_content, metadata=None):
+        self.page_content = page_content
+        self.metadata = metadata or {}
+
+    def __reduce__(self):
+        return Chunk, (self.page_content, self.metadata)
+
+
+class Trail(list):
+    """Heading path [(level, title)] carried from page to page of one source
+
+    `table_header` is set when a page ends inside a table, so rows continued
+    on the next page are chunked under the header that names their columns.
+    """
+
+    table_header = ""
+
+
+class StructuredSplitter:
+    """Structure-aware `split_documents` for the ingest pipeline
+
+    Each page is parsed into blocks and packed into chunks of whole blocks.
+    A heading starts a new chunk once the current one has `min_chunk`
+    characters, so sections are not glued to their neighbours. Every chunk
+    records where it came from: page, `start`/`end` character offsets (in
+    the page, or in the file for text files, whose pages carry an
+    `offset`), its `section` heading path, and the `kind` of blocks it holds.
+    """
+
+    def __init__(self, profiles=None, doc_type_fn=doc_type):
+        self.profiles = profiles or DEFAULT_PROFILES
+        self.doc_type_fn = doc_type_fn
+
+    def profile_for(self, source):
+        name = self.doc_type_fn(source or "")
+        return name, self.profiles.get(name) or self.profiles.get("text") or DEFAULT_PROFILES["text"]
+
+    def split_documents(self, documents):
+        """Chunks of `documents`; consecutive pages of one source share their heading path"""
+        chunks, trails = [], {}
+        for document in documents:
+            trail = trails.setdefault(document.metadata.get("source"), Trail())
+            chunks.extend(self.split_document(document, trail))
+        return chunks
+
+    def for_document(self):
+        """Splitter for the pages of one document, fed one page at a time (see ingest_document)"""
+        return _DocumentSplitter(self)
+
+    def split_document(self, document, trail=None):
+        """Chunks of one page; `trail` (a Trail) carries headings and an open table over from the previous page"""
+        text = document.page_content
+        metadata = dict(document.metadata)
+        kind, profile = self.profile_for(metadata.get("source", ""))
+        make = type(document)
+        base = metadata.pop("offset", 0)
+
+        trail = Trail() if trail is None else trail
+        blocks = parse_blocks(text, kind, bool(getattr(trail, "table_header", "")))
+        spans = self._spans(text, blocks, profile, trail)
+        chunks = []
+        for index, (start, end, kinds, section, header) in enumerate(spans):
+            body = header + text[start:end]
+            if profile.section_prefix and section and not text[start:end].lstrip().startswith(
+                    ("#", section.rsplit(" > ", 1)[-1])):
+                body = f"{section}\n{body}"
+            chunks.append(make(page_content=body, metadata={
+                **metadata,
+                "doc_type": kind,
+                "chunk": index,
+                "start": base + start,
+                "end": base + end,
+                "section": section,
+                "kind": kinds.pop() if len(kinds) == 1 else "mixed"
+            }))
+        return chunks
+
+    def _spans(self, text, blocks, profile, trail):
+        """(start, end, kinds, section, repeated header) for each chunk of a page"""
+        size, overlap = profile.chunk_size, profile.chunk_overlap
+        spans = []
+        # the open chunk; `lead` is where its trailing headings start (they move on with
+        # whatever content follows them instead of ending a chunk)
+        start = end = lead = last = None
+        kinds, section = set(), ""
+        # a table at the top of the page continues the one the previous page ended in
+        carried = getattr(trail, "table_header", "")
+        carried = carried if blocks and blocks[0].kind == "table" and \
+            _table_header(text, blocks[0]) != carried else ""
+        header = ""
+
+        def emit(until):
+            if start is not None and until > start and text[start:until].strip():
+                spans.append((start, until, set(kinds) or {"text"}, section, header))
+
+        def path():
+            return " > ".join(title for _, title in trail)
+
+        for block in blocks:
+            if block.kind == "heading":
+                if start is not None and lead is None and end - start >= profile.min_chunk:
+                    emit(end)
+                    start = None
+                while trail and trail[-1][0] >= block.level:
+                    trail.pop()
+                trail.append((block.level, block.title.strip()))
+                if start is None:
+                    start, kinds, section, header = block.start, set(), path(), ""
+                if lead is None:
+                    lead = block.start
+                end = block.end
+                continue
+
+            if block.end - block.start > size or (start is not None and block.end - start > size):
+                # close the open chunk before this block; trailing headings go with the block
+                heading_start = lead
+                emit(lead if lead is not None else end)
+                following = heading_start if heading_start is not None else block.start
+                if (heading_start is None and overlap and last is not None and last.kind == "text"
+                        and block.kind == "text" and block.end - block.start <= size):
+                    # carry the previous paragraph's last sentences over
+                    match = _SENTENCE_END.search(text, max(last.start, last.end - overlap), last.end)
+                    if match and match.end() < last.end:
+                        following = match.end()
+                start, lead, kinds, section, header = None, None, set(), path(), ""
+
+                if block.end - block.start > size:
+                    if block.kind == "table":
+                        pieces = _table_pieces(text, block, size, carried if block is blocks[0] else "")
+                    else:
+                        pieces = [(s, e, "") for s, e in _cut(
+                            text, block.start, block.end, size, overlap if block.kind == "text" else 0,
+                            CUT_POINTS[block.kind]
+                        )]
+                    for number, (s, e, repeated) in enumerate(pieces):
+                        # the first piece keeps any headings that introduced the block
+                        spans.append((following if number == 0 else s, e, {block.kind}, section, repeated))
+                    last = block
+                    continue
+                start = following
+
+            if start is None:
+                start, kinds, section = block.start, set(), path()
+                header = carried if block is blocks[0] else ""
+            end = block.end
+            kinds.add(block.kind)
+            lead, last = None, block
+        emit(end if end is not None else 0)
+        if not spans and text.strip():
+            spans.append((0, len(text), {"text"}, path(), ""))
+        if isinstance(trail, Trail):
+            trail.table_header = "" if not blocks or blocks[-1].kind != "table" else \
+                carried if blocks[-1] is blocks[0] and carried else _table_header(text, blocks[-1])
+        return spans
+
+
+class _DocumentSplitter:
+    """StructuredSplitter bound to one document: the heading path survives page breaks"""
+
+    def __init__(self, splitter):
+        self.splitter = splitter
+        self.trail = Trail()
+
+    def split_documents(self, documents):
+        chunks = []
+        for document in documents:
+            chunks.extend(self.splitter.split_document(document, self.trail))
+        return chunks
+
+
+def citation(metadata):
+    """Human-readable source of a chunk: "manual.pdf p.4 › Setup > Wiring (chars 1200-2350)" """
+    parts = [str(metadata.get("source", "?"))]
+    if metadata.get("doc_type") == "pdf" and metadata.get("page") is not None:
+        parts.append(f"p.{int(metadata['page']) + 1}")
+    if metadata.get("section"):
+        parts.append(f"› {metadata['section']}")
+    if metadata.get("start") is not None and metadata.get("end") is not None:
+        parts.append(f"(chars {metadata['start']}-{metadata['end']})")
+    return " ".join(parts)
+
+
+# =====================================================
+# PARALLEL SPLITTING FOR MULTI-FILE UPLOADS
+# =====================================================
+# Text extraction (pypdf) and parsing are CPU-bound and hold the GIL, so a
+# batch of uploads is split in worker processes. Workers get (name, bytes)
+# and send back Chunk lists, which ingest_document takes with
+# `splitter=None`. A single upload stays in-process and page-lazy.
+
+def split_file(name, data, profiles=None):
+    """Read and split one file's bytes; runs in a split_pool worker"""
+    from document_stream import iter_pdf_pages, iter_text_pages
+    stream = io.BytesIO(data)
+    if name.lower().endswith(".pdf"):
+        pages = iter_pdf_pages(stream, name, make_document=Chunk)
+    else:
+        pages = iter_text_pages(stream, name, make_document=Chunk)
+    return StructuredSplitter(profiles).split_documents(pages)
+
+
+def split_pool(max_workers=None):
+    """Process pool for iter_split_uploads (forkserver where available, like code_runner)"""
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    return ProcessPoolExecutor(max_workers=max_workers or min(4, os.cpu_count() or 1), mp_context=context)
+
+
+def iter_split_uploads(pool, uploads, profiles=None):
+    """Split (name, bytes) pairs in `pool`; yields (name, chunks, error) as each file finishes"""
+    futures = {pool.submit(split_file, name, data, profiles): name for name, data in uploads}
+    for future in as_completed(futures):
+        try:
+            yield futures[future], future.result(), None
+        except Exception as e:
+            yield futures[future], [], e
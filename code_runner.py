@@ -0,0 +1,363 @@
+import io
+import os
+import sys
+import time
+import queue
+import signal
+import atexit
+import builtins
+import tempfile
+import importlib
+import threading
+import traceback
+import multiprocessing
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+
+# =====================================================
+# WORKER PROCESS
+# =====================================================
+# Workers are forked from a clean forkserver process (spawned on platforms
+# without fork), so they never inherit the Streamlit server's threads. Each
+# worker imports WARM_IMPORTS once and then serves snippets over a pipe. This
+# isolates resources and output, but it is not a security boundary: snippets
+# still run as the server's user. RLIMIT_NPROC=0 (no fork bombs) is ignored
+# for root, so a worker started as root first switches to "nobody"; if it
+# can't, snippets may fork (a forked copy is never let back on the pipe).
+
+WARM_IMPORTS = ("math", "json", "random", "re", "datetime", "statistics", "collections", "itertools",
+                "functools", "decimal", "fractions", "string", "textwrap")
+MAX_OUTPUT = 64 * 1024
+
+# builtins as the worker started; every snippet gets its own copy, and the
+# module itself is put back if a snippet imported and changed it
+_BUILTINS = dict(vars(builtins))
+
+
+def _limit(name, value):
+    if not RESOURCE_AVAILABLE or not hasattr(resource, name):
+        return
+    kind = getattr(resource, name)
+    _, hard = resource.getrlimit(kind)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    try:
+        resource.setrlimit(kind, (value, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _cpu_used():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _snippet_line(tb):
+    line = None
+    for frame in traceback.extract_tb(tb):
+        if frame.filename == "<snippet>":
+            line = frame.lineno
+    return line
+
+
+def _execute(code, cpu_seconds):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    sys.stdout, sys.stderr = stdout, stderr
+    if RESOURCE_AVAILABLE:
+        # RLIMIT_CPU counts the whole process lifetime, so move the soft limit per snippet
+        _limit("RLIMIT_CPU", int(_cpu_used()) + cpu_seconds + 1)
+    error, line = None, None
+    try:
+        exec(compile(code, "<snippet>", "exec"), {"__builtins__": dict(_BUILTINS), "__name__": "__main__"})
+    except BaseException as e:
+        if isinstance(e, KeyboardInterrupt):
+            raise
+        error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        line = _snippet_line(e.__traceback__)
+    finally:
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        live = builtins.__dict__
+        if live != _BUILTINS:
+            live.clear()
+            live.update(_BUILTINS)
+    return {
+        "output": stdout.getvalue()[:MAX_OUTPUT],
+        "errors": stderr.getvalue()[:MAX_OUTPUT],
+        "error": error,
+        "line": line
+    }
+
+
+def _drop_root():
+    if not hasattr(os, "geteuid") or os.geteuid() != 0:
+        return
+    try:
+        import pwd
+        nobody = pwd.getpwnam("nobody")
+        uid, gid = nobody.pw_uid, nobody.pw_gid
+    except (ImportError, KeyError):
+        uid = gid = 65534
+    try:
+        os.setgroups([])
+        os.setgid(gid)
+        os.setuid(uid)
+    except OSError:
+        pass
+
+
+def _worker_main(conn, memory_mb, file_mb, cpu_seconds):
+    _drop_root()
+    os.chdir(tempfile.mkdtemp(prefix="snippet-"))
+    _limit("RLIMIT_AS", memory_mb * 1024 * 1024)
+    _limit("RLIMIT_FSIZE", file_mb * 1024 * 1024)
+    _limit("RLIMIT_NPROC", 0)
+    for name in WARM_IMPORTS:
+        importlib.import_module(name)
+    pid = os.getpid()
+    try:
+        conn.send("ready")
+    except OSError:
+        return
+    while True:
+        try:
+            code = conn.recv()
+        except (EOFError, OSError, KeyboardInterrupt):
+            break
+        if code is None:
+            break
+        result = _execute(code, cpu_seconds)
+        if os.getpid() != pid:
+            # a snippet that forked: the copy must never answer on the pipe
+            os._exit(0)
+        conn.send(result)
+
+
+# =====================================================
+# PREFORKED POOL
+# =====================================================
+
+class RunResult:
+    """Outcome of one snippet: status is ok, error, timeout or killed"""
+
+    def __init__(self, status, output="", errors="", error=None, line=None, seconds=0.0):
+        self.status = status
+        self.output = output
+        self.errors = errors
+        self.error = error
+        self.line = line
+        self.seconds = seconds
+
+    def as_dict(self):
+        return {
+            "status": self.status,
+            "output": self.output,
+            "errors": self.errors,
+            "error": self.error,
+            "line": self.line,
+            "seconds": round(self.seconds, 3)
+        }
+
+
+def _context():
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" in methods:
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["code_runner", *WARM_IMPORTS])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class _Worker:
+    def __init__(self, context, memory_mb, file_mb, cpu_seconds):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child, memory_mb, file_mb, cpu_seconds), daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.runs = 0
+        self.ready = False
+
+    def wait_ready(self, timeout):
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = self.conn.recv() == "ready"
+        return self.ready
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+
+class CodeRunner:
+    """Pool of warm worker processes that run untrusted snippets one at a time
+
+    Every run gets a wall-clock timeout (the worker is killed and replaced
+    when it expires), an RLIMIT_CPU budget, and address-space/file-size
+    caps. stdout/stderr are captured inside the worker, so concurrent
+    sessions never see each other's output. Workers are recycled after
+    `max_runs` snippets so module-level state cannot pile up. A worker that
+    can't be spawned (fork error, process limit) is retried in the
+    background; a run that finds no worker within `wait_timeout` seconds
+    gets a "killed" result instead of blocking.
+    """
+
+    def __init__(self, workers=2, max_runs=50, cpu_seconds=5, memory_mb=512, file_mb=16, start_timeout=30,
+                 wait_timeout=30, spawn_retries=3):
+        self.context = _context()
+        self.max_runs = max_runs
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.file_mb = file_mb
+        self.start_timeout = start_timeout
+        self.wait_timeout = wait_timeout
+        self.spawn_retries = spawn_retries
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = 0
+        self.recycled = 0
+        self.killed = 0
+        self.missing = 0
+        self.spawn_error = None
+        self.closed = False
+        for _ in range(workers):
+            worker = self._spawn()
+            if worker is None:
+                with self.lock:
+                    self.missing += 1
+            else:
+                self.idle.put(worker)
+        atexit.register(self.close)
+
+    def _spawn(self, retries=0):
+        """A new worker, or None when it can't be started (error kept in `spawn_error`)"""
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(0.5 * 2 ** (attempt - 1))
+            try:
+                worker = _Worker(self.context, self.memory_mb, self.file_mb, self.cpu_seconds)
+            except (OSError, RuntimeError, ValueError) as e:
+                self.spawn_error = f"{type(e).__name__}: {e}"
+                continue
+            with self.lock:
+                self.started += 1
+            return worker
+        return None
+
+    def _replace(self, worker):
+        worker.kill()
+        if not self.closed:
+            # start the replacement off the request path so the next run finds it warm
+            threading.Thread(target=self._refill, daemon=True).start()
+
+    def _refill(self):
+        worker = self._spawn(self.spawn_retries)
+        if worker is None:
+            # the next run that finds no idle worker tries again
+            with self.lock:
+                self.missing += 1
+            return
+        self.idle.put(worker)
+        if self.closed:
+            self.close()
+
+    def _acquire(self):
+        """An idle worker; a lost one is respawned in place. None after `wait_timeout` seconds"""
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            try:
+                return self.idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self.lock:
+                respawn = self.missing > 0
+                if respawn:
+                    self.missing -= 1
+            if respawn:
+                worker = self._spawn()
+                if worker is None:
+                    with self.lock:
+                        self.missing += 1
+                return worker
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                return self.idle.get(timeout=min(remaining, 0.5))
+            except queue.Empty:
+                pass
+
+    def run(self, code, timeout=5):
+        """Run a snippet; waits up to `wait_timeout` for a free worker, then at most `timeout` seconds"""
+        started = time.perf_counter()
+        worker = self._acquire()
+        if worker is None:
+            reason = f"could not start a worker ({self.spawn_error})" if self.missing else "all workers are busy"
+            return RunResult("killed", error=reason, seconds=time.perf_counter() - started)
+        started = time.perf_counter()
+        if not worker.wait_ready(self.start_timeout):
+            self._replace(worker)
+            return RunResult("killed", error="worker failed to start", seconds=time.perf_counter() - started)
+
+        try:
+            worker.conn.send(code)
+            if not worker.conn.poll(timeout):
+                with self.lock:
+                    self.killed += 1
+                self._replace(worker)
+                return RunResult("timeout", error=f"timed out after {timeout}s",
+                                 seconds=time.perf_counter() - started)
+            reply = worker.conn.recv()
+        except (EOFError, OSError, BrokenPipeError):
+            worker.process.join(1)
+            with self.lock:
+                self.killed += 1
+            self._replace(worker)
+            return RunResult("killed", error=self._exit_reason(worker.process.exitcode),
+                             seconds=time.perf_counter() - started)
+
+        worker.runs += 1
+        if worker.runs >= self.max_runs:
+            with self.lock:
+                self.recycled += 1
+            self._replace(worker)
+        else:
+            self.idle.put(worker)
+        status = "error" if reply["error"] else "ok"
+        return RunResult(status, reply["output"], reply["errors"], reply["error"], reply["line"],
+                         time.perf_counter() - started)
+
+    def _exit_reason(self, exitcode):
+        if exitcode == -getattr(signal, "SIGXCPU", 0):
+            return f"CPU time limit exceeded ({self.cpu_seconds}s)"
+        if exitcode == -signal.SIGKILL:
+            return "killed (out of memory?)"
+        return f"worker exited with code {exitcode}"
+
+    def stats(self):
+        return {
+            "idle": self.idle.qsize(),
+            "started": self.started,
+            "recycled": self.recycled,
+            "killed": self.killed,
+            "missing": self.missing
+        }
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                worker.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+            worker.kill()
@@ -0,0 +1,210 @@
+import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+
+# =====================================================
+# TOKEN COUNTING
+# =====================================================
+
+_encoders = {}
+
+
+def _encoder(model):
+    name = "o200k_base" if "4o" in (model or "") else "cl100k_base"
+    if name not in _encoders:
+        _encoders[name] = tiktoken.get_encoding(name)
+    return _encoders[name]
+
+
+def count_tokens(text, model=None):
+    """Local token count (tiktoken when installed, ~4 chars/token otherwise)"""
+    if not text:
+        return 0
+    if TIKTOKEN_AVAILABLE:
+        return len(_encoder(model).encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def message_tokens(message, model=None):
+    """Tokens for one chat message including the per-message framing overhead"""
+    if "context_tokens" not in message:
+        message["context_tokens"] = count_tokens(message["content"], model) + 4
+    return message["context_tokens"]
+
+
+# =====================================================
+# CONTEXT ASSEMBLY
+# =====================================================
+
+def build_context(system_prompt, history, budget, summary="", model=None):
+    """Pack the newest turns that fit in `budget` tokens behind the system prompt
+
+    Returns (messages, first_kept) where messages is a list of
+    {"role", "content"} dicts and first_kept is the index in `history` of the
+    oldest turn that made it in; everything before it is expected to be
+    covered by the rolling `summary`.
+    """
+    system = system_prompt
+    if summary:
+        system = f"{system_prompt}\n\nSummary of the earlier conversation:\n{summary}"
+    used = count_tokens(system, model) + 4
+
+    kept = []
+    first_kept = len(history)
+    for index in range(len(history) - 1, -1, -1):
+        cost = message_tokens(history[index], model)
+        # always keep the latest turn, even if it alone blows the budget
+        if kept and used + cost > budget:
+            break
+        kept.append({"role": history[index]["role"], "content": history[index]["content"]})
+        used += cost
+        first_kept = index
+
+    return [{"role": "system", "content": system}] + kept[::-1], first_kept
+
+
+def summary_upto(history, first_kept, has_older=False):
+    """Id of the newest stored turn left out of the prompt, or None if none was
+
+    Turns before `first_kept` didn't fit the budget; with `has_older` the
+    turns before history[0] (paged out, or never loaded) are left out too.
+    Either way they belong in the rolling summary.
+    """
+    if first_kept > 0 and history[first_kept - 1].get("id"):
+        return history[first_kept - 1]["id"]
+    if has_older and history and history[0].get("id"):
+        return history[0]["id"] - 1
+    return None
+
+
+# =====================================================
+# ROLLING SUMMARY
+# =====================================================
+
+SUMMARY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS conversation_summaries (
+        session_id TEXT PRIMARY KEY,
+        summary TEXT,
+        upto_id INTEGER,
+        updated_at TEXT
+    )
+"""
+
+SUMMARY_PROMPT = (
+    "Update the running summary of a conversation. Keep names, numbers, decisions "
+    "and open questions; drop small talk. Reply with the new summary only.\n\n"
+    "Current summary:\n{summary}\n\nNew turns:\n{turns}"
+)
+
+
+class RollingSummarizer:
+    """Folds turns that fell out of the context budget into a per-session summary
+
+    Folding runs on a background thread so it never sits on the response
+    path; the next turn simply picks up whatever summary is ready by then.
+    Turns are folded in passes of at most `fold_rows` rows / `fold_tokens`
+    tokens, and `upto_id` is saved after each pass, so a long backlog never
+    becomes one oversized prompt. A failed pass is counted in `failures`
+    (message in `last_error`) and retried on the next turn. `forget` and
+    `invalidate` drop a summary whose turns were deleted, so it gets folded
+    again from the turns that are left. Summaries live
+    in the `conversation_summaries` table of a Database (schema:
+    database.MIGRATIONS).
+    """
+
+    def __init__(self, db, summarize_fn, table="chats", fold_rows=200, fold_tokens=6000, model=None):
+        self.db = db
+        self.summarize_fn = summarize_fn
+        self.table = table
+        self.fold_rows = fold_rows
+        self.fold_tokens = fold_tokens
+        self.model = model
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer")
+        self.in_flight = set()
+        self.generations = {}
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.last_error = None
+
+    def get(self, session_id):
+        """(summary, upto_id) for a session; ("", 0) when nothing is folded yet"""
+        row = self.db.query_one(
+            "SELECT summary, upto_id FROM conversation_summaries WHERE session_id=?", (session_id,)
+        )
+        return (row[0], row[1]) if row else ("", 0)
+
+    def schedule(self, session_id, upto_id):
+        """Fold every stored turn with id <= upto_id in the background"""
+        with self.lock:
+            if session_id in self.in_flight:
+                return
+            self.in_flight.add(session_id)
+        self.executor.submit(self._fold, session_id, upto_id)
+
+    def forget(self, session_id):
+        """Drop a session's summary (its turns were cleared); a fold in flight won't write it back"""
+        with self.lock:
+            self.generations[session_id] = self.generations.get(session_id, 0) + 1
+        self.db.execute("DELETE FROM conversation_summaries WHERE session_id=?", (session_id,))
+
+    def invalidate(self, session_id, message_id):
+        """Drop the summary if it covers `message_id` (a deleted turn); True if it did"""
+        if message_id > self.get(session_id)[1]:
+            return False
+        self.forget(session_id)
+        return True
+
+    def _turns(self, rows):
+        """Leading rows that fit in `fold_tokens` (at least one, cut to the budget)"""
+        taken, used = [], 0
+        for row_id, role, content in rows:
+            cost = count_tokens(content, self.model) + 4
+            if taken and used + cost > self.fold_tokens:
+                break
+            if cost > self.fold_tokens:
+                content = content[:self.fold_tokens * 4]
+            taken.append((row_id, f"{role}: {content}"))
+            used += cost
+        return taken
+
+    def _fold(self, session_id, upto_id):
+        with self.lock:
+            generation = self.generations.get(session_id, 0)
+        try:
+            summary, done_id = self.get(session_id)
+            while done_id < upto_id:
+                rows = self.db.query(
+                    f"SELECT id, role, content FROM {self.table} "
+                    f"WHERE session_id=? AND deleted_at IS NULL AND id>? AND id<=? ORDER BY id LIMIT ?",
+                    (session_id, done_id, upto_id, self.fold_rows)
+                )
+                if not rows:
+                    return
+                turns = self._turns(rows)
+                summary = self.summarize_fn(SUMMARY_PROMPT.format(
+                    summary=summary or "(none)", turns="\n".join(text for _, text in turns)
+                ))
+                done_id = turns[-1][0]
+                with self.lock:
+                    if self.generations.get(session_id, 0) != generation:
+                        return
+                self.db.execute(
+                    "INSERT OR REPLACE INTO conversation_summaries (session_id, summary, upto_id, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (session_id, summary, done_id, time.strftime("%Y-%m-%dT%H:%M:%S"))
+                )
+        except Exception as e:
+            # folded passes are kept; the rest is retried on the next turn
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+        finally:
+            with self.lock:
+                self.in_flight.discard(session_id)
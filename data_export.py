@@ -0,0 +1,270 @@
+import os
+import bz2
+import gzip
+import json
+import lzma
+import shutil
+import zipfile
+import tempfile
+from analytics_store import event_rollup_writes
+from startup import module_available
+
+# pyarrow is optional and slow to import, so it is only loaded by the Parquet paths
+PARQUET_AVAILABLE = module_available("pyarrow")
+
+
+# =====================================================
+# EXPORTABLE TABLES
+# =====================================================
+# Rows are read in keyset batches (id > last id), so memory is bounded by
+# `batch_size` whatever the table size. Ids are exported for reference only:
+# imports let the target database assign its own, so an export can be merged
+# into any database. A row is skipped when the target already holds one with
+# the same natural key (IMPORT_KEYS), so importing the same export twice adds
+# nothing. Soft-deleted chats are not exported.
+
+EXPORT_TABLES = {
+    "chats": (
+        ("id", "INTEGER"), ("session_id", "TEXT"), ("role", "TEXT"), ("content", "TEXT"),
+        ("tokens", "INTEGER"), ("timestamp", "TEXT"), ("user", "TEXT")
+    ),
+    "analytics": (
+        ("id", "INTEGER"), ("event_type", "TEXT"), ("event_data", "TEXT"), ("timestamp", "TEXT"),
+        ("session_id", "TEXT"), ("latency_ms", "REAL"), ("tokens", "INTEGER")
+    ),
+    "usage": (
+        ("id", "INTEGER"), ("request_id", "TEXT"), ("session_id", "TEXT"), ("model", "TEXT"),
+        ("feature", "TEXT"), ("prompt_tokens", "INTEGER"), ("completion_tokens", "INTEGER"),
+        ("cached_tokens", "INTEGER"), ("total_tokens", "INTEGER"), ("estimated", "INTEGER"),
+        ("latency_ms", "REAL"), ("ttft_ms", "REAL"), ("timestamp", "TEXT")
+    )
+}
+
+# natural keys for import deduplication; each leads with indexed columns
+IMPORT_KEYS = {
+    "chats": ("timestamp", "session_id", "role", "content"),
+    "analytics": ("event_type", "timestamp", "session_id", "event_data"),
+    "usage": ("model", "timestamp", "request_id", "session_id")
+}
+
+LIVE_ONLY = {"chats": "deleted_at IS NULL"}
+
+FORMATS = ("ndjson", "parquet")
+NDJSON_COMPRESSION = {None: open, "gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+NDJSON_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+PARQUET_COMPRESSION = ("snappy", "zstd", "gzip", "none")
+
+
+def _columns(table):
+    return [name for name, _ in EXPORT_TABLES[table]]
+
+
+def iter_batches(db, table, since=None, until=None, session_ids=None, batch_size=5000):
+    """Yield lists of row tuples (EXPORT_TABLES column order) matching the filters
+
+    `since`/`until` are ISO dates or timestamps compared against the row
+    timestamp (`until` is exclusive); `session_ids` limits to those sessions.
+    """
+    columns = _columns(table)
+    clauses, params = ["id > ?"], []
+    if table in LIVE_ONLY:
+        clauses.append(LIVE_ONLY[table])
+    if since:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    if until:
+        clauses.append("timestamp < ?")
+        params.append(until)
+    if session_ids:
+        session_ids = list(session_ids)
+        clauses.append(f"session_id IN ({','.join('?' * len(session_ids))})")
+        params += session_ids
+    sql = f"SELECT {', '.join(columns)} FROM {table} WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?"
+
+    last_id = 0
+    while True:
+        rows = db.query(sql, [last_id] + params + [batch_size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+# =====================================================
+# EXPORT
+# =====================================================
+
+def export_ndjson(db, path, tables=tuple(EXPORT_TABLES), compression=None, batch_size=5000, **filters):
+    """One JSON object per line, tagged with "_table"; returns {table: rows}"""
+    counts = {}
+    with NDJSON_COMPRESSION[compression](path, "wt", encoding="utf-8") as out:
+        for table in tables:
+            columns = _columns(table)
+            counts[table] = 0
+            for rows in iter_batches(db, table, batch_size=batch_size, **filters):
+                out.writelines(
+                    json.dumps({"_table": table, **dict(zip(columns, row))}, ensure_ascii=False) + "\n"
+                    for row in rows
+                )
+                counts[table] += len(rows)
+    return counts
+
+
+def _arrow_schema(table):
+    import pyarrow as pa
+    types = {"INTEGER": pa.int64(), "REAL": pa.float64(), "TEXT": pa.string()}
+    return pa.schema([(name, types[kind]) for name, kind in EXPORT_TABLES[table]])
+
+
+def export_parquet(db, path, tables=tuple(EXPORT_TABLES), compression="zstd", batch_size=5000, **filters):
+    """Zip archive with one `<table>.parquet` per table (one row group per batch); returns {table: rows}"""
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    counts = {}
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for table in tables:
+            schema = _arrow_schema(table)
+            columns = _columns(table)
+            counts[table] = 0
+            # parquet needs its footer written last, so stage each table in a temp file
+            fd, staged = tempfile.mkstemp(suffix=".parquet")
+            os.close(fd)
+            try:
+                with pq.ParquetWriter(staged, schema, compression=compression) as writer:
+                    for rows in iter_batches(db, table, batch_size=batch_size, **filters):
+                        writer.write_batch(pa.record_batch(
+                            [pa.array([row[i] for row in rows], type=schema.field(i).type)
+                             for i in range(len(columns))],
+                            schema=schema
+                        ))
+                        counts[table] += len(rows)
+                archive.write(staged, f"{table}.parquet")
+            finally:
+                os.remove(staged)
+    return counts
+
+
+def export_data(db, path, fmt="ndjson", compression=None, **options):
+    """Export to `path` in `fmt`; see export_ndjson / export_parquet for options"""
+    if fmt == "ndjson":
+        return export_ndjson(db, path, compression=compression, **options)
+    if fmt == "parquet":
+        return export_parquet(db, path, compression=compression or "zstd", **options)
+    raise ValueError(f"unknown export format {fmt!r} (expected one of {FORMATS})")
+
+
+def export_filename(fmt, compression=None):
+    if fmt == "parquet":
+        return "export.parquet.zip"
+    suffix = {v: k for k, v in NDJSON_SUFFIXES.items()}.get(compression, "")
+    return f"export.ndjson{suffix}"
+
+
+# =====================================================
+# IMPORT (batched transactions)
+# =====================================================
+
+def _insert_sql(table):
+    """INSERT that skips a row when one with the same natural key (IMPORT_KEYS) exists"""
+    columns = [c for c in _columns(table) if c != "id"]
+    match = " AND ".join(f"{c} IS ?" for c in IMPORT_KEYS[table])
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join('?' * len(columns))} "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {match})"
+    )
+
+
+def _insert_rows(conn, table, rows):
+    """Insert dicts into `table` (unknown keys ignored, ids reassigned, duplicates skipped); returns rows inserted"""
+    sql = _insert_sql(table)
+    columns = [c for c in _columns(table) if c != "id"]
+    values = [tuple(row.get(c) for c in columns) + tuple(row.get(c) for c in IMPORT_KEYS[table]) for row in rows]
+    if table != "analytics":
+        # chat rollups follow from triggers, which only fire for inserted rows
+        return conn.executemany(sql, values).rowcount
+    # analytics rollups are kept by the writer, so only roll up rows that went in
+    inserted = 0
+    for row, params in zip(rows, values):
+        if not conn.execute(sql, params).rowcount:
+            continue
+        inserted += 1
+        if row.get("timestamp"):
+            for rollup_sql, rollup_params in event_rollup_writes(
+                row.get("event_type"), row["timestamp"], row.get("latency_ms"), row.get("tokens") or 0
+            ):
+                conn.execute(rollup_sql, rollup_params)
+    return inserted
+
+
+def _flush(db, pending, counts):
+    for table, rows in pending.items():
+        if rows:
+            with db.transaction() as conn:
+                inserted = _insert_rows(conn, table, rows)
+            count = counts.setdefault(table, {"inserted": 0, "skipped": 0})
+            count["inserted"] += inserted
+            count["skipped"] += len(rows) - inserted
+            rows.clear()
+
+
+def import_ndjson(db, stream, batch_size=5000):
+    """Import "_table"-tagged NDJSON lines from a text stream; returns {table: {"inserted", "skipped"}}"""
+    counts, pending = {}, {table: [] for table in EXPORT_TABLES}
+    for line in stream:
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        table = row.pop("_table", None)
+        if table not in pending:
+            raise ValueError(f"line has no known _table: {line[:80]!r}")
+        pending[table].append(row)
+        if len(pending[table]) >= batch_size:
+            _flush(db, {table: pending[table]}, counts)
+    _flush(db, pending, counts)
+    return counts
+
+
+def import_parquet(db, source, table, batch_size=5000):
+    """Import one table from a Parquet file (path or binary file object); returns {"inserted", "skipped"}"""
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet import needs pyarrow (pip install pyarrow)")
+    import pyarrow.parquet as pq
+    parquet = pq.ParquetFile(source)
+    present = [c for c in _columns(table) if c in parquet.schema_arrow.names]
+    counts = {}
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=present):
+        _flush(db, {table: batch.to_pylist()}, counts)
+    return counts.get(table, {"inserted": 0, "skipped": 0})
+
+
+def import_data(db, path, batch_size=5000):
+    """Import an export file, choosing the reader from its name; returns {table: {"inserted", "skipped"}}"""
+    if path.endswith(".zip"):
+        counts = {}
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                table = name.rsplit("/", 1)[-1].removesuffix(".parquet")
+                if name.endswith(".parquet") and table in EXPORT_TABLES:
+                    with archive.open(name) as member:
+                        counts[table] = import_parquet(db, member, table, batch_size)
+        return counts
+    if path.endswith(".parquet"):
+        table = os.path.basename(path).removesuffix(".parquet")
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"can't tell which table {path!r} holds (name it <table>.parquet)")
+        return {table: import_parquet(db, path, table, batch_size)}
+    compression = NDJSON_SUFFIXES.get(os.path.splitext(path)[1])
+    with NDJSON_COMPRESSION[compression](path, "rt", encoding="utf-8") as stream:
+        return import_ndjson(db, stream, batch_size)
+
+
+def save_upload(uploaded_file, directory=None):
+    """Copy a Streamlit upload to a temp file in chunks (keeps its name's suffixes); returns the path"""
+    directory = tempfile.mkdtemp(dir=directory)
+    path = os.path.join(directory, os.path.basename(uploaded_file.name))
+    uploaded_file.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(uploaded_file, out, 1024 * 1024)
+    return path
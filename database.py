@@ -0,0 +1,240 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from analytics_store import ensure_schema
+from usage import USAGE_SCHEMA
+from context_builder import SUMMARY_SCHEMA
+from tracing import TRACE_SCHEMA
+from rag_collections import COLLECTION_SCHEMA, collection_embedding_schema
+from chat_store import soft_delete_schema
+from maintenance import retention_schema
+
+
+# =====================================================
+# SQLITE TUNING
+# =====================================================
+
+STATEMENT_CACHE_SIZE = 256
+
+
+def apply_pragmas(conn):
+    """WAL + relaxed fsync: readers never block the writer, commits skip the per-event fsync"""
+    # only takes effect on a new file (before WAL writes the header); see Maintenance.vacuum
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-16000")
+    conn.execute("PRAGMA wal_autocheckpoint=1000")
+    return conn
+
+
+# =====================================================
+# VERSIONED MIGRATIONS (PRAGMA user_version)
+# =====================================================
+# Append only: MIGRATIONS[n] upgrades a database from user_version n to n+1.
+# Every step runs in one BEGIN IMMEDIATE transaction together with the
+# version bump, so concurrent workers apply each step exactly once.
+
+def _base_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user TEXT,
+            timestamp TEXT,
+            role TEXT,
+            content TEXT,
+            session_id TEXT,
+            tokens INTEGER DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS analytics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT,
+            event_data TEXT,
+            timestamp TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user TEXT,
+            preference_key TEXT,
+            preference_value TEXT,
+            updated_at TEXT
+        )
+    """)
+
+
+def _usage_and_summaries(conn):
+    for statement in USAGE_SCHEMA:
+        conn.execute(statement)
+    conn.execute(SUMMARY_SCHEMA)
+
+
+def _traces(conn):
+    for statement in TRACE_SCHEMA:
+        conn.execute(statement)
+
+
+def _rag_collections(conn):
+    for statement in COLLECTION_SCHEMA:
+        conn.execute(statement)
+
+
+MIGRATIONS = [
+    _base_tables,
+    ensure_schema,
+    _usage_and_summaries,
+    _traces,
+    _rag_collections,
+    soft_delete_schema,
+    retention_schema,
+    collection_embedding_schema
+]
+
+
+# =====================================================
+# CONNECTION-PER-THREAD ACCESS LAYER
+# =====================================================
+
+class Database:
+    """One WAL-mode SQLite connection per thread over a shared database file
+
+    Connections run in autocommit mode with a large prepared-statement
+    cache; multi-statement writes go through `transaction()`. Connections of
+    threads that have exited (finished Streamlit script runs) are closed the
+    next time a new thread connects.
+    """
+
+    def __init__(self, path, migrations=MIGRATIONS):
+        self.path = path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = {}
+        self.migrate(migrations)
+
+    def connect(self):
+        """A new connection with the shared pragmas, owned by the caller
+
+        For readers that need a connection of their own, e.g. to watch
+        PRAGMA data_version, which ignores the connection's own commits.
+        """
+        return apply_pragmas(sqlite3.connect(
+            self.path, timeout=10, isolation_level=None,
+            cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False
+        ))
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.connect()
+            with self.lock:
+                self._close_dead()
+                self.connections[threading.current_thread()] = conn
+            self.local.conn = conn
+        return conn
+
+    def _close_dead(self):
+        for thread in [t for t in self.connections if not t.is_alive()]:
+            self.connections.pop(thread).close()
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def executemany(self, sql, rows):
+        return self.connection().executemany(sql, rows)
+
+    def query(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchone()
+
+    def commit(self):
+        """Kept for callers written against a plain connection (autocommit makes it a no-op)"""
+        self.connection().commit()
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT on this thread's connection (joins an open transaction)"""
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def user_version(self):
+        return self.query_one("PRAGMA user_version")[0]
+
+    def migrate(self, migrations=MIGRATIONS):
+        """Apply pending migrations; returns the resulting schema version"""
+        with self.transaction() as conn:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            for version in range(current, len(migrations)):
+                migrations[version](conn)
+            if current < len(migrations):
+                conn.execute(f"PRAGMA user_version = {len(migrations)}")
+        return self.user_version()
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections.values():
+                conn.close()
+            self.connections.clear()
+        self.local = threading.local()
+
+
+# =====================================================
+# LEGACY DATABASE IMPORT
+# =====================================================
+
+def import_legacy_chats(db, legacy_path):
+    """Fold a pre-unification database (chatbot_advanced's ai_pro_plus.db) into `db` once
+
+    The file is claimed by an atomic rename, so only one worker imports it;
+    it is kept as `<path>.migrated` afterwards. Returns the number of chats
+    imported. Rolling summaries are not carried over because they refer to
+    the old row ids; they are rebuilt on the next long conversation.
+    """
+    claimed = f"{legacy_path}.importing.{os.getpid()}"
+    try:
+        os.rename(legacy_path, claimed)
+    except OSError:
+        return 0
+
+    conn = db.connection()
+    conn.execute("ATTACH DATABASE ? AS legacy", (claimed,))
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM legacy.sqlite_master WHERE type='table'")}
+        with db.transaction():
+            imported = 0
+            if "chats" in tables:
+                imported = conn.execute(
+                    "INSERT INTO chats (timestamp, role, content, session_id, tokens) "
+                    "SELECT timestamp, role, content, session_id, COALESCE(tokens, 0) FROM legacy.chats ORDER BY id"
+                ).rowcount
+            if "usage" in tables:
+                conn.execute(
+                    "INSERT INTO usage (request_id, session_id, model, feature, prompt_tokens, completion_tokens, "
+                    "cached_tokens, total_tokens, estimated, latency_ms, ttft_ms, timestamp) "
+                    "SELECT request_id, session_id, model, feature, prompt_tokens, completion_tokens, "
+                    "cached_tokens, total_tokens, estimated, latency_ms, ttft_ms, timestamp FROM legacy.usage"
+                )
+    except sqlite3.Error:
+        conn.execute("DETACH DATABASE legacy")
+        # put it back so the next start retries
+        os.rename(claimed, legacy_path)
+        raise
+    conn.execute("DETACH DATABASE legacy")
+    os.rename(claimed, f"{legacy_path}.migrated")
+    return imported
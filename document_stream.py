@@ -0,0 +1,59 @@
+import io
+
+
+# =====================================================
+# PAGE-LAZY DOCUMENT READERS
+# =====================================================
+# Read straight from the upload buffer (no temp file) and yield one page
+# at a time so the ingest pipeline can split and index while reading.
+
+def _document(text, metadata):
+    from langchain_core.documents import Document
+    return Document(page_content=text, metadata=metadata)
+
+
+def iter_pdf_pages(stream, source, make_document=_document):
+    """Yield a PDF's pages one at a time from a file-like object"""
+    from pypdf import PdfReader
+
+    stream.seek(0)
+    reader = PdfReader(stream)
+    for number, page in enumerate(reader.pages):
+        text = page.extract_text() or ""
+        if text.strip():
+            yield make_document(text, {"source": source, "page": number})
+
+
+def iter_text_pages(stream, source, page_chars=8000, encoding="utf-8", make_document=_document):
+    """Yield a text file in ~page_chars pieces cut on paragraph breaks
+
+    A page ends at the first blank line past `page_chars` that is not inside
+    a ``` code fence (at any line past twice that), so pages don't split a
+    paragraph, table or code block. `offset` is the page's first character
+    in the file.
+    """
+    stream.seek(0)
+    reader = io.TextIOWrapper(stream, encoding=encoding, errors="replace", newline="")
+    buffer, size, number, offset, in_fence = [], 0, 0, 0, False
+    try:
+        for line in reader:
+            buffer.append(line)
+            size += len(line)
+            if line.lstrip().startswith(("```", "~~~")):
+                in_fence = not in_fence
+            if size >= page_chars and ((not line.strip() and not in_fence) or size >= 2 * page_chars):
+                yield make_document("".join(buffer), {"source": source, "page": number, "offset": offset})
+                buffer, offset, size, number = [], offset + size, 0, number + 1
+        if buffer and "".join(buffer).strip():
+            yield make_document("".join(buffer), {"source": source, "page": number, "offset": offset})
+    finally:
+        # don't let the wrapper close the caller's buffer
+        reader.detach()
+
+
+def iter_upload_pages(uploaded_file, make_document=_document):
+    """Page iterator for a Streamlit upload, chosen by file type"""
+    name = uploaded_file.name
+    if name.lower().endswith(".pdf"):
+        return iter_pdf_pages(uploaded_file, name, make_document=make_document)
+    return iter_text_pages(uploaded_file, name, make_document=make_document)
@@ -0,0 +1,223 @@
+import os
+import platform
+import threading
+from embedding_cache import CachedEmbeddings
+from startup import module_available
+
+# sentence-transformers (and torch / onnxruntime under it) are optional and
+# slow to import, so they are only loaded when a local model is first used
+LOCAL_EMBEDDINGS_AVAILABLE = module_available("sentence_transformers")
+ONNX_AVAILABLE = module_available("onnxruntime")
+
+
+# =====================================================
+# EMBEDDING BACKENDS
+# =====================================================
+# A collection is embedded by exactly one backend for its whole life (its
+# vectors are only comparable with query vectors from the same model), so
+# the backend is recorded per collection in `rag_collections.embedding`.
+# "openrouter" needs OPENROUTER_API_KEY and a network round-trip per query;
+# the local backends run a small sentence-transformer on the CPU, quantized
+# to int8, and work offline.
+
+class EmbeddingBackend:
+    """One selectable embedding model"""
+
+    def __init__(self, name, model, dim, local, label, query_prefix="", onnx_int8=False, max_tokens=256):
+        self.name = name
+        self.model = model
+        self.dim = dim
+        self.local = local
+        self.label = label
+        self.query_prefix = query_prefix
+        self.onnx_int8 = onnx_int8
+        self.max_tokens = max_tokens
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "model": self.model,
+            "dim": self.dim,
+            "local": self.local,
+            "label": self.label
+        }
+
+
+EMBEDDING_BACKENDS = {
+    "openrouter": EmbeddingBackend(
+        "openrouter", "text-embedding-3-small", 1536, False, "OpenRouter · text-embedding-3-small"
+    ),
+    "minilm": EmbeddingBackend(
+        "minilm", "sentence-transformers/all-MiniLM-L6-v2", 384, True, "Local · MiniLM-L6 (int8)",
+        onnx_int8=True
+    ),
+    "bge-small": EmbeddingBackend(
+        "bge-small", "BAAI/bge-small-en-v1.5", 384, True, "Local · bge-small-en (int8)",
+        query_prefix="Represent this sentence for searching relevant passages: ", max_tokens=512
+    )
+}
+
+# collections registered before backends were selectable were embedded by OpenRouter
+DEFAULT_EMBEDDING = "openrouter"
+
+
+def unavailable_reason(name, api_key=None):
+    """Why backend `name` can't run in this process (None when it can)"""
+    if name in available_backends(api_key):
+        return None
+    if EMBEDDING_BACKENDS[name].local:
+        return "sentence-transformers is not installed (pip install sentence-transformers)"
+    return "OPENROUTER_API_KEY is not set"
+
+
+def available_backends(api_key=None):
+    """Names of the backends usable in this process, remote first"""
+    return [
+        name for name, backend in EMBEDDING_BACKENDS.items()
+        if (LOCAL_EMBEDDINGS_AVAILABLE if backend.local else bool(api_key))
+    ]
+
+
+def default_backend(api_key=None, preferred=None):
+    """`preferred` if usable, else OpenRouter with a key, else the first local model (None if nothing works)"""
+    usable = available_backends(api_key)
+    if preferred in usable:
+        return preferred
+    return usable[0] if usable else None
+
+
+# =====================================================
+# LOCAL CPU EMBEDDINGS
+# =====================================================
+
+def length_batches(texts, batch_size=32, max_batch_chars=24000):
+    """Index lists of similar-length texts, longest first
+
+    A batch is padded to its longest text, so sorting by length keeps short
+    chunks out of long chunks' batches. `max_batch_chars` bounds the padded
+    size (count x longest) of one batch, so batches of long texts get fewer
+    members and peak memory stays flat.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    batches, batch = [], []
+    for i in order:
+        if batch and (len(batch) >= batch_size or (len(batch) + 1) * len(texts[batch[0]]) > max_batch_chars):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# int8 ONNX exports shipped with sentence-transformers models, best first;
+# each only runs fast on CPUs with that instruction set
+ONNX_INT8_FILES = (
+    ("avx512_vnni", "onnx/model_qint8_avx512_vnni.onnx"),
+    ("avx512bw", "onnx/model_qint8_avx512.onnx"),
+    ("avx2", "onnx/model_quint8_avx2.onnx"),
+    ("arm64", "onnx/model_qint8_arm64.onnx")
+)
+
+
+def cpu_features():
+    """Instruction set flags of this CPU ("arm64" on ARM); empty when they can't be read"""
+    if platform.machine().lower() in ("aarch64", "arm64"):
+        return {"arm64"}
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def int8_onnx_file(features=None):
+    """The int8 ONNX file that suits this CPU, or None (then torch dynamic quantization is used)"""
+    features = cpu_features() if features is None else features
+    return next((path for flag, path in ONNX_INT8_FILES if flag in features), None)
+
+
+class LocalEmbeddings:
+    """LangChain-style embeddings from a sentence-transformer on the CPU
+
+    The model is loaded on first use: the ONNX Runtime build of the int8
+    model file matching this CPU's instruction set (int8_onnx_file) when
+    onnxruntime is installed and the backend ships those files, otherwise
+    the PyTorch model with its Linear layers dynamically quantized to int8.
+    Vectors are L2-normalized. One encode runs at a time; the model already
+    uses every core given to it by `threads`.
+    """
+
+    def __init__(self, backend, batch_size=32, max_batch_chars=24000, threads=None):
+        self.backend = backend
+        self.model = backend.model
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self.threads = threads
+        self.engine = None
+        self.lock = threading.Lock()
+        self._encoder = None
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+        onnx_file = int8_onnx_file() if ONNX_AVAILABLE and self.backend.onnx_int8 else None
+        if onnx_file:
+            try:
+                encoder = SentenceTransformer(
+                    self.model, device="cpu", backend="onnx",
+                    model_kwargs={"file_name": onnx_file, "provider": "CPUExecutionProvider"}
+                )
+                self.engine = "onnx-int8"
+                return encoder
+            except Exception:
+                pass  # older sentence-transformers or no ONNX export: quantize the torch model instead
+        import torch
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        encoder = SentenceTransformer(self.model, device="cpu")
+        encoder = torch.quantization.quantize_dynamic(encoder, {torch.nn.Linear}, dtype=torch.qint8)
+        self.engine = "torch-int8"
+        return encoder
+
+    def _encode(self, texts):
+        if self._encoder is None:
+            self._encoder = self._load()
+            self._encoder.max_seq_length = self.backend.max_tokens
+        return self._encoder.encode(
+            texts, batch_size=len(texts), normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False
+        )
+
+    def embed_documents(self, texts):
+        vectors = [None] * len(texts)
+        for batch in length_batches(texts, self.batch_size, self.max_batch_chars):
+            with self.lock:
+                encoded = self._encode([texts[i] for i in batch])
+            for i, vector in zip(batch, encoded):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        with self.lock:
+            return self._encode([self.backend.query_prefix + text])[0].tolist()
+
+
+# =====================================================
+# FACTORY
+# =====================================================
+
+def make_embeddings(name, api_key=None, base_url=None, cache=None, on_query=None, threads=None):
+    """Cached embeddings for backend `name`, or None when it can't run here (no key / not installed)"""
+    backend = EMBEDDING_BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"unknown embedding backend {name!r} (expected one of {list(EMBEDDING_BACKENDS)})")
+    if name not in available_backends(api_key):
+        return None
+    if backend.local:
+        embeddings = LocalEmbeddings(backend, threads=threads or os.cpu_count())
+    else:
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(model=backend.model, openai_api_base=base_url, api_key=api_key)
+    return CachedEmbeddings(embeddings, cache, model_name=backend.model, on_query=on_query)
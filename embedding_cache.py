@@ -0,0 +1,168 @@
+import sqlite3
+import hashlib
+import threading
+import time
+from array import array
+from collections import deque
+
+
+# =====================================================
+# EMBEDDING CACHE
+# =====================================================
+
+class EmbeddingCache:
+    """SQLite-backed embedding store keyed by model name and chunk content hash"""
+
+    def __init__(self, path="embedding_cache.db", max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    dim INTEGER,
+                    vector BLOB,
+                    size INTEGER,
+                    last_used REAL
+                )
+            """)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)"
+            )
+            self.conn.commit()
+            self.total_bytes = self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM embeddings"
+            ).fetchone()[0]
+
+    @staticmethod
+    def make_key(model, text):
+        """Content address for a chunk under a given embedding model"""
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """Return {key: vector} for every cached key and mark them recently used"""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        now = time.time()
+        with self.lock:
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                if rows:
+                    hit_keys = [r[0] for r in rows]
+                    self.conn.execute(
+                        f"UPDATE embeddings SET last_used=? WHERE key IN ({','.join('?' * len(hit_keys))})",
+                        [now] + hit_keys
+                    )
+            self.conn.commit()
+        return found
+
+    def put_many(self, model, items):
+        """Store (key, vector) pairs and evict least recently used rows past the size bound"""
+        now = time.time()
+        with self.lock:
+            for key, vector in items:
+                blob = array("f", vector).tobytes()
+                cur = self.conn.execute(
+                    "INSERT OR IGNORE INTO embeddings (key, model, dim, vector, size, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, len(vector), blob, len(blob), now)
+                )
+                if cur.rowcount:
+                    self.total_bytes += len(blob)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_used LIMIT 256"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for key, size in rows:
+                self.conn.execute("DELETE FROM embeddings WHERE key=?", (key,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self):
+        """Entry count and stored bytes"""
+        with self.lock:
+            count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {"entries": count, "bytes": self.total_bytes, "max_bytes": self.max_bytes}
+
+
+class CachedEmbeddings:
+    """Embeddings wrapper that only sends chunks it has never seen to the model
+
+    Query embeddings are not cached but timed: `on_query(ms)` is called after
+    each one, and `take_query_ms()` returns the latest on the calling thread.
+    """
+
+    def __init__(self, embeddings, cache, model_name=None, on_query=None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.on_query = on_query
+        self.hits = 0
+        self.misses = 0
+        self.query_ms = deque(maxlen=500)
+        self._last = threading.local()
+
+    def embed_documents(self, texts):
+        keys = [self.cache.make_key(self.model_name, t) for t in texts]
+        found = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = list(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model_name, fresh)
+            found.update(fresh)
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        return [list(found[k]) for k in keys]
+
+    def embed_query(self, text):
+        started = time.perf_counter()
+        vector = self.embeddings.embed_query(text)
+        ms = (time.perf_counter() - started) * 1000
+        self.query_ms.append(ms)
+        self._last.ms = ms
+        if self.on_query is not None:
+            self.on_query(ms)
+        return vector
+
+    def take_query_ms(self):
+        """Latency of this thread's last query embedding since the previous call (None if there was none)"""
+        ms, self._last.ms = getattr(self._last, "ms", None), None
+        return ms
+
+    def query_stats(self):
+        """Recent query embedding latency: count, p50 and p95 in ms"""
+        durations = sorted(self.query_ms)
+        if not durations:
+            return {"count": 0, "p50": None, "p95": None}
+        return {
+            "count": len(durations),
+            "p50": round(durations[len(durations) // 2], 1),
+            "p95": round(durations[min(len(durations) - 1, int(0.95 * len(durations)))], 1)
+        }
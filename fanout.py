@@ -0,0 +1,150 @@
+import time
+import queue
+import asyncio
+import threading
+import functools
+
+
+# =====================================================
+# BACKGROUND EVENT LOOP
+# =====================================================
+# Streamlit runs each page on a script thread; outbound calls are scheduled
+# on one shared asyncio loop in a daemon thread so a page action can fan out
+# several calls at once without blocking on each in turn.
+
+PROVIDER_LIMITS = {"llm": 8, "search": 4, "image": 6, "default": 8}
+
+_loop = None
+_loop_lock = threading.Lock()
+_semaphores = {}
+_async_client = None
+
+
+def get_loop():
+    """Start (once) and return the shared background event loop"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="fanout-loop", daemon=True).start()
+        return _loop
+
+
+def run_sync(coro, timeout=None):
+    """Run a coroutine on the shared loop and wait for its result"""
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        future.cancel()
+        raise
+
+
+def get_async_client():
+    """Shared httpx.AsyncClient (must be used from the shared loop)"""
+    global _async_client
+    if _async_client is None:
+        import httpx
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=16, keepalive_expiry=120),
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            follow_redirects=True
+        )
+    return _async_client
+
+
+def _semaphore(provider):
+    if provider not in _semaphores:
+        limit = PROVIDER_LIMITS.get(provider, PROVIDER_LIMITS["default"])
+        _semaphores[provider] = asyncio.Semaphore(limit)
+    return _semaphores[provider]
+
+
+# =====================================================
+# CALLS
+# =====================================================
+
+class Call:
+    """One unit of outbound work: an async function or a blocking callable"""
+
+    def __init__(self, name, fn, *args, provider="default", timeout=None, **kwargs):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.provider = provider
+        self.timeout = timeout
+
+    async def run(self):
+        async with _semaphore(self.provider):
+            if asyncio.iscoroutinefunction(self.fn):
+                work = self.fn(*self.args, **self.kwargs)
+            else:
+                loop = asyncio.get_running_loop()
+                work = loop.run_in_executor(None, functools.partial(self.fn, *self.args, **self.kwargs))
+            return await asyncio.wait_for(work, self.timeout) if self.timeout else await work
+
+
+async def fetch_bytes(url, params=None):
+    """GET a URL through the shared async client (wrap in a Call to rate-limit it)"""
+    response = await get_async_client().get(url, params=params)
+    response.raise_for_status()
+    return response.content
+
+
+_DONE = object()
+
+
+async def _fan_out(calls, deadline, results):
+    async def tracked(call):
+        started = time.perf_counter()
+        try:
+            value = await call.run()
+            results.put((call.name, value, None, time.perf_counter() - started))
+        except asyncio.CancelledError:
+            results.put((call.name, None, TimeoutError("deadline exceeded"), time.perf_counter() - started))
+            raise
+        except Exception as e:
+            results.put((call.name, None, e, time.perf_counter() - started))
+
+    tasks = [asyncio.ensure_future(tracked(call)) for call in calls]
+    try:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        await asyncio.wait(tasks, timeout=remaining)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        results.put(_DONE)
+
+
+def iter_fan_out(calls, timeout=None):
+    """Run calls concurrently and yield (name, result, error, seconds) as each finishes
+
+    Calls still running when `timeout` expires are cancelled and reported
+    with a TimeoutError. Closing the generator early cancels the rest.
+    Blocking callables run in the loop's thread pool and cannot be
+    interrupted; their late results are simply discarded.
+    """
+    calls = list(calls)
+    results = queue.Queue()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    future = asyncio.run_coroutine_threadsafe(_fan_out(calls, deadline, results), get_loop())
+    reported = set()
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            reported.add(item[0])
+            yield item
+        for call in calls:
+            if call.name not in reported:
+                yield call.name, None, TimeoutError("deadline exceeded"), 0.0
+    finally:
+        future.cancel()
+
+
+def fan_out(calls, timeout=None):
+    """Run calls concurrently and return {name: result or exception}"""
+    return {name: error if error else value for name, value, error, _ in iter_fan_out(calls, timeout)}
@@ -0,0 +1,156 @@
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from urllib.parse import quote
+from fanout import Call, iter_fan_out, fetch_bytes, run_sync
+
+
+# =====================================================
+# IMAGE URLS
+# =====================================================
+
+POLLINATIONS_URL = "https://image.pollinations.ai/prompt"
+
+
+def image_url(prompt, width=1024, height=1024, seed=None, base_url=POLLINATIONS_URL):
+    """Pollinations-style image URL for a prompt/size (optional seed for variants)"""
+    url = f"{base_url}/{quote(prompt, safe='')}?width={width}&height={height}&nologo=true"
+    return f"{url}&seed={seed}" if seed is not None else url
+
+
+# =====================================================
+# ON-DISK IMAGE CACHE
+# =====================================================
+
+class ImageCache:
+    """Size-bounded cache of raw image bytes keyed by (prompt, width, height, seed)
+
+    Images are stored as files under `directory` (written to a temp file and
+    renamed into place, so concurrent workers never see a partial image);
+    a small SQLite index tracks sizes and last use for LRU eviction.
+    """
+
+    def __init__(self, directory="image_cache", max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False, timeout=10)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS images (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER,
+                    last_used REAL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_images_last_used ON images (last_used)")
+            self.conn.commit()
+            self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(prompt, width, height, seed=None):
+        return hashlib.sha256(f"{prompt}\x00{width}\x00{height}\x00{seed}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """Cached bytes or None"""
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.lock:
+            self.conn.execute("UPDATE images SET last_used=? WHERE key=?", (time.time(), key))
+            self.conn.commit()
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM images WHERE key=?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO images (key, size, last_used) VALUES (?, ?, ?)",
+                (key, len(data), time.time())
+            )
+            self.total_bytes += len(data) - (old[0] if old else 0)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute("SELECT key, size FROM images ORDER BY last_used LIMIT 64").fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for key, size in rows:
+                self.conn.execute("DELETE FROM images WHERE key=?", (key,))
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self):
+        with self.lock:
+            count = self.conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "entries": count,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+# =====================================================
+# FETCHING (shared async connection pool)
+# =====================================================
+
+async def fetch_image(cache, prompt, width=1024, height=1024, seed=None, base_url=POLLINATIONS_URL):
+    """(bytes, cached) for one image; misses go through the pooled async client
+
+    The cache's SQLite and file I/O runs in the default executor so it never
+    blocks the shared event loop; only the HTTP fetch runs on the loop.
+    """
+    loop = asyncio.get_running_loop()
+    key = cache.make_key(prompt, width, height, seed)
+    data = await loop.run_in_executor(None, cache.get, key)
+    if data is not None:
+        return data, True
+    data = await fetch_bytes(image_url(prompt, width, height, seed, base_url))
+    await loop.run_in_executor(None, cache.put, key, data)
+    return data, False
+
+
+def generate_image_bytes(cache, prompt, width=1024, height=1024, seed=None, base_url=POLLINATIONS_URL, timeout=60):
+    """Blocking wrapper around fetch_image for a single image"""
+    return run_sync(fetch_image(cache, prompt, width, height, seed, base_url), timeout)
+
+
+def iter_variants(cache, prompt, count, width=1024, height=1024, base_url=POLLINATIONS_URL, timeout=60):
+    """Fetch `count` seeded variants concurrently; yields (seed, (bytes, cached), error, seconds)"""
+    calls = [
+        Call(seed, fetch_image, cache, prompt, width, height, seed, base_url, provider="image")
+        for seed in range(count)
+    ]
+    return iter_fan_out(calls, timeout=timeout)
@@ -0,0 +1,239 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from vector_store import chunk_id, write_chunks, write_lock
+
+
+# =====================================================
+# THROTTLING
+# =====================================================
+
+def is_rate_limited(error):
+    """True for provider throttling errors (HTTP 429 / rate limit)"""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429:
+        return True
+    text = str(error).lower()
+    return "429" in text or "rate limit" in text or "too many requests" in text
+
+
+class AdaptiveBackoff:
+    """Delay shared by all in-flight batches: doubles on 429, decays on success"""
+
+    def __init__(self, base_delay=0.5, max_delay=30.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            delay = self.delay
+        if delay:
+            time.sleep(delay * random.uniform(0.8, 1.2))
+
+    def on_throttle(self):
+        with self.lock:
+            self.throttled += 1
+            self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+
+    def on_success(self):
+        with self.lock:
+            self.delay = self.delay / 2 if self.delay > self.base_delay / 4 else 0.0
+
+
+def embed_with_backoff(embeddings, texts, backoff, max_retries=6):
+    """Embed one batch, retrying only on throttling errors"""
+    attempt = 0
+    while True:
+        backoff.wait()
+        try:
+            vectors = embeddings.embed_documents(texts)
+            backoff.on_success()
+            return vectors
+        except Exception as e:
+            if not is_rate_limited(e) or attempt >= max_retries:
+                raise
+            attempt += 1
+            backoff.on_throttle()
+
+
+# =====================================================
+# STREAMING INGEST
+# =====================================================
+
+class IngestReport:
+    """Outcome of one ingest run"""
+
+    def __init__(self):
+        self.chunks = 0
+        self.embedded = 0
+        self.skipped = 0
+        self.deleted = 0
+        self.failed = 0
+        self.errors = []
+        self.throttled = 0
+        self.seconds = 0.0
+        self.peak_buffered_bytes = 0
+        self.timings = {"load": 0.0, "split": 0.0, "embed": 0.0, "write": 0.0}
+
+    @property
+    def complete(self):
+        return self.failed == 0
+
+    def as_dict(self):
+        return {
+            "chunks": self.chunks,
+            "embedded": self.embedded,
+            "skipped": self.skipped,
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "seconds": round(self.seconds, 3),
+            "chunks_per_sec": round(self.embedded / self.seconds, 1) if self.seconds else 0.0,
+            "peak_buffered_bytes": self.peak_buffered_bytes,
+            "timings": {k: round(v, 3) for k, v in self.timings.items()}
+        }
+
+
+def _timed_embed(embeddings, texts, backoff):
+    started = time.perf_counter()
+    vectors = embed_with_backoff(embeddings, texts, backoff)
+    return vectors, time.perf_counter() - started
+
+
+def ingest_document(store, source, documents, splitter, embeddings,
+                    batch_size=64, max_in_flight=4, on_progress=None, backoff=None,
+                    memory_budget_bytes=64 * 1024 * 1024, lexical=None, vector_dim=None):
+    """Stream loader -> splitter -> embedder -> store for one source document
+
+    `documents` may be a lazy iterator (e.g. `iter_pdf_pages()`); pages are
+    split as they arrive and chunks are embedded in fixed-size batches with at
+    most `max_in_flight` batches outstanding. Chunk text and vectors held in
+    the current and in-flight batches are kept under `memory_budget_bytes`:
+    batches are cut early and the loader is paused until space frees up.
+    A vector's size comes from `vector_dim` when the caller knows the model's
+    dimension; otherwise only one batch is in flight until the first batch
+    returns and its vectors can be measured.
+    Each finished batch is written to the store immediately, so a failed run
+    can simply be repeated: chunks that already landed are skipped and only
+    the missing ones are embedded again. Stale chunks are only deleted once a
+    run completes without failures. When a `lexical` index is given it is
+    kept in sync with the collection. With `splitter=None`, `documents` are
+    taken as ready-made chunks (e.g. from chunking.iter_split_uploads).
+    """
+    report = IngestReport()
+    timings = report.timings
+    backoff = backoff or AdaptiveBackoff()
+    started = time.perf_counter()
+
+    if hasattr(splitter, "for_document"):
+        # structure-aware splitters keep state (heading path) across this document's pages
+        splitter = splitter.for_document()
+    existing = set(store.get(where={"source": source}, include=[])["ids"])
+    seen = set()
+    pending = {}
+    batch = []
+    batch_bytes = 0
+    buffered = 0
+    # python floats in a list cost ~32 bytes each
+    vector_bytes = vector_dim * 32 if vector_dim else 0
+
+    def finish(done):
+        nonlocal buffered, vector_bytes
+        for future in done:
+            ids, texts, metadatas, cost = pending.pop(future)
+            try:
+                vectors, seconds = future.result()
+                timings["embed"] += seconds
+                if vectors and not vector_bytes:
+                    vector_bytes = len(vectors[0]) * 32
+                write_started = time.perf_counter()
+                with write_lock(store):
+                    write_chunks(store, ids, texts, metadatas, vectors)
+                    if lexical:
+                        lexical.add(ids, texts, metadatas)
+                timings["write"] += time.perf_counter() - write_started
+                report.embedded += len(ids)
+            except Exception as e:
+                report.failed += len(ids)
+                report.errors.append(str(e))
+            buffered -= cost
+        if on_progress:
+            on_progress(report)
+
+    def drain_until(condition):
+        while pending and not condition():
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            finish(done)
+
+    def submit(pool, items, cost):
+        # until a vector size is known the budget only sees text, so admit one batch at a time
+        drain_until(lambda: len(pending) < (max_in_flight if vector_bytes else 1))
+        ids = [i[0] for i in items]
+        texts = [i[1] for i in items]
+        metadatas = [i[2] for i in items]
+        future = pool.submit(_timed_embed, embeddings, texts, backoff)
+        pending[future] = (ids, texts, metadatas, cost)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        pages = iter(documents)
+        while True:
+            load_started = time.perf_counter()
+            document = next(pages, None)
+            timings["load"] += time.perf_counter() - load_started
+            if document is None:
+                break
+
+            split_started = time.perf_counter()
+            chunks = splitter.split_documents([document]) if splitter else [document]
+            timings["split"] += time.perf_counter() - split_started
+            del document
+
+            for chunk in chunks:
+                report.chunks += 1
+                cid = chunk_id(source, chunk.page_content)
+                if cid in seen:
+                    # repeated boilerplate within the document: counted so progress reaches 100%
+                    report.skipped += 1
+                    continue
+                seen.add(cid)
+                if cid in existing:
+                    report.skipped += 1
+                    continue
+
+                cost = len(chunk.page_content) + vector_bytes
+                if batch and buffered + cost > memory_budget_bytes:
+                    submit(pool, batch, batch_bytes)
+                    batch, batch_bytes = [], 0
+                drain_until(lambda: buffered + cost <= memory_budget_bytes)
+                batch.append((cid, chunk.page_content, {**chunk.metadata, "source": source, "content_hash": cid}))
+                batch_bytes += cost
+                buffered += cost
+                report.peak_buffered_bytes = max(report.peak_buffered_bytes, buffered)
+
+                if len(batch) >= batch_size or batch_bytes * 2 >= memory_budget_bytes:
+                    submit(pool, batch, batch_bytes)
+                    batch, batch_bytes = [], 0
+            del chunks
+
+        if batch:
+            submit(pool, batch, batch_bytes)
+        drain_until(lambda: False)
+
+    if report.complete:
+        stale = list(existing - seen)
+        if stale:
+            with write_lock(store):
+                store.delete(ids=stale)
+                if lexical:
+                    lexical.delete(stale)
+        report.deleted = len(stale)
+
+    report.throttled = backoff.throttled
+    report.seconds = time.perf_counter() - started
+    if on_progress:
+        on_progress(report)
+    return report
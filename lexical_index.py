@@ -0,0 +1,245 @@
+import re
+import json
+import math
+import sqlite3
+import threading
+from collections import Counter
+
+
+# =====================================================
+# BM25 INVERTED INDEX
+# =====================================================
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./:#][a-z0-9]+)*")
+IDENTIFIER_RE = re.compile(r"^(?=.*\d)[a-z0-9]+(?:[-_./:#][a-z0-9]+)*$")
+
+
+def tokenize(text):
+    """Lowercased word tokens; compound identifiers (ERR-4012) also emit their parts"""
+    tokens = []
+    for match in TOKEN_RE.findall(text.lower()):
+        tokens.append(match)
+        if not match.isalnum():
+            tokens.extend(p for p in re.split(r"[-_./:#]", match) if p)
+    return tokens
+
+
+def looks_like_identifier(query, max_terms=4):
+    """Short queries made of part numbers / error codes skip the embedding call"""
+    stripped = query.strip()
+    if stripped.startswith('"') and stripped.endswith('"') and len(stripped) > 2:
+        return True
+    terms = TOKEN_RE.findall(stripped.lower())
+    if not terms or len(terms) > max_terms:
+        return False
+    return any(IDENTIFIER_RE.match(t) and (not t.isdigit() or len(t) >= 3) for t in terms)
+
+
+# =====================================================
+# METADATA FILTERS
+# =====================================================
+# `where` is a flat {key: value} / {key: {"$in": [values]}} dict, applied
+# before ranking on both sides: as SQL predicates on the lexical candidates
+# and as a Chroma `where` (Chroma filters on metadata before the HNSW scan).
+
+def _filter_terms(where):
+    for key, value in (where or {}).items():
+        if isinstance(value, dict):
+            values = value.get("$in")
+            if values is None or len(value) != 1:
+                raise ValueError(f"unsupported filter for {key!r}: {value!r}")
+            yield key, list(values)
+        else:
+            yield key, value
+
+
+def filter_sql(where, alias="c"):
+    """(sql, params) appending metadata predicates to a query over `chunks`"""
+    clauses, params = [], []
+    for key, value in _filter_terms(where):
+        column = f"{alias}.source" if key == "source" else f"json_extract({alias}.metadata, ?)"
+        column_params = [] if key == "source" else [f'$."{key}"']
+        if isinstance(value, list):
+            if not value:
+                clauses.append("0")
+                continue
+            clauses.append(f"{column} IN ({','.join('?' * len(value))})")
+            params += column_params + value
+        else:
+            clauses.append(f"{column} = ?")
+            params += column_params + [value]
+    return "".join(f" AND {c}" for c in clauses), params
+
+
+def chroma_filter(where):
+    """The same filter in Chroma's `where` syntax (None when empty)"""
+    terms = [{key: {"$in": value} if isinstance(value, list) else value} for key, value in _filter_terms(where)]
+    if not terms:
+        return None
+    return terms[0] if len(terms) == 1 else {"$and": terms}
+
+
+class LexicalIndex:
+    """Persistent BM25 index kept alongside a Chroma collection
+
+    `cache_mb` caps SQLite's page cache for this index, so each shard's
+    index stays inside its own memory budget.
+    """
+
+    def __init__(self, path, k1=1.5, b=0.75, cache_mb=16):
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(f"PRAGMA cache_size=-{max(1, int(cache_mb * 1024))}")
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id TEXT PRIMARY KEY,
+                    source TEXT,
+                    length INTEGER,
+                    text TEXT,
+                    metadata TEXT
+                );
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT,
+                    chunk_id TEXT,
+                    tf INTEGER,
+                    PRIMARY KEY (term, chunk_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings (chunk_id);
+                CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks (source);
+            """)
+            self.conn.commit()
+            self.doc_count, total = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks"
+            ).fetchone()
+            self.total_length = total
+
+    def add(self, ids, texts, metadatas):
+        """Index chunks (already-indexed ids are replaced)"""
+        with self.lock:
+            self._delete(ids)
+            for cid, text, metadata in zip(ids, texts, metadatas):
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                self.conn.execute(
+                    "INSERT INTO chunks (id, source, length, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (cid, metadata.get("source"), length, text, json.dumps(metadata))
+                )
+                self.conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, cid, tf) for term, tf in counts.items()]
+                )
+                self.doc_count += 1
+                self.total_length += length
+            self.conn.commit()
+
+    def delete(self, ids):
+        with self.lock:
+            self._delete(ids)
+            self.conn.commit()
+
+    def delete_source(self, source):
+        with self.lock:
+            ids = [r[0] for r in self.conn.execute("SELECT id FROM chunks WHERE source=?", (source,))]
+            self._delete(ids)
+            self.conn.commit()
+        return len(ids)
+
+    def _delete(self, ids):
+        for i in range(0, len(ids), 500):
+            batch = list(ids[i:i + 500])
+            marks = ",".join("?" * len(batch))
+            count, length = self.conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks WHERE id IN ({marks})", batch
+            ).fetchone()
+            if not count:
+                continue
+            self.conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({marks})", batch)
+            self.conn.execute(f"DELETE FROM chunks WHERE id IN ({marks})", batch)
+            self.doc_count -= count
+            self.total_length -= length
+
+    def search(self, query, k=20, where=None):
+        """Top-k (chunk_id, bm25 score) for a query, over chunks matching `where`"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.doc_count:
+            return []
+        predicates, params = filter_sql(where)
+        with self.lock:
+            marks = ",".join("?" * len(terms))
+            rows = self.conn.execute(
+                f"SELECT p.term, p.chunk_id, p.tf, c.length FROM postings p "
+                f"JOIN chunks c ON c.id = p.chunk_id WHERE p.term IN ({marks})" + predicates,
+                terms + params
+            ).fetchall()
+            doc_count, avg_length = self.doc_count, self.total_length / self.doc_count
+
+        postings = {}
+        for term, cid, tf, length in rows:
+            postings.setdefault(term, []).append((cid, tf, length))
+
+        scores = Counter()
+        for term, hits in postings.items():
+            idf = math.log(1 + (doc_count - len(hits) + 0.5) / (len(hits) + 0.5))
+            for cid, tf, length in hits:
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[cid] += idf * tf * (self.k1 + 1) / norm
+        return scores.most_common(k)
+
+    def fetch(self, ids):
+        """{chunk_id: (text, metadata)} for the given ids"""
+        if not ids:
+            return {}
+        with self.lock:
+            marks = ",".join("?" * len(ids))
+            rows = self.conn.execute(
+                f"SELECT id, text, metadata FROM chunks WHERE id IN ({marks})", list(ids)
+            ).fetchall()
+        return {cid: (text, json.loads(metadata)) for cid, text, metadata in rows}
+
+
+# =====================================================
+# HYBRID RETRIEVAL
+# =====================================================
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse several ranked id lists: score = sum(1 / (k + rank))"""
+    fused = Counter()
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking):
+            fused[cid] += 1.0 / (k + rank + 1)
+    return [cid for cid, _ in fused.most_common()]
+
+
+def hybrid_search(store, lexical, query, k=4, fetch_k=20, where=None, make_document=None):
+    """BM25 + dense retrieval fused with RRF; identifier queries stay lexical-only
+
+    Returns (documents, mode) where mode is "lexical" when no dense results
+    were fused in (identifier query, or no vector store) and "hybrid" otherwise.
+    """
+    if make_document is None:
+        from document_stream import _document as make_document
+
+    lexical_hits = [cid for cid, _ in lexical.search(query, fetch_k, where=where)]
+
+    if store is None or (lexical_hits and looks_like_identifier(query)):
+        ranked, mode, dense_docs = lexical_hits[:k], "lexical", {}
+    else:
+        dense = store.similarity_search(query, k=fetch_k, filter=chroma_filter(where))
+        dense_docs = {d.metadata.get("content_hash") or d.page_content: d for d in dense}
+        ranked = reciprocal_rank_fusion([list(dense_docs), lexical_hits])[:k]
+        mode = "hybrid"
+
+    stored = lexical.fetch([cid for cid in ranked if cid not in dense_docs])
+    documents = []
+    for cid in ranked:
+        if cid in dense_docs:
+            documents.append(dense_docs[cid])
+        elif cid in stored:
+            text, metadata = stored[cid]
+            documents.append(make_document(text, metadata))
+    return documents, mode
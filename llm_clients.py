@@ -0,0 +1,69 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+# =====================================================
+# POOLED LLM CLIENTS
+# =====================================================
+# One ChatOpenAI per (model, base_url, API key), all sharing a single keep-alive
+# HTTP connection pool. Temperature (and model) are bound per request, so
+# moving a slider never creates or pins another client. The key is only
+# held as a hash, and a changed key gets a fresh client instead of the old one.
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+MAX_CLIENTS = 8
+
+_clients = OrderedDict()
+_lock = threading.Lock()
+_http_client = None
+
+
+def shared_http_client():
+    """Process-wide httpx client; keeps TLS connections warm between requests"""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            import httpx
+            _http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=16, keepalive_expiry=120),
+                timeout=httpx.Timeout(30.0, connect=10.0)
+            )
+        return _http_client
+
+
+def get_chat_client(model, api_key, base_url=OPENROUTER_BASE_URL):
+    """Pooled ChatOpenAI for (model, base_url, api_key), least recently used evicted past MAX_CLIENTS"""
+    key = (model, base_url, hashlib.sha256((api_key or "").encode("utf-8")).hexdigest())
+    with _lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+            return client
+
+    from langchain_openai import ChatOpenAI
+    client = ChatOpenAI(
+        model=model,
+        base_url=base_url,
+        api_key=api_key,
+        http_client=shared_http_client(),
+        max_retries=3,
+        timeout=30,
+        stream_usage=True
+    )
+    with _lock:
+        client = _clients.setdefault(key, client)
+        _clients.move_to_end(key)
+        while len(_clients) > MAX_CLIENTS:
+            _clients.popitem(last=False)
+    return client
+
+
+def chat_model(model, temperature, api_key, base_url=OPENROUTER_BASE_URL):
+    """Pooled client with model/temperature passed on every request"""
+    return get_chat_client(model, api_key, base_url).bind(model=model, temperature=float(temperature))
+
+
+def pool_stats():
+    with _lock:
+        return {"clients": len(_clients), "keys": [(model, base_url) for model, base_url, _ in _clients]}
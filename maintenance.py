@@ -0,0 +1,458 @@
+import os
+import json
+import time
+import uuid
+import threading
+from datetime import datetime, timedelta
+from data_export import EXPORT_TABLES, LIVE_ONLY, NDJSON_COMPRESSION, NDJSON_SUFFIXES
+
+# database.apply_pragmas' setting, restored after a run; during one, checkpoints
+# happen between batches at most every CHECKPOINT_EVERY seconds
+WAL_AUTOCHECKPOINT = 1000
+CHECKPOINT_EVERY = 1.0
+
+
+# =====================================================
+# RETENTION POLICIES
+# =====================================================
+# Each table keeps `keep_days` of rows (NULL keeps everything). Older rows
+# are first appended to a compressed monthly NDJSON archive (same "_table"
+# lines as data_export, so chats/analytics/usage archives import back with
+# import_data), then deleted in small keyset batches. Chat rollups are put
+# back after the delete: they count history, not rows still on disk.
+
+RETENTION_TABLES = {
+    # table: (time column, archived columns)
+    "chats": ("timestamp", tuple(name for name, _ in EXPORT_TABLES["chats"])),
+    "analytics": ("timestamp", tuple(name for name, _ in EXPORT_TABLES["analytics"])),
+    "usage": ("timestamp", tuple(name for name, _ in EXPORT_TABLES["usage"])),
+    "traces": ("started_at", ("span_id", "trace_id", "parent_id", "name", "session_id", "started_at",
+                              "duration_ms", "status", "attributes")),
+    "user_preferences": ("updated_at", ("id", "user", "preference_key", "preference_value", "updated_at"))
+}
+
+# (keep_days, archive) seeded on first migration; edited from the admin pages
+DEFAULT_RETENTION = {
+    "chats": (365, True),
+    "analytics": (180, True),
+    "usage": (365, True),
+    "traces": (30, False),
+    "user_preferences": (None, True)
+}
+
+MAINTENANCE_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS retention_policies (
+        table_name TEXT PRIMARY KEY,
+        keep_days INTEGER,
+        archive INTEGER NOT NULL DEFAULT 1,
+        updated_at TEXT
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS retention_archives (
+        path TEXT PRIMARY KEY,
+        table_name TEXT,
+        month TEXT,
+        rows INTEGER DEFAULT 0,
+        bytes INTEGER DEFAULT 0,
+        updated_at TEXT
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS maintenance_state (
+        job TEXT PRIMARY KEY,
+        owner TEXT,
+        lease_until REAL DEFAULT 0,
+        last_finished TEXT,
+        last_result TEXT
+    ) WITHOUT ROWID"""
+)
+
+# deleting live chats fires the rollup decrement trigger; re-add what was removed
+CHAT_ROLLUP_RESTORE = (
+    "SELECT substr(timestamp, 1, 10), role, COUNT(*), COALESCE(SUM(tokens), 0) FROM chats WHERE {where} "
+    "AND role IS NOT NULL GROUP BY 1, 2",
+    "INSERT INTO rollup_chats (day, role, messages, tokens) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(day, role) DO UPDATE SET messages = messages + excluded.messages, "
+    "tokens = tokens + excluded.tokens"
+)
+
+
+def retention_schema(conn):
+    """Retention policy, archive and scheduler tables (database.MIGRATIONS step)"""
+    for statement in MAINTENANCE_SCHEMA:
+        conn.execute(statement)
+    conn.executemany(
+        "INSERT OR IGNORE INTO retention_policies (table_name, keep_days, archive, updated_at) VALUES (?, ?, ?, ?)",
+        [(table, days, int(archive), datetime.now().isoformat())
+         for table, (days, archive) in DEFAULT_RETENTION.items()]
+    )
+
+
+# =====================================================
+# MONTHLY ARCHIVES
+# =====================================================
+
+class MonthlyArchive:
+    """Append-only `<directory>/<table>/<table>-<YYYY-MM>.ndjson.<ext>` files
+
+    Every append is a new compressed member (gzip, bz2 and xz readers all
+    read concatenated members as one stream). The committed size of each
+    file is recorded in `retention_archives` in the same transaction that
+    deletes the rows, so bytes appended by a run that died before its
+    delete committed are truncated away on the next append instead of
+    being archived a second time.
+    """
+
+    def __init__(self, db, directory="archive", compression="gzip"):
+        if compression not in NDJSON_COMPRESSION or compression is None:
+            raise ValueError(f"archives are compressed; expected one of {[c for c in NDJSON_COMPRESSION if c]}")
+        self.db = db
+        self.directory = directory
+        self.compression = compression
+        self.suffix = {v: k for k, v in NDJSON_SUFFIXES.items()}[compression]
+
+    def path(self, table, month):
+        return os.path.join(self.directory, table, f"{table}-{month}.ndjson{self.suffix}")
+
+    def _committed_bytes(self, path):
+        row = self.db.query_one("SELECT bytes FROM retention_archives WHERE path=?", (path,))
+        return row[0] if row else 0
+
+    def append(self, table, columns, rows_by_month):
+        """Append rows (tuples in `columns` order) per month; returns [(path, month, rows, new size)]"""
+        written = []
+        for month, rows in rows_by_month.items():
+            path = self.path(table, month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "ab") as raw:
+                committed = self._committed_bytes(path)
+                if raw.tell() > committed:
+                    raw.truncate(committed)
+                    raw.seek(committed)
+                with NDJSON_COMPRESSION[self.compression](raw, "wt", encoding="utf-8") as out:
+                    out.writelines(
+                        json.dumps({"_table": table, **dict(zip(columns, row))}, ensure_ascii=False) + "\n"
+                        for row in rows
+                    )
+                raw.flush()
+                os.fsync(raw.fileno())
+                written.append((path, month, len(rows), raw.tell()))
+        return written
+
+    @staticmethod
+    def commit(conn, table, written):
+        """Record appended sizes; call inside the transaction that deletes the archived rows"""
+        now = datetime.now().isoformat()
+        conn.executemany(
+            "INSERT INTO retention_archives (path, table_name, month, rows, bytes, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+            "rows = rows + excluded.rows, bytes = excluded.bytes, updated_at = excluded.updated_at",
+            [(path, table, month, rows, size, now) for path, month, rows, size in written]
+        )
+
+    def files(self):
+        return self.db.query(
+            "SELECT table_name, month, rows, bytes, path FROM retention_archives ORDER BY table_name, month"
+        )
+
+
+# =====================================================
+# MAINTENANCE JOB
+# =====================================================
+
+class LeaseLost(RuntimeError):
+    """Another worker took over the maintenance lease mid-run"""
+
+
+class Maintenance:
+    """Retention, incremental vacuum and statistics refresh in short transactions
+
+    Every write transaction (one delete batch, one vacuum step) is sized to
+    stay under `lock_budget_ms`: batches halve when one runs long and grow
+    again while they stay well under it, with a `pause` between them so
+    chat and analytics writers get the lock. Candidate rows are read
+    outside the write lock (WAL readers don't block writers).
+
+    A lease row in `maintenance_state` makes sure only one worker process
+    runs the job at a time. It is renewed between batches once a third of
+    `lease_seconds` has passed, and a run that can't renew it stops (LeaseLost)
+    before it archives anything more. `start()` runs it every `interval_hours`
+    (only during `run_hour`, if given) on a daemon thread.
+    """
+
+    JOB = "retention"
+
+    def __init__(self, db, archive_dir="archive", compression="gzip", batch_size=200, lock_budget_ms=5.0,
+                 pause=0.005, vacuum_pages=256, analysis_limit=400, interval_hours=24, run_hour=None,
+                 check_interval=300.0, lease_seconds=900):
+        self.db = db
+        self.archive = MonthlyArchive(db, archive_dir, compression)
+        self.batch_size = batch_size
+        self.lock_budget_ms = lock_budget_ms
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self.analysis_limit = analysis_limit
+        self.interval_hours = interval_hours
+        self.run_hour = run_hour
+        self.check_interval = check_interval
+        self.lease_seconds = lease_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.running = False
+        self.manual_checkpoints = False
+        self.checkpointed_at = 0.0
+        self.renewed_at = 0.0
+
+    # ---------- policies ----------
+
+    def policies(self):
+        """{table: (keep_days, archive)} for tables that exist in this database"""
+        present = {r[0] for r in self.db.query("SELECT name FROM sqlite_master WHERE type='table'")}
+        return {
+            table: (days, bool(archive))
+            for table, days, archive in self.db.query(
+                "SELECT table_name, keep_days, archive FROM retention_policies ORDER BY table_name"
+            )
+            if table in RETENTION_TABLES and table in present
+        }
+
+    def set_policy(self, table, keep_days, archive=True):
+        if table not in RETENTION_TABLES:
+            raise ValueError(f"no retention for {table!r} (expected one of {list(RETENTION_TABLES)})")
+        self.db.execute(
+            "INSERT INTO retention_policies (table_name, keep_days, archive, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(table_name) DO UPDATE SET keep_days = excluded.keep_days, "
+            "archive = excluded.archive, updated_at = excluded.updated_at",
+            (table, int(keep_days) if keep_days else None, int(archive), datetime.now().isoformat())
+        )
+
+    # ---------- lease / schedule ----------
+
+    def _acquire(self):
+        now = time.time()
+        with self.db.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO maintenance_state (job) VALUES (?)", (self.JOB,))
+            taken = conn.execute(
+                "UPDATE maintenance_state SET owner=?, lease_until=? WHERE job=? AND (lease_until < ? OR owner=?)",
+                (self.owner, now + self.lease_seconds, self.JOB, now, self.owner)
+            ).rowcount
+        self.renewed_at = time.monotonic()
+        return taken > 0
+
+    def _renew(self):
+        """Extend the lease unless another worker has taken it over; raises LeaseLost then"""
+        renewed = self.db.execute(
+            "UPDATE maintenance_state SET lease_until=? WHERE job=? AND owner=?",
+            (time.time() + self.lease_seconds, self.JOB, self.owner)
+        ).rowcount
+        if not renewed:
+            raise LeaseLost(f"maintenance lease lost by {self.owner}")
+        self.renewed_at = time.monotonic()
+
+    def _release(self, result=None):
+        """Give up the lease; with a result, the run also counts as finished"""
+        if result is None:
+            self.db.execute("UPDATE maintenance_state SET lease_until=0 WHERE job=? AND owner=?", (self.JOB, self.owner))
+            return
+        self.db.execute(
+            "UPDATE maintenance_state SET lease_until=0, last_finished=?, last_result=? WHERE job=? AND owner=?",
+            (datetime.now().isoformat(), json.dumps(result), self.JOB, self.owner)
+        )
+
+    def last_run(self):
+        """(finished_at, result dict) of the last completed run, or (None, None)"""
+        row = self.db.query_one("SELECT last_finished, last_result FROM maintenance_state WHERE job=?", (self.JOB,))
+        if not row or not row[0]:
+            return None, None
+        return row[0], json.loads(row[1])
+
+    def due(self, now=None):
+        now = now or datetime.now()
+        if self.run_hour is not None and now.hour != self.run_hour:
+            return False
+        finished, _ = self.last_run()
+        return finished is None or datetime.fromisoformat(finished) <= now - timedelta(hours=self.interval_hours)
+
+    # ---------- batching ----------
+
+    def _resize(self, size, elapsed_ms, floor, ceiling):
+        if elapsed_ms > self.lock_budget_ms:
+            return max(floor, size // 2)
+        if elapsed_ms < self.lock_budget_ms / 2:
+            return min(ceiling, size + max(1, size // 4))
+        return size
+
+    def _rest(self):
+        # let writers take the lock between batches
+        time.sleep(self.pause)
+        if self.running and time.monotonic() - self.renewed_at >= self.lease_seconds / 3:
+            self._renew()
+        if self.manual_checkpoints and time.monotonic() - self.checkpointed_at >= CHECKPOINT_EVERY:
+            self.db.query_one("PRAGMA wal_checkpoint(PASSIVE)")
+            self.checkpointed_at = time.monotonic()
+
+    # ---------- steps ----------
+
+    def prune(self, table, keep_days, archive=True, now=None, stats=None):
+        """Archive (optionally) and delete rows older than `keep_days`; returns rows deleted"""
+        time_column, columns = RETENTION_TABLES[table]
+        cutoff = ((now or datetime.now()) - timedelta(days=keep_days)).isoformat()
+        stats = stats if stats is not None else {"max_lock_ms": 0.0, "transactions": 0}
+        live = f" AND {LIVE_ONLY[table]}" if table in LIVE_ONLY else ""
+        select = (f"SELECT rowid, {', '.join(columns)} FROM {table} "
+                  f"WHERE rowid > ? AND {time_column} < ?{live} ORDER BY rowid LIMIT ?")
+        month_at = columns.index(time_column) + 1
+
+        deleted, last_rowid, batch = 0, 0, self.batch_size
+        while not self.stop_event.is_set():
+            rows = self.db.query(select, (last_rowid, cutoff, batch))
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            written = []
+            if archive:
+                by_month = {}
+                for row in rows:
+                    by_month.setdefault(row[month_at][:7], []).append(row[1:])
+                written = self.archive.append(table, columns, by_month)
+
+            # rows can change between the read and the delete; the time filter is rechecked
+            where = f"rowid IN ({','.join('?' * len(rows))}) AND {time_column} < ?{live}"
+            params = [row[0] for row in rows] + [cutoff]
+            started = time.perf_counter()
+            with self.db.transaction() as conn:
+                restore = []
+                if table == "chats":
+                    restore = conn.execute(CHAT_ROLLUP_RESTORE[0].format(where=where), params).fetchall()
+                deleted += conn.execute(f"DELETE FROM {table} WHERE {where}", params).rowcount
+                if restore:
+                    conn.executemany(CHAT_ROLLUP_RESTORE[1], restore)
+                if written:
+                    self.archive.commit(conn, table, written)
+            elapsed = (time.perf_counter() - started) * 1000
+            stats["max_lock_ms"] = max(stats["max_lock_ms"], elapsed)
+            stats["transactions"] += 1
+
+            if len(rows) < batch:
+                break
+            batch = self._resize(batch, elapsed, 50, self.batch_size * 8)
+            self._rest()
+        return deleted
+
+    def vacuum(self, max_pages=None, stats=None):
+        """Return free pages to the OS a few at a time (auto_vacuum=INCREMENTAL databases only)"""
+        stats = stats if stats is not None else {"max_lock_ms": 0.0, "transactions": 0}
+        if self.db.query_one("PRAGMA auto_vacuum")[0] != 2:
+            return 0
+        freed, step = 0, self.vacuum_pages
+        while not self.stop_event.is_set() and (max_pages is None or freed < max_pages):
+            free = self.db.query_one("PRAGMA freelist_count")[0]
+            if not free:
+                break
+            pages = min(step, free) if max_pages is None else min(step, free, max_pages - freed)
+            started = time.perf_counter()
+            # the pragma frees one page per VM step and Cursor.execute steps only once;
+            # executescript runs it to completion, as its own (autocommit) transaction
+            self.db.connection().executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+            elapsed = (time.perf_counter() - started) * 1000
+            stats["max_lock_ms"] = max(stats["max_lock_ms"], elapsed)
+            stats["transactions"] += 1
+            freed += free - self.db.query_one("PRAGMA freelist_count")[0]
+            step = self._resize(step, elapsed, 16, self.vacuum_pages * 8)
+            self._rest()
+        return freed
+
+    def analyze(self, tables=None, stats=None):
+        """Refresh planner statistics; `analysis_limit` samples each index instead of scanning it"""
+        stats = stats if stats is not None else {"max_lock_ms": 0.0, "transactions": 0}
+        if tables is None:
+            tables = [r[0] for r in self.db.query(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+            )]
+        self.db.execute(f"PRAGMA analysis_limit={int(self.analysis_limit)}")
+        for table in tables:
+            if self.stop_event.is_set():
+                break
+            started = time.perf_counter()
+            self.db.execute(f'ANALYZE "{table}"')
+            stats["max_lock_ms"] = max(stats["max_lock_ms"], (time.perf_counter() - started) * 1000)
+            stats["transactions"] += 1
+            self._rest()
+        return len(tables)
+
+    def run_once(self, now=None, force=False):
+        """One full pass (retention, vacuum, ANALYZE, passive checkpoint); None if another worker holds it"""
+        if not force and not self.due(now):
+            return None
+        if not self._acquire():
+            return None
+        self.running = True
+        started = time.perf_counter()
+        result = {"deleted": {}, "vacuumed_pages": 0, "analyzed": 0, "max_lock_ms": 0.0, "transactions": 0}
+        # an automatic checkpoint would run inside a batch's COMMIT; do them between batches
+        # instead (PASSIVE never waits on readers or blocks writers)
+        self.db.execute("PRAGMA wal_autocheckpoint=0")
+        self.manual_checkpoints = True
+        try:
+            for table, (keep_days, archive) in self.policies().items():
+                if keep_days:
+                    result["deleted"][table] = self.prune(table, keep_days, archive, now, result)
+            result["vacuumed_pages"] = self.vacuum(stats=result)
+            result["analyzed"] = self.analyze(stats=result)
+            self.db.query_one("PRAGMA wal_checkpoint(PASSIVE)")
+            result["seconds"] = round(time.perf_counter() - started, 3)
+            result["max_lock_ms"] = round(result["max_lock_ms"], 2)
+        except BaseException:
+            # not finished: the next check retries instead of waiting a whole interval
+            self._release()
+            raise
+        else:
+            self._release(result)
+        finally:
+            self.manual_checkpoints = False
+            self.db.execute(f"PRAGMA wal_autocheckpoint={WAL_AUTOCHECKPOINT}")
+            self.running = False
+        return result
+
+    def enable_incremental_vacuum(self):
+        """Switch an older database to auto_vacuum=INCREMENTAL
+
+        Needs one full VACUUM, which rewrites the file under an exclusive
+        lock, so this is an explicit admin action, never part of the job.
+        New databases start in incremental mode (database.apply_pragmas).
+        """
+        if self.db.query_one("PRAGMA auto_vacuum")[0] == 2:
+            return False
+        self.db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.db.execute("VACUUM")
+        return True
+
+    # ---------- scheduler ----------
+
+    def _loop(self):
+        while not self.stop_event.wait(self.check_interval):
+            try:
+                self.run_once()
+            except Exception:
+                # busy database or full disk: the lease expires and the next check retries
+                pass
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, name="db-maintenance", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        page_size = self.db.query_one("PRAGMA page_size")[0]
+        finished, result = self.last_run()
+        return {
+            "running": self.running,
+            "last_finished": finished,
+            "last_result": result,
+            "size_mb": self.db.query_one("PRAGMA page_count")[0] * page_size / 1024 / 1024,
+            "free_mb": self.db.query_one("PRAGMA freelist_count")[0] * page_size / 1024 / 1024,
+            "incremental_vacuum": self.db.query_one("PRAGMA auto_vacuum")[0] == 2,
+            "archives": len(self.archive.files())
+        }
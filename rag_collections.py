@@ -0,0 +1,270 @@
+import os
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from vector_store import DEFAULT_PERSIST_DIR, workspace_slug, open_store, open_lexical_index
+from lexical_index import hybrid_search
+from embedding_backends import DEFAULT_EMBEDDING, EMBEDDING_BACKENDS
+
+
+# =====================================================
+# COLLECTION REGISTRY
+# =====================================================
+# A collection is a named document set owned by a namespace: "user:<name>"
+# for personal collections, "team:<name>" for shared ones. Every collection
+# is its own shard (Chroma persist directory + BM25 lexical.db), so a query
+# only ever touches the indexes of the collection it targets, however many
+# chunks the rest of the deployment holds. The `embedding` column names the
+# backend (embedding_backends.py) the collection's vectors come from.
+
+COLLECTION_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS rag_collections (
+        namespace TEXT NOT NULL,
+        name TEXT NOT NULL,
+        shard TEXT NOT NULL UNIQUE,
+        memory_budget_mb INTEGER NOT NULL DEFAULT 64,
+        created_by TEXT,
+        created_at TEXT,
+        PRIMARY KEY (namespace, name)
+    ) WITHOUT ROWID""",
+)
+
+NAMESPACE_KINDS = ("user", "team")
+
+
+def collection_embedding_schema(conn):
+    """Add rag_collections.embedding; existing collections were embedded by OpenRouter (database.MIGRATIONS step)"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(rag_collections)")}
+    if "embedding" not in columns:
+        conn.execute(
+            f"ALTER TABLE rag_collections ADD COLUMN embedding TEXT NOT NULL DEFAULT '{DEFAULT_EMBEDDING}'"
+        )
+
+
+def user_namespace(user):
+    return f"user:{user.strip().lower()}"
+
+
+def team_namespace(team):
+    return f"team:{team.strip().lower()}"
+
+
+def _check_namespace(namespace):
+    kind, _, owner = namespace.partition(":")
+    if kind not in NAMESPACE_KINDS or not owner:
+        raise ValueError(f"namespace must look like 'user:<name>' or 'team:<name>', got {namespace!r}")
+
+
+def _check_embedding(embedding):
+    if embedding not in EMBEDDING_BACKENDS:
+        raise ValueError(f"unknown embedding backend {embedding!r} (expected one of {list(EMBEDDING_BACKENDS)})")
+
+
+def shard_name(namespace, name):
+    """Chroma-safe, collision-free shard name (also its directory under chroma_db/)"""
+    digest = hashlib.sha256(f"{namespace}\x00{name}".encode("utf-8")).hexdigest()[:8]
+    return f"{workspace_slug(f'{namespace}-{name}')[:51].strip('-_')}-{digest}"
+
+
+class CollectionInfo:
+    """Registry row for one collection"""
+
+    def __init__(self, namespace, name, shard, memory_budget_mb, created_by=None, created_at=None,
+                 embedding=DEFAULT_EMBEDDING):
+        self.namespace = namespace
+        self.name = name
+        self.shard = shard
+        self.memory_budget_mb = memory_budget_mb
+        self.created_by = created_by
+        self.created_at = created_at
+        self.embedding = embedding
+
+    @property
+    def key(self):
+        return self.namespace, self.name
+
+    def as_dict(self):
+        return {
+            "namespace": self.namespace,
+            "name": self.name,
+            "shard": self.shard,
+            "memory_budget_mb": self.memory_budget_mb,
+            "created_by": self.created_by,
+            "created_at": self.created_at,
+            "embedding": self.embedding
+        }
+
+
+_COLUMNS = "namespace, name, shard, memory_budget_mb, created_by, created_at, embedding"
+
+
+class CollectionRegistry:
+    """Collections per namespace, stored in the `rag_collections` table of a Database"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def create(self, namespace, name, memory_budget_mb=64, created_by=None, shard=None,
+               embedding=DEFAULT_EMBEDDING):
+        """Register a collection (no-op if it exists); `shard` adopts an existing index directory"""
+        _check_namespace(namespace)
+        _check_embedding(embedding)
+        name = name.strip()
+        if not name:
+            raise ValueError("collection name is empty")
+        self.db.execute(
+            f"INSERT OR IGNORE INTO rag_collections ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (namespace, name, shard or shard_name(namespace, name), int(memory_budget_mb), created_by,
+             datetime.now().isoformat(), embedding)
+        )
+        return self.get(namespace, name)
+
+    def get(self, namespace, name):
+        row = self.db.query_one(
+            f"SELECT {_COLUMNS} FROM rag_collections WHERE namespace=? AND name=?", (namespace, name)
+        )
+        return CollectionInfo(*row) if row else None
+
+    def visible(self, namespaces):
+        """Collections in any of `namespaces` (a user's own plus their teams'), by namespace then name"""
+        namespaces = list(dict.fromkeys(namespaces))
+        if not namespaces:
+            return []
+        rows = self.db.query(
+            f"SELECT {_COLUMNS} FROM rag_collections WHERE namespace IN ({','.join('?' * len(namespaces))}) "
+            "ORDER BY namespace, name",
+            namespaces
+        )
+        return [CollectionInfo(*row) for row in rows]
+
+    def set_budget(self, namespace, name, memory_budget_mb):
+        self.db.execute(
+            "UPDATE rag_collections SET memory_budget_mb=? WHERE namespace=? AND name=?",
+            (int(memory_budget_mb), namespace, name)
+        )
+
+    def set_embedding(self, namespace, name, embedding):
+        """Switch the backend; only safe while the collection holds no vectors (see ShardPool.set_embedding)"""
+        _check_embedding(embedding)
+        self.db.execute(
+            "UPDATE rag_collections SET embedding=? WHERE namespace=? AND name=?", (embedding, namespace, name)
+        )
+
+    def remove(self, namespace, name):
+        info = self.get(namespace, name)
+        if info:
+            self.db.execute("DELETE FROM rag_collections WHERE namespace=? AND name=?", (namespace, name))
+        return info
+
+
+# =====================================================
+# SHARDS
+# =====================================================
+
+class Shard:
+    """One collection's vector store and BM25 index, with its own memory budget
+
+    An eighth of the budget is the lexical index's SQLite page cache; the
+    rest bounds ingest buffering. `ingest_lock` lets one upload at a time
+    buffer against that budget, so a large upload into one collection never
+    eats into another's.
+    """
+
+    def __init__(self, info, embeddings, persist_directory=DEFAULT_PERSIST_DIR, store_factory=open_store):
+        self.info = info
+        self.embeddings = embeddings
+        self.cache_mb = max(1, info.memory_budget_mb // 8)
+        self.store = store_factory(info.shard, embeddings, persist_directory) if embeddings is not None else None
+        self.lexical = open_lexical_index(info.shard, persist_directory, cache_mb=self.cache_mb)
+        self.ingest_lock = threading.Lock()
+
+    @property
+    def ingest_budget_bytes(self):
+        return max(1, self.info.memory_budget_mb - self.cache_mb) * 1024 * 1024
+
+    def search(self, query, k=4, where=None, make_document=None):
+        """(documents, mode) via hybrid BM25 + dense retrieval; `where` filters metadata before ranking"""
+        return hybrid_search(self.store, self.lexical, query, k=k, where=where, make_document=make_document)
+
+    def stats(self):
+        return {**self.info.as_dict(), "chunks": self.lexical.doc_count, "cache_mb": self.cache_mb}
+
+
+def _same_settings(open_info, info):
+    return (open_info.memory_budget_mb, open_info.embedding) == (info.memory_budget_mb, info.embedding)
+
+
+class ShardPool:
+    """Keeps the most recently used shards open (LRU beyond `max_open`)
+
+    Shards are opened on first use from the registry; a budget change in the
+    registry reopens the shard with the new page cache size. Each shard gets
+    `embeddings_for(info.embedding)` (its collection's backend), or the one
+    `embeddings` instance when no `embeddings_for` is given.
+    """
+
+    def __init__(self, registry, embeddings=None, persist_directory=DEFAULT_PERSIST_DIR, max_open=16,
+                 store_factory=open_store, embeddings_for=None):
+        self.registry = registry
+        self.embeddings = embeddings
+        self.embeddings_for = embeddings_for or (lambda backend: embeddings)
+        self.persist_directory = persist_directory
+        self.max_open = max_open
+        self.store_factory = store_factory
+        self.shards = OrderedDict()
+        self.lock = threading.Lock()
+        self.opened = 0
+
+    def get(self, namespace, name):
+        info = self.registry.get(namespace, name)
+        if info is None:
+            raise KeyError(f"no collection {name!r} in {namespace!r}")
+        with self.lock:
+            shard = self.shards.get(info.shard)
+            if shard is not None and _same_settings(shard.info, info):
+                self.shards.move_to_end(info.shard)
+                return shard
+
+        shard = Shard(info, self.embeddings_for(info.embedding), self.persist_directory, self.store_factory)
+        with self.lock:
+            current = self.shards.get(info.shard)
+            if current is not None and _same_settings(current.info, info):
+                shard = current
+            else:
+                self.shards[info.shard] = shard
+                self.opened += 1
+            self.shards.move_to_end(info.shard)
+            while len(self.shards) > self.max_open:
+                # dropped shards close once in-flight queries release them
+                self.shards.popitem(last=False)
+        return shard
+
+    def set_embedding(self, namespace, name, embedding):
+        """Change an empty collection's backend; vectors of two models can't share a collection"""
+        if self.get(namespace, name).lexical.doc_count:
+            raise ValueError(f"collection {name!r} already holds chunks; create a new one for another backend")
+        self.registry.set_embedding(namespace, name, embedding)
+
+    def remove(self, namespace, name):
+        """Unregister a collection and delete its indexes from disk"""
+        info = self.registry.remove(namespace, name)
+        if info is None:
+            return False
+        with self.lock:
+            shard = self.shards.pop(info.shard, None)
+        if shard is not None and shard.store is not None:
+            shard.store.delete_collection()
+        shutil.rmtree(os.path.join(self.persist_directory, info.shard), ignore_errors=True)
+        return True
+
+    def stats(self):
+        with self.lock:
+            shards = list(self.shards.values())
+        return {
+            "open": len(shards),
+            "max_open": self.max_open,
+            "opened": self.opened,
+            "shards": [shard.stats() for shard in shards]
+        }
@@ -0,0 +1,196 @@
+import re
+import math
+import time
+import operator
+import sqlite3
+import hashlib
+import threading
+from array import array
+
+
+# =====================================================
+# RESPONSE CACHE
+# =====================================================
+
+def normalize_prompt(prompt):
+    """Case/whitespace/trailing-punctuation insensitive form of a prompt"""
+    return re.sub(r"\s+", " ", prompt.strip().lower()).rstrip(" ?!.")
+
+
+def context_hash(*parts):
+    """Stable hash of retrieved context / prior turns that the answer depends on"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def _norm(vector):
+    return math.sqrt(sum(map(operator.mul, vector, vector)))
+
+
+class QueryVector:
+    """embed_query that embeds a prompt only once
+
+    Pass the same instance to lookup() and store() for one answer: the
+    prompt embedded for the similarity lookup is reused when the answer
+    is stored, so a miss costs one embedding call, not two.
+    """
+
+    def __init__(self, embed_query):
+        self.embed_query = embed_query
+        self.text = None
+        self.vector = None
+
+    def __call__(self, text):
+        if self.vector is None or text != self.text:
+            self.text, self.vector = text, self.embed_query(text)
+        return self.vector
+
+
+def replay(text, chunk_words=3):
+    """Stream a cached answer back in small pieces (for st.write_stream)"""
+    words = re.split(r"(\s+)", text)
+    for i in range(0, len(words), chunk_words * 2):
+        yield "".join(words[i:i + chunk_words * 2])
+
+
+class ResponseCache:
+    """SQLite response cache with TTL, LRU eviction and optional similarity lookup
+
+    Entries are scoped by (model, temperature, personality, context hash);
+    inside a scope a prompt matches exactly after normalization, or, when an
+    embedding function is supplied, by cosine similarity >= `threshold`
+    against the `max_candidates` most recently used entries of the scope.
+    """
+
+    def __init__(self, path="response_cache.db", ttl_seconds=24 * 3600, max_entries=5000, threshold=0.95,
+                 max_candidates=256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    scope TEXT,
+                    prompt TEXT,
+                    response TEXT,
+                    embedding BLOB,
+                    tokens INTEGER DEFAULT 0,
+                    created_at REAL,
+                    last_used REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_responses_scope ON responses (scope);
+                CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used);
+                CREATE TABLE IF NOT EXISTS cache_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER DEFAULT 0
+                );
+            """)
+            self.conn.commit()
+
+    @staticmethod
+    def scope_of(model, temperature, personality, context=""):
+        return context_hash(model, round(float(temperature), 2), personality, context)
+
+    def lookup(self, model, temperature, personality, prompt, context="", embed_query=None):
+        """Return (response, tokens) for a cached answer, or None"""
+        scope = self.scope_of(model, temperature, personality, context)
+        normalized = normalize_prompt(prompt)
+        key = context_hash(scope, normalized)
+        now = time.time()
+        oldest = now - self.ttl_seconds
+
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT key, response, tokens FROM responses WHERE key=? AND created_at>=?", (key, oldest)
+            ).fetchone()
+
+        if row is None and embed_query is not None:
+            row = self._similar(scope, embed_query(normalized), oldest)
+
+        with self.lock:
+            if row is None:
+                self._bump("misses", 1)
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE responses SET last_used=? WHERE key=?", (now, row[0]))
+            self._bump("hits", 1)
+            self._bump("tokens_saved", row[2] or 0)
+            self.conn.commit()
+        return row[1], row[2] or 0
+
+    def _similar(self, scope, query_vector, oldest):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, response, tokens, embedding FROM responses "
+                "WHERE scope=? AND created_at>=? AND embedding IS NOT NULL ORDER BY last_used DESC LIMIT ?",
+                (scope, oldest, self.max_candidates)
+            ).fetchall()
+        query_norm = _norm(query_vector)
+        if not query_norm:
+            return None
+        best, best_score = None, self.threshold
+        for key, response, tokens, blob in rows:
+            vector = array("f")
+            vector.frombytes(blob)
+            if len(vector) != len(query_vector):
+                continue  # stored under another embedding model
+            norm = _norm(vector)
+            score = sum(map(operator.mul, query_vector, vector)) / (query_norm * norm) if norm else 0.0
+            if score >= best_score:
+                best, best_score = (key, response, tokens), score
+        return best
+
+    def store(self, model, temperature, personality, prompt, response, tokens=0, context="", embed_query=None):
+        """Cache an answer; embeds the prompt when similarity lookup is enabled (see QueryVector)"""
+        scope = self.scope_of(model, temperature, personality, context)
+        normalized = normalize_prompt(prompt)
+        key = context_hash(scope, normalized)
+        blob = array("f", embed_query(normalized)).tobytes() if embed_query is not None else None
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, scope, prompt, response, embedding, tokens, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, scope, normalized, response, blob, tokens, now, now)
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now):
+        self.conn.execute("DELETE FROM responses WHERE created_at<?", (now - self.ttl_seconds,))
+        count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def _bump(self, name, amount):
+        self.conn.execute(
+            "INSERT INTO cache_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def stats(self):
+        """Hit rate and tokens saved since the cache was created"""
+        with self.lock:
+            values = dict(self.conn.execute("SELECT name, value FROM cache_stats").fetchall())
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        hits, misses = values.get("hits", 0), values.get("misses", 0)
+        return {
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "tokens_saved": values.get("tokens_saved", 0)
+        }
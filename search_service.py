@@ -0,0 +1,184 @@
+import json
+import time
+import sqlite3
+import threading
+from urllib.parse import urlsplit, urlunsplit
+from concurrent.futures import Future
+from response_cache import normalize_prompt, context_hash
+from lexical_index import reciprocal_rank_fusion
+from fanout import Call, iter_fan_out
+
+
+# =====================================================
+# PROVIDERS
+# =====================================================
+# A provider is any object with a `name` and
+# `search(query, max_results) -> [{"title", "url", "snippet"}]`.
+
+class DuckDuckGoProvider:
+    """DuckDuckGo through langchain_community's API wrapper (built once, reused)"""
+
+    name = "duckduckgo"
+
+    def __init__(self):
+        from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
+        self.wrapper = DuckDuckGoSearchAPIWrapper()
+
+    def search(self, query, max_results=5):
+        return [
+            {"title": r.get("title", ""), "url": r.get("link", ""), "snippet": r.get("snippet", "")}
+            for r in self.wrapper.results(query, max_results)
+        ]
+
+
+# =====================================================
+# SQLITE TTL CACHE
+# =====================================================
+
+class SearchCache:
+    """Search results per (provider, normalized query, max_results) with a TTL"""
+
+    def __init__(self, path="search_cache.db", ttl_seconds=3600, max_entries=5000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS searches (
+                    key TEXT PRIMARY KEY,
+                    query TEXT,
+                    results TEXT,
+                    created_at REAL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_searches_created ON searches (created_at)")
+            self.conn.commit()
+
+    @staticmethod
+    def make_key(provider, query, max_results):
+        return context_hash(provider, normalize_prompt(query), max_results)
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT results FROM searches WHERE key=? AND created_at>=?", (key, time.time() - self.ttl_seconds)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, query, results):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO searches (key, query, results, created_at) VALUES (?, ?, ?, ?)",
+                (key, query, json.dumps(results), time.time())
+            )
+            self.conn.execute(
+                "DELETE FROM searches WHERE created_at < ? OR key IN "
+                "(SELECT key FROM searches ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (time.time() - self.ttl_seconds, self.max_entries)
+            )
+            self.conn.commit()
+
+
+# =====================================================
+# SEARCH SERVICE
+# =====================================================
+
+def canonical_url(url):
+    """URL identity for dedup: lowercase host, no fragment, no trailing slash, http == https"""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return urlunsplit(("https", host, path, parts.query, ""))
+
+
+class SearchService:
+    """Cached, deduplicated search over a pluggable provider
+
+    Concurrent calls for the same (normalized) query share one provider
+    request; later calls within the TTL are answered from SQLite.
+    """
+
+    def __init__(self, provider, cache):
+        self.provider = provider
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def search(self, query, max_results=5):
+        """(results, source) where source is "cache", "shared" or "provider\""""
+        key = self.cache.make_key(self.provider.name, query, max_results)
+        results = self.cache.get(key)
+        if results is not None:
+            self.hits += 1
+            return results, "cache"
+
+        with self.lock:
+            future = self.in_flight.get(key)
+            if future is None:
+                # a leader may have cached the answer and left since the first lookup
+                results = self.cache.get(key)
+                if results is not None:
+                    self.hits += 1
+                    return results, "cache"
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+        if not leader:
+            self.shared += 1
+            return future.result(), "shared"
+
+        self.misses += 1
+        try:
+            results = self.provider.search(query, max_results)
+            self.cache.put(key, query, results)
+            future.set_result(results)
+            return results, "provider"
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+    def multi_search(self, queries, max_results=5, timeout=20):
+        """Run several formulations in parallel; results merged by RRF and deduped by URL
+
+        Returns (results, errors) where errors maps a failed query to its exception.
+        """
+        queries = list(dict.fromkeys(q for q in queries if q.strip()))
+        calls = [Call(q, self.search, q, max_results, provider="search") for q in queries]
+        rankings, by_url, errors = [], {}, {}
+        for query, value, error, _ in iter_fan_out(calls, timeout=timeout):
+            if error:
+                errors[query] = error
+                continue
+            ranking = []
+            for result in value[0]:
+                url = canonical_url(result["url"])
+                by_url.setdefault(url, result)
+                if url not in ranking:
+                    ranking.append(url)
+            rankings.append(ranking)
+        return [by_url[url] for url in reciprocal_rank_fusion(rankings)], errors
+
+    def stats(self):
+        total = self.hits + self.misses + self.shared
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "hit_rate": (self.hits + self.shared) / total if total else 0.0
+        }
+
+
+def format_results(results):
+    """Plain-text listing for the UI and for LLM summarization"""
+    return "\n\n".join(f"**{r['title']}**\n{r['snippet']}\n{r['url']}" for r in results)
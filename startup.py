@@ -0,0 +1,103 @@
+import re
+import time
+import functools
+import importlib
+import importlib.util
+import threading
+
+
+# =====================================================
+# LAZY MODULES
+# =====================================================
+# pandas, plotly, PIL and the LangChain integrations take longer to import
+# than the whole login page takes to render. Entry points bind them as
+# LazyModule proxies instead, so the real import happens the first time a
+# page touches one; warm_up() pulls them in off the script thread after
+# login so that first touch rarely has to wait.
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        # only reached for names the proxy itself doesn't have
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def module_available(*names):
+    """True when every top-level package in `names` is installed (nothing is imported)
+
+    Only pass top-level names: find_spec on "a.b" imports package "a".
+    """
+    return all(importlib.util.find_spec(name) is not None for name in names)
+
+
+# =====================================================
+# BACKGROUND WARM-UP
+# =====================================================
+
+_warm_lock = threading.Lock()
+_warming = set()
+import_times = {}
+import_errors = {}
+
+
+def _import_all(modules, on_import):
+    for name in modules:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            import_errors[name] = f"{type(e).__name__}: {e}"
+            continue
+        import_times[name] = (time.perf_counter() - started) * 1000
+        if on_import is not None:
+            on_import(name, import_times[name])
+
+
+def warm_up(modules, on_import=None):
+    """Import `modules` on a daemon thread, once per process; returns the thread or None
+
+    Modules another thread is already importing just block that thread until
+    this import finishes (Python's per-module import locks), so a page that
+    gets there first never sees a half-initialised module. Missing optional
+    packages are recorded in `import_errors` rather than raised.
+    """
+    with _warm_lock:
+        pending = [name for name in modules if name not in _warming]
+        _warming.update(pending)
+    if not pending:
+        return None
+    thread = threading.Thread(target=_import_all, args=(pending, on_import), name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+# =====================================================
+# STYLES
+# =====================================================
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_SPACE = re.compile(r"\s+")
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*|(:)\s+")
+
+
+@functools.lru_cache(maxsize=8)
+def minify_css(markup):
+    """<style> markup without comments or redundant whitespace, computed once per process
+
+    Whitespace before ':' is kept, since "a :hover" and "a:hover" are
+    different selectors.
+    """
+    markup = _CSS_COMMENT.sub("", markup)
+    markup = _CSS_SPACE.sub(" ", markup)
+    return _CSS_PUNCTUATION.sub(lambda m: m.group(1) or m.group(2), markup).strip()
@@ -0,0 +1,117 @@
+import re
+import time
+from context_builder import count_tokens
+
+
+# =====================================================
+# INCREMENTAL STREAM RENDERING
+# =====================================================
+# Re-rendering the whole answer on every chunk is O(n^2) markdown work and
+# one websocket message per token. Instead, deltas are buffered and flushed
+# on a time/size cadence, and every finished paragraph is frozen into its
+# own element so only the open tail paragraph is ever re-sent.
+
+CURSOR = "▌"
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_FENCE = re.compile(r"^\s*(```|~~~)", re.MULTILINE)
+
+
+def _split_closed(text):
+    """(closed, tail): closed ends at the last paragraph break outside a code fence"""
+    cut = 0
+    for match in _PARAGRAPH_BREAK.finditer(text):
+        # an odd number of fences before the break means we're inside a code block
+        if len(_FENCE.findall(text, 0, match.start())) % 2 == 0:
+            cut = match.end()
+    return text[:cut], text[cut:]
+
+
+class StreamRenderer:
+    """Renders a streamed answer into a Streamlit container in coalesced updates
+
+    `container` is anything with `.empty()` (st.container(), a chat
+    message). Pending text is flushed when `interval` seconds have passed
+    or `max_pending` characters are waiting, whichever comes first.
+    """
+
+    def __init__(self, container, interval=0.05, max_pending=400, cursor=CURSOR, clock=time.perf_counter):
+        self.container = container
+        self.clock = clock
+        self.interval = interval
+        self.max_pending = max_pending
+        self.cursor = cursor
+        self.frozen = []
+        self.tail = ""
+        self.pending = ""
+        self.slot = container.empty()
+        self.started = self.clock()
+        self.first_token_at = None
+        self.last_render = float("-inf")
+        self.finished_at = None
+        self.renders = 0
+        self.render_seconds = 0.0
+        self.bytes_sent = 0
+
+    @property
+    def text(self):
+        return "".join(self.frozen) + self.tail + self.pending
+
+    def write(self, delta):
+        if not delta:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = self.clock()
+        self.pending += delta
+        now = self.clock()
+        if len(self.pending) >= self.max_pending or now - self.last_render >= self.interval:
+            self._flush(now)
+
+    def write_stream(self, stream):
+        """Render every piece of an iterable and return the full text"""
+        for delta in stream:
+            self.write(delta)
+        return self.close()
+
+    def _flush(self, now, final=False):
+        self.tail += self.pending
+        self.pending = ""
+        closed, self.tail = _split_closed(self.tail)
+        if closed:
+            # the finished paragraphs get their final render in the current slot,
+            # and a fresh slot below it takes over the open tail
+            self._render(closed)
+            self.frozen.append(closed)
+            self.slot = self.container.empty()
+        if self.tail or final:
+            self._render(self.tail if final else self.tail + self.cursor)
+        self.last_render = now
+
+    def _render(self, text):
+        started = time.perf_counter()
+        self.slot.markdown(text)
+        self.render_seconds += time.perf_counter() - started
+        self.renders += 1
+        self.bytes_sent += len(text.encode())
+
+    def close(self):
+        """Flush what's left without the cursor; returns the full text"""
+        if self.finished_at is None:
+            self._flush(self.clock(), final=True)
+            self.finished_at = self.clock()
+        return self.text
+
+    def stats(self, completion_tokens=None, model=None):
+        """TTFT and generation speed (tokens counted locally unless given)"""
+        finished = self.finished_at or self.clock()
+        tokens = completion_tokens if completion_tokens is not None else count_tokens(self.text, model)
+        streamed = self.first_token_at is not None
+        generating = finished - self.first_token_at if streamed else 0.0
+        return {
+            "ttft_ms": round((self.first_token_at - self.started) * 1000, 1) if streamed else None,
+            "seconds": round(finished - self.started, 3),
+            "tokens": tokens,
+            "tokens_per_sec": round(tokens / generating, 1) if generating > 0 else None,
+            "renders": self.renders,
+            "render_ms": round(self.render_seconds * 1000, 1),
+            "bytes_sent": self.bytes_sent
+        }
@@ -0,0 +1,182 @@
+import json
+import time
+import uuid
+import functools
+import contextvars
+from datetime import datetime
+from contextlib import contextmanager, nullcontext
+from collections import deque
+from analytics_store import event_rollup_writes
+
+try:
+    from opentelemetry import trace as otel_trace
+    OTEL_AVAILABLE = True
+except ImportError:
+    OTEL_AVAILABLE = False
+
+
+# =====================================================
+# TRACE TABLE
+# =====================================================
+# Finished spans go three ways: an in-process ring buffer (exact recent
+# percentiles), the `traces` table (drill-down), and the latency rollups
+# under feature "span:<name>" (cheap long-range percentiles, same histograms
+# as the analytics dashboard).
+
+TRACE_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS traces (
+        span_id TEXT PRIMARY KEY,
+        trace_id TEXT,
+        parent_id TEXT,
+        name TEXT,
+        session_id TEXT,
+        started_at TEXT,
+        duration_ms REAL,
+        status TEXT,
+        attributes TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_traces_trace ON traces (trace_id)",
+    "CREATE INDEX IF NOT EXISTS idx_traces_name_time ON traces (name, started_at)"
+)
+
+SPAN_PREFIX = "span:"
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed stage; children inherit trace_id and session_id from the enclosing span"""
+
+    def __init__(self, name, parent=None, session_id=None, attributes=None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        self.session_id = session_id or (parent.session_id if parent else None)
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.started_at = datetime.now().isoformat()
+        self.started = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, duration_ms=None):
+        self.duration_ms = duration_ms if duration_ms is not None else (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "session_id": self.session_id,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms or 0.0, 3),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+# =====================================================
+# TRACER
+# =====================================================
+
+class Tracer:
+    """Records spans to a ring buffer and, once configured, to SQLite through the analytics writer"""
+
+    def __init__(self, capacity=5000):
+        self.spans = deque(maxlen=capacity)
+        self.writer = None
+        self.otel = None
+        self.session_fn = None
+
+    def configure(self, writer=None, otel=False, session_fn=None):
+        """Persist spans via `writer` (AnalyticsWriter); mirror them to OpenTelemetry if asked and installed
+
+        `session_fn` supplies the session id for root spans (e.g. from st.session_state).
+        """
+        self.writer = writer
+        self.otel = otel_trace.get_tracer("ai-pro") if otel and OTEL_AVAILABLE else None
+        self.session_fn = session_fn
+        return self
+
+    def _new_span(self, name, session_id, attributes):
+        parent = _current.get()
+        if session_id is None and parent is None and self.session_fn is not None:
+            try:
+                session_id = self.session_fn()
+            except Exception:
+                session_id = None
+        return Span(name, parent, session_id, attributes)
+
+    @contextmanager
+    def span(self, name, session_id=None, **attributes):
+        span = self._new_span(name, session_id, attributes)
+        token = _current.set(span)
+        mirror = self.otel.start_as_current_span(name) if self.otel else nullcontext()
+        try:
+            with mirror as otel_span:
+                yield span
+                if otel_span is not None:
+                    for key, value in span.attributes.items():
+                        otel_span.set_attribute(key, value if isinstance(value, (str, int, float, bool)) else str(value))
+        except BaseException as e:
+            span.status = "error"
+            span.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            _current.reset(token)
+            span.finish()
+            self._record(span)
+
+    def record(self, name, duration_ms, session_id=None, **attributes):
+        """Record an already-measured stage (e.g. time-to-first-token) under the current span"""
+        span = self._new_span(name, session_id, attributes)
+        span.finish(duration_ms)
+        self._record(span)
+
+    def _record(self, span):
+        self.spans.append(span)
+        if self.writer is None:
+            return
+        self.writer.submit_many([(
+            "INSERT OR IGNORE INTO traces (span_id, trace_id, parent_id, name, session_id, started_at, "
+            "duration_ms, status, attributes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (span.span_id, span.trace_id, span.parent_id, span.name, span.session_id, span.started_at,
+             span.duration_ms, span.status, json.dumps(span.attributes, default=str))
+        )] + event_rollup_writes(SPAN_PREFIX + span.name, span.started_at, span.duration_ms))
+
+    def recent_percentiles(self, percentiles=(50, 95, 99)):
+        """{name: {"count", p: ms}} over the spans still in the ring buffer (this process only)"""
+        grouped = {}
+        for span in list(self.spans):
+            grouped.setdefault(span.name, []).append(span.duration_ms)
+        result = {}
+        for name, durations in grouped.items():
+            durations.sort()
+            stats = {"count": len(durations)}
+            for p in percentiles:
+                stats[p] = round(durations[min(len(durations) - 1, int(p / 100 * len(durations)))], 1)
+            result[name] = stats
+        return result
+
+    def recent(self, limit=50):
+        return [span.as_dict() for span in list(self.spans)[-limit:]]
+
+
+tracer = Tracer()
+
+
+def traced(name=None):
+    """Decorator: run the function inside a span on the shared tracer"""
+    def decorate(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
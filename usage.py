@@ -0,0 +1,120 @@
+import time
+import uuid
+from datetime import datetime
+from context_builder import count_tokens
+
+
+# =====================================================
+# PER-REQUEST USAGE METERING
+# =====================================================
+
+def _content(message):
+    if isinstance(message, dict):
+        return message["content"]
+    return getattr(message, "content", message)
+
+
+class UsageMeter:
+    """Collects token usage for one LLM request from its streamed chunks
+
+    With `stream_usage=True` OpenAI-compatible providers send a final chunk
+    carrying `usage_metadata`; when none arrives the counts are estimated
+    locally and the record is flagged as estimated.
+    """
+
+    def __init__(self, model, feature="chat"):
+        self.model = model
+        self.feature = feature
+        self.request_id = uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.usage = None
+
+    def observe(self, chunk):
+        if self.first_token_at is None and getattr(chunk, "content", None):
+            self.first_token_at = time.perf_counter()
+        metadata = getattr(chunk, "usage_metadata", None)
+        if metadata:
+            self.usage = metadata
+
+    def finish(self, prompt_messages, completion):
+        """Final usage record for the request"""
+        latency_ms = (time.perf_counter() - self.started) * 1000
+        ttft_ms = (self.first_token_at - self.started) * 1000 if self.first_token_at else None
+
+        if self.usage:
+            prompt_tokens = self.usage.get("input_tokens", 0)
+            completion_tokens = self.usage.get("output_tokens", 0)
+            cached_tokens = (self.usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+            estimated = False
+        else:
+            prompt_tokens = sum(count_tokens(_content(m), self.model) + 4 for m in prompt_messages)
+            completion_tokens = count_tokens(completion, self.model)
+            cached_tokens = 0
+            estimated = True
+
+        return {
+            "request_id": self.request_id,
+            "model": self.model,
+            "feature": self.feature,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "estimated": estimated,
+            "latency_ms": round(latency_ms, 1),
+            "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None
+        }
+
+
+# =====================================================
+# USAGE TABLE
+# =====================================================
+
+USAGE_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS usage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        request_id TEXT,
+        session_id TEXT,
+        model TEXT,
+        feature TEXT,
+        prompt_tokens INTEGER,
+        completion_tokens INTEGER,
+        cached_tokens INTEGER,
+        total_tokens INTEGER,
+        estimated INTEGER,
+        latency_ms REAL,
+        ttft_ms REAL,
+        timestamp TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_usage_model_time ON usage (model, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_usage_session ON usage (session_id)"
+)
+
+
+class UsageRecorder:
+    """Writes one row per LLM request to the `usage` table of a Database (schema: database.MIGRATIONS)"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def record(self, usage, session_id=None):
+        self.db.execute(
+            "INSERT INTO usage (request_id, session_id, model, feature, prompt_tokens, completion_tokens, "
+            "cached_tokens, total_tokens, estimated, latency_ms, ttft_ms, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                usage["request_id"], session_id, usage["model"], usage["feature"],
+                usage["prompt_tokens"], usage["completion_tokens"], usage["cached_tokens"],
+                usage["total_tokens"], int(usage["estimated"]), usage["latency_ms"], usage["ttft_ms"],
+                datetime.now().isoformat()
+            )
+        )
+
+    def per_model(self, since=None):
+        """Requests, tokens and average latency per model (optionally since an ISO timestamp)"""
+        return self.db.query(
+            "SELECT model, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), SUM(cached_tokens), "
+            "AVG(latency_ms), AVG(ttft_ms) FROM usage WHERE timestamp >= ? GROUP BY model ORDER BY model",
+            (since or "",)
+        )
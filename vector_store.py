@@ -0,0 +1,109 @@
+import os
+import re
+import hashlib
+import threading
+
+
+# =====================================================
+# PERSISTENT CHROMA COLLECTIONS
+# =====================================================
+
+DEFAULT_PERSIST_DIR = "chroma_db"
+
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def workspace_slug(workspace):
+    """Chroma-safe collection name for a tenant/workspace"""
+    slug = re.sub(r"[^a-zA-Z0-9_-]+", "-", workspace.strip()).strip("-_").lower()
+    slug = slug[:60] or "default"
+    return slug if len(slug) >= 3 else f"ws-{slug}"
+
+
+def write_lock(store):
+    """Per-collection lock serializing writers across sessions"""
+    return _write_lock(store._collection.name)
+
+
+def _write_lock(name):
+    with _write_locks_guard:
+        return _write_locks.setdefault(name, threading.Lock())
+
+
+def open_store(workspace, embeddings, persist_directory=DEFAULT_PERSIST_DIR):
+    """Open (or create) the on-disk collection for a workspace"""
+    from langchain_community.vectorstores import Chroma
+    name = workspace_slug(workspace)
+    return Chroma(
+        collection_name=name,
+        embedding_function=embeddings,
+        persist_directory=os.path.join(persist_directory, name)
+    )
+
+
+def open_lexical_index(workspace, persist_directory=DEFAULT_PERSIST_DIR, cache_mb=16):
+    """BM25 index stored in the same directory as the workspace collection"""
+    from lexical_index import LexicalIndex
+    path = os.path.join(persist_directory, workspace_slug(workspace))
+    os.makedirs(path, exist_ok=True)
+    return LexicalIndex(os.path.join(path, "lexical.db"), cache_mb=cache_mb)
+
+
+def chunk_id(source, text):
+    """Stable id for a chunk: content hash scoped to its source document"""
+    return hashlib.sha256(f"{source}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def upsert_document(store, source, chunks, lexical=None):
+    """Sync one document's chunks into the store, touching only what changed
+
+    `chunks` are LangChain Documents from the splitter. Chunks whose content
+    hash is already stored are left alone, new ones are embedded and added,
+    and chunks that disappeared from the document are deleted.
+    """
+    with write_lock(store):
+        existing = set(store.get(where={"source": source}, include=[])["ids"])
+
+        texts, metadatas, ids = [], [], []
+        for chunk in chunks:
+            cid = chunk_id(source, chunk.page_content)
+            if cid in existing or cid in ids:
+                continue
+            texts.append(chunk.page_content)
+            metadatas.append({**chunk.metadata, "source": source, "content_hash": cid})
+            ids.append(cid)
+
+        wanted = {chunk_id(source, c.page_content) for c in chunks}
+        stale = list(existing - wanted)
+        if stale:
+            store.delete(ids=stale)
+        if texts:
+            store.add_texts(texts, metadatas=metadatas, ids=ids)
+        if lexical:
+            lexical.delete(stale)
+            lexical.add(ids, texts, metadatas)
+
+    return {"added": len(ids), "deleted": len(stale), "unchanged": len(existing & wanted)}
+
+
+def delete_document(store, source, lexical=None):
+    """Remove every chunk belonging to a document"""
+    with write_lock(store):
+        ids = store.get(where={"source": source}, include=[])["ids"]
+        if ids:
+            store.delete(ids=ids)
+        if lexical:
+            lexical.delete_source(source)
+    return len(ids)
+
+
+def list_documents(store):
+    """Distinct source names indexed in the store"""
+    metadatas = store.get(include=["metadatas"])["metadatas"]
+    return sorted({m.get("source") for m in metadatas if m and m.get("source")})
+
+
+def write_chunks(store, ids, texts, metadatas, vectors):
+    """Upsert pre-embedded chunks straight into the underlying collection"""
+    store._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)